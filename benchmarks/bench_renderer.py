@@ -0,0 +1,80 @@
+"""
+Compara los renderizadores PIL y NumPy de las ilustraciones de relleno.
+
+Dibuja N ilustraciones de capítulo y M portadas con cada renderizador, con la
+caché de imágenes desactivada, y muestra el tiempo total y por imagen:
+
+    python benchmarks/bench_renderer.py --images 64 --covers 16 --repeat 3
+
+Se mide el dibujo completo (fondo, texto y codificación JPEG) y, por
+separado, solo el fondo, que es la parte que cambia entre renderizadores.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["BOOK_IMAGE_CACHE"] = "0"
+
+from book.background_renderer import render_backgrounds, renderer_name
+from book.cover_generator import cover_spec, create_simple_covers
+from book.image_generator import image_spec, create_simple_images
+from book.illustration_pipeline import chapter_image_prompt
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run(images=64, covers=16, repeat=3):
+    """
+    Ejecuta la comparación y muestra una tabla de resultados.
+
+    Args:
+        images (int): Ilustraciones de capítulo por ronda
+        covers (int): Portadas por ronda
+        repeat (int): Rondas por medida; se toma la más rápida
+
+    Returns:
+        dict: Segundos por medida y renderizador
+    """
+    prompts = [chapter_image_prompt(f"Capítulo {i}", f"tema {i % 7}") for i in range(images)]
+    books = [(f"tema {i}", f"{6 + i % 6} años") for i in range(covers)]
+    image_specs = [image_spec(p) for p in prompts]
+    cover_specs = [cover_spec(*b) for b in books]
+
+    renderers = ["pil"]
+    if renderer_name("numpy") == "numpy":
+        renderers.append("numpy")
+    else:
+        print("NumPy no está instalado: solo se mide el renderizador PIL")
+
+    cases = [
+        ("fondos de ilustraciones", images, lambda r: render_backgrounds(image_specs, r)),
+        ("fondos de portadas", covers, lambda r: render_backgrounds(cover_specs, r)),
+        ("ilustraciones completas", images, lambda r: create_simple_images(prompts, r)),
+        ("portadas completas", covers, lambda r: create_simple_covers(books, r)),
+    ]
+    results = {}
+    print(f"{'medida':<26}{'renderizador':<14}{'total (s)':>10}{'ms/imagen':>11}")
+    for name, count, func in cases:
+        for renderer in renderers:
+            seconds = _best_of(repeat, lambda: func(renderer))
+            results[(name, renderer)] = seconds
+            print(f"{name:<26}{renderer:<14}{seconds:>10.3f}{seconds / max(count, 1) * 1000:>11.2f}")
+        if ("numpy" in renderers) and results[(name, "numpy")] > 0:
+            print(f"{'':<26}{'aceleración':<14}{results[(name, 'pil')] / results[(name, 'numpy')]:>10.2f}x")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara los renderizadores de ilustraciones PIL y NumPy")
+    parser.add_argument("--images", type=int, default=64, help="Ilustraciones de capítulo por ronda")
+    parser.add_argument("--covers", type=int, default=16, help="Portadas por ronda")
+    parser.add_argument("--repeat", type=int, default=3, help="Rondas por medida (se toma la más rápida)")
+    args = parser.parse_args()
+    run(args.images, args.covers, args.repeat)
@@ -0,0 +1,288 @@
+"""
+Benchmarks de las rutas críticas de generación y maquetación.
+
+Todo se ejecuta sin red: el contenido es sintético y la generación de texto
+usa un cliente simulado que responde como utils/fake_openai_server.py. Para
+cada caso se mide el tiempo de reloj (la mejor de varias rondas), el pico de
+memoria (tracemalloc) y, en los casos que generan un PDF, su tamaño.
+
+    python benchmarks/run_benchmarks.py                   # todos los casos
+    python benchmarks/run_benchmarks.py --quick           # solo los casos pequeños
+    python benchmarks/run_benchmarks.py -k create_pdf     # filtrar por nombre
+    python benchmarks/run_benchmarks.py --save base.json  # guardar una línea base
+    python benchmarks/run_benchmarks.py --compare base.json --threshold 0.15
+
+Las líneas base son JSON con los resultados de cada caso; --compare muestra la
+variación respecto a una de ellas y termina con código 1 si algún caso es más
+lento (o usa más memoria) que la línea base por encima del umbral.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Medir el trabajo real, no la caché de imágenes ni de contenido
+os.environ["BOOK_IMAGE_CACHE"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+WORDS = ("el sol es una estrella enorme que da luz y calor a todos los planetas "
+         "del sistema solar mientras giran a su alrededor durante millones de años").split()
+
+# (capítulos, párrafos por capítulo, palabras por párrafo, solo en modo completo)
+PDF_SIZES = [
+    (5, 3, 60, False),
+    (20, 6, 80, False),
+    (50, 10, 120, True),
+    (200, 4, 60, True),
+    (200, 20, 150, True),
+]
+
+def synthetic_text(rng, paragraphs, words):
+    return "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(paragraphs))
+
+def synthetic_book(chapters, paragraphs, words, seed=0):
+    """
+    Construye un book_data sintético con la estructura que espera create_pdf.
+
+    Args:
+        chapters (int): Número de capítulos
+        paragraphs (int): Párrafos por capítulo
+        words (int): Palabras por párrafo
+        seed (int): Semilla para que el contenido sea reproducible
+
+    Returns:
+        dict: Datos del libro
+    """
+    rng = random.Random(seed)
+    return {
+        "topic": "el sistema solar",
+        "age_group": "8 años",
+        "title": "Explorando el sistema solar",
+        "introduction": synthetic_text(rng, 3, words),
+        "chapters": [
+            {
+                "title": f"Capítulo {i + 1}",
+                "content": synthetic_text(rng, paragraphs, words),
+                "fun_fact": "¿Sabías que...? " + synthetic_text(rng, 1, 30),
+            }
+            for i in range(chapters)
+        ],
+        "exercises": synthetic_text(rng, 4, 40),
+        "glossary": [{"term": f"Término {i}", "definition": synthetic_text(rng, 1, 20)} for i in range(10)],
+        "conclusion": synthetic_text(rng, 3, words),
+    }
+
+class StubClient:
+    """Cliente con la forma de OpenAI que responde como el servidor simulado, sin red."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=(), **kwargs):
+        from utils.fake_openai_server import fake_reply
+        content = fake_reply(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def measure(func, repeat):
+    """
+    Mide una función: mejor tiempo de reloj y pico de memoria.
+
+    Args:
+        func (callable): Función sin argumentos; puede devolver una ruta de PDF
+        repeat (int): Rondas de tiempo; la memoria se mide en una ronda aparte
+
+    Returns:
+        dict: "seconds", "peak_mb" y, si func devuelve una ruta, "pdf_bytes"
+    """
+    best = None
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # La memoria se mide aparte porque tracemalloc ralentiza la ejecución
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {"seconds": round(best, 4), "peak_mb": round(peak / (1024 * 1024), 2)}
+    if isinstance(output, str) and output.endswith(".pdf") and os.path.exists(output):
+        result["pdf_bytes"] = os.path.getsize(output)
+    return result
+
+def build_cases(workdir, quick):
+    """
+    Devuelve los casos de benchmark como pares (nombre, función).
+
+    Args:
+        workdir (str): Directorio donde se escriben los PDFs
+        quick (bool): Omitir los casos grandes
+    """
+    from book.pdf_creator import STREAMING_MIN_CHAPTERS, BookPDF, create_pdf
+    from book.document import render_book
+    from book.image_generator import generate_image
+    from book.cover_generator import generate_cover
+    import book.content_generator as content_generator
+
+    cases = []
+    for chapters, paragraphs, words, large in PDF_SIZES:
+        if quick and large:
+            continue
+        book_data = synthetic_book(chapters, paragraphs, words)
+        path = os.path.join(workdir, f"bench_{chapters}_{paragraphs}x{words}.pdf")
+        cases.append((f"create_pdf[{chapters}cap,{paragraphs}x{words}]",
+                      lambda book_data=book_data, path=path: create_pdf(book_data, path)))
+        if chapters >= STREAMING_MIN_CHAPTERS:
+            # Los libros grandes se escriben en disco por páginas; medir también la escritura en memoria
+            cases.append((f"create_pdf[{chapters}cap,{paragraphs}x{words},en memoria]",
+                          lambda book_data=book_data, path=path: create_pdf(book_data, path, streaming=False)))
+
+    # Los tres formatos a partir de un mismo Document (contenido e ilustraciones una sola vez)
+    book_data = synthetic_book(20, 6, 80)
+    path = os.path.join(workdir, "bench_formatos.pdf")
+    cases.append(("render_book[20cap,6x80,pdf+epub+html]",
+                  lambda: render_book(book_data, path, ("pdf", "epub", "html"))))
+
+    # Secciones maquetadas en fragmentos por un pool de procesos (escala con los núcleos)
+    large_book = synthetic_book(40, 10, 120)
+    large_path = os.path.join(workdir, "bench_fragmentos.pdf")
+    workers = max(os.cpu_count() or 1, 2)
+    cases.append(("create_pdf[40cap,10x120,secuencial]",
+                  lambda: create_pdf(large_book, large_path, render_workers=0)))
+    cases.append((f"create_pdf[40cap,10x120,{workers} procesos]",
+                  lambda: create_pdf(large_book, large_path, render_workers=workers)))
+
+    rng = random.Random(1)
+    for words in (30, 300, 3000):
+        text = " ".join(rng.choice(WORDS) for _ in range(words))
+
+        def lines(text=text):
+            pdf = BookPDF()
+            pdf.add_page()
+            pdf.set_font("Arial", "", 12)
+            for _ in range(20):
+                pdf.get_multi_cell_lines(0, 8, text)
+        cases.append((f"get_multi_cell_lines[{words}pal x20]", lines))
+
+    prompts = [f"Ilustración educativa para niños sobre 'Capítulo {i}' relacionado con el sistema solar"
+               for i in range(10)]
+    cases.append(("generate_image[x10]", lambda: [generate_image(p) for p in prompts]))
+    cases.append(("generate_cover[x3]", lambda: [generate_cover(f"tema {i}", "8 años") for i in range(3)]))
+
+    def generate_content():
+        original = content_generator.client
+        content_generator.client = StubClient()
+        try:
+            for i in range(20):
+                content_generator.generate_book_content(f"tema {i}", "8 años", use_cache=False)
+        finally:
+            content_generator.client = original
+    cases.append(("generate_book_content[stub x20]", generate_content))
+    cases.append(("generate_book_content[offline x1000]",
+                  lambda: [content_generator.generate_book_content(f"tema {i}", "8 años", mode="offline")
+                           for i in range(1000)]))
+    return cases
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """
+    Muestra la variación respecto a una línea base.
+
+    Args:
+        results (dict): Resultados actuales por caso
+        baseline (dict): Resultados de la línea base por caso
+        threshold (float): Variación relativa tolerada (0.1 = 10 %)
+
+    Returns:
+        list[str]: Casos que empeoraron por encima del umbral
+    """
+    regressions = []
+    print(f"\n{'caso':<36}{'tiempo':>10}{'memoria':>10}{'tamaño':>10}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36}{'(nuevo)':>10}")
+            continue
+        deltas = []
+        worse = False
+        for metric in ("seconds", "peak_mb", "pdf_bytes"):
+            if metric in current and base.get(metric):
+                change = current[metric] / base[metric] - 1
+                deltas.append(f"{change:+.0%}")
+                worse = worse or change > threshold
+            else:
+                deltas.append("-")
+        print(f"{name:<36}" + "".join(f"{d:>10}" for d in deltas) + ("  ⚠️" if worse else ""))
+        if worse:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de generación y maquetación (sin red)")
+    parser.add_argument("-k", dest="pattern", help="Ejecutar solo los casos cuyo nombre contenga este texto")
+    parser.add_argument("--quick", action="store_true", help="Omitir los casos grandes")
+    parser.add_argument("--repeat", type=int, default=3, help="Rondas por caso (se toma la más rápida)")
+    parser.add_argument("--save", metavar="JSON", help="Guardar los resultados como línea base")
+    parser.add_argument("--compare", metavar="JSON", help="Comparar con una línea base guardada")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento tolerado al comparar")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_libros_") as workdir:
+        cases = build_cases(workdir, args.quick)
+        if args.pattern:
+            cases = [(name, func) for name, func in cases if args.pattern in name]
+        print(f"{'caso':<36}{'tiempo (s)':>12}{'pico (MB)':>11}{'PDF (KB)':>10}")
+        for name, func in cases:
+            # Silenciar los mensajes de progreso de create_pdf
+            stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+            try:
+                result = measure(func, args.repeat)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            results[name] = result
+            size = f"{result['pdf_bytes'] / 1024:.0f}" if "pdf_bytes" in result else "-"
+            print(f"{name:<36}{result['seconds']:>12.4f}{result['peak_mb']:>11.2f}{size:>10}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\nLínea base guardada en {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nComparando con {args.compare} (revisión {baseline.get('revision')})")
+        if compare(results, baseline["results"], args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
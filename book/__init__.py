@@ -1 +1,4 @@
-# Este archivo puede quedarse vacío, solo habilita importar el módulo "book"
+# Este archivo solo habilita importar el módulo "book"; no debe importar
+# nada pesado, porque main.py lo carga incluso para --version y --dry-run
+
+__version__ = "1.0.0"
@@ -0,0 +1,156 @@
+"""
+Renderizadores del fondo de las ilustraciones de relleno.
+
+Las imágenes se describen con una "especificación" (color de fondo, borde,
+formas decorativas y recuadros) y se dibujan con uno de dos renderizadores:
+
+- "pil": una llamada de ImageDraw por forma e imagen (comportamiento original).
+- "numpy": compone un lote completo de imágenes con operaciones de arrays;
+  requiere NumPy, que es una dependencia opcional.
+
+El texto se dibuja después con PIL en ambos casos.
+
+Formato de la especificación:
+    {
+        "size": (ancho, alto),
+        "background": (r, g, b),
+        "border": ((x0, y0, x1, y1), (r, g, b), grosor),
+        "shapes": [("ellipse" | "rectangle", (x0, y0, x1, y1), (r, g, b)), ...],
+        "boxes": [((x0, y0, x1, y1), (r, g, b)), ...],
+    }
+Las coordenadas son inclusivas, como en ImageDraw.
+"""
+import os
+import logging
+from PIL import Image, ImageDraw
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = ("pil", "numpy")
+
+def renderer_name(renderer=None):
+    """
+    Resuelve qué renderizador usar.
+
+    Args:
+        renderer (str, optional): "pil" o "numpy". Por defecto, la variable de
+            entorno BOOK_IMAGE_RENDERER o "pil"
+
+    Returns:
+        str: Nombre del renderizador disponible
+    """
+    renderer = renderer or os.getenv("BOOK_IMAGE_RENDERER", "pil")
+    if renderer not in RENDERERS:
+        raise ValueError(f"Renderizador de imágenes desconocido: {renderer}")
+    if renderer == "numpy":
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            logger.warning("NumPy no está instalado; se usará el renderizador PIL")
+            return "pil"
+    return renderer
+
+def render_backgrounds(specs, renderer=None):
+    """
+    Dibuja el fondo de una o varias imágenes.
+
+    Args:
+        specs (list[dict]): Especificaciones de las imágenes
+        renderer (str, optional): "pil" o "numpy" (ver renderer_name)
+
+    Returns:
+        list[PIL.Image.Image]: Imágenes RGB en el mismo orden que specs
+    """
+    if renderer_name(renderer) == "numpy":
+        return _render_numpy(specs)
+    return [_render_pil(spec) for spec in specs]
+
+def _render_pil(spec):
+    img = Image.new('RGB', spec["size"], color=spec["background"])
+    draw = ImageDraw.Draw(img)
+    (x0, y0, x1, y1), border_color, border_width = spec["border"]
+    draw.rectangle([(x0, y0), (x1, y1)], outline=border_color, width=border_width)
+    for kind, box, color in spec["shapes"]:
+        if kind == "ellipse":
+            draw.ellipse(list(box), fill=color)
+        else:
+            draw.rectangle(list(box), fill=color)
+    for (x0, y0, x1, y1), color in spec["boxes"]:
+        draw.rectangle([(x0, y0), (x1, y1)], fill=color)
+    return img
+
+_disc_masks = {}
+
+def _ellipse_mask(np, width, height):
+    # Máscara de una elipse inscrita en una caja de width x height píxeles
+    key = (width, height)
+    mask = _disc_masks.get(key)
+    if mask is None:
+        yy, xx = np.ogrid[:height, :width]
+        cx, cy = (width - 1) / 2, (height - 1) / 2
+        rx, ry = max(width / 2, 0.5), max(height / 2, 0.5)
+        mask = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1.0
+        _disc_masks[key] = mask
+    return mask
+
+def _fill_batch(np, rows, indices, box, colors):
+    # Rellenar el mismo rectángulo en varias imágenes del lote con un color por
+    # imagen. rows es el lote visto como (n, alto, ancho * 3): copiar filas
+    # completas ya repetidas es mucho más rápido que difundir un color de 3 bytes
+    x0, y0, x1, y1 = box
+    x0, y0 = max(x0, 0), max(y0, 0)
+    if x1 < x0 or y1 < y0:
+        return
+    pattern = np.tile(colors, (1, x1 - x0 + 1))[:, None, :]
+    rows[indices, y0:y1 + 1, x0 * 3:(x1 + 1) * 3] = pattern
+
+def _render_numpy(specs):
+    import numpy as np
+
+    images = [None] * len(specs)
+    groups = {}
+    for index, spec in enumerate(specs):
+        groups.setdefault(tuple(spec["size"]), []).append(index)
+
+    for (width, height), indices in groups.items():
+        batch = [specs[i] for i in indices]
+        arr = np.empty((len(batch), height, width, 3), dtype=np.uint8)
+        rows = arr.reshape(len(batch), height, width * 3)
+        everything = np.arange(len(batch))
+        backgrounds = np.array([s["background"] for s in batch], dtype=np.uint8)
+        _fill_batch(np, rows, everything, (0, 0, width - 1, height - 1), backgrounds)
+
+        # Bordes y recuadros: misma geometría en todo el lote, un color por imagen
+        by_border = {}
+        for k, spec in enumerate(batch):
+            box, color, border_width = spec["border"]
+            by_border.setdefault((box, border_width), []).append((k, color))
+        for ((x0, y0, x1, y1), w), items in by_border.items():
+            idx = np.array([k for k, _ in items])
+            colors = np.array([c for _, c in items], dtype=np.uint8)
+            _fill_batch(np, rows, idx, (x0, y0, x1, y0 + w - 1), colors)
+            _fill_batch(np, rows, idx, (x0, y1 - w + 1, x1, y1), colors)
+            _fill_batch(np, rows, idx, (x0, y0, x0 + w - 1, y1), colors)
+            _fill_batch(np, rows, idx, (x1 - w + 1, y0, x1, y1), colors)
+
+        # Formas decorativas: posiciones distintas en cada imagen
+        for k, spec in enumerate(batch):
+            for kind, (x0, y0, x1, y1), color in spec["shapes"]:
+                region = arr[k, y0:y1 + 1, x0:x1 + 1]
+                if kind == "ellipse":
+                    mask = _ellipse_mask(np, x1 - x0 + 1, y1 - y0 + 1)
+                    region[mask[:region.shape[0], :region.shape[1]]] = color
+                else:
+                    region[:] = color
+
+        by_box = {}
+        for k, spec in enumerate(batch):
+            for box, color in spec["boxes"]:
+                by_box.setdefault(box, []).append((k, color))
+        for box, items in by_box.items():
+            idx = np.array([k for k, _ in items])
+            _fill_batch(np, rows, idx, box, np.array([c for _, c in items], dtype=np.uint8))
+
+        for k, index in enumerate(indices):
+            images[index] = Image.fromarray(arr[k], "RGB")
+    return images
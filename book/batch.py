@@ -0,0 +1,217 @@
+import os
+import csv
+import json
+import time
+import shutil
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from book.jobs import DEFAULT_OUTPUT_DIR, build_book, coalesce_key, output_paths_for, parse_mode
+from book.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+def load_manifest(path: str) -> list[dict]:
+    """
+    Lee un manifiesto de libros en formato CSV o JSONL.
+
+    El CSV debe tener cabecera con las columnas topic, age_group y, opcionales,
+    output y mode. En JSONL cada línea es un objeto con esas mismas claves.
+
+    Args:
+        path (str): Ruta del manifiesto (.csv o .jsonl).
+
+    Returns:
+        list[dict]: Lista de trabajos con las claves "topic", "age_group", "output" y "mode".
+
+    Raises:
+        ValueError: Si a una fila le falta el tema o la edad, o su modo no es uno de book.jobs.MODES.
+    """
+    jobs = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".json")):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+
+        for line_no, row in enumerate(rows, start=1):
+            topic = (row.get("topic") or "").strip()
+            age_group = (row.get("age_group") or "").strip()
+            if not topic or not age_group:
+                raise ValueError(f"Fila {line_no} del manifiesto sin 'topic' o 'age_group': {row}")
+            mode = row.get("mode") or None
+            if mode is not None:
+                try:
+                    mode = parse_mode(mode)
+                except ValueError as e:
+                    raise ValueError(f"Fila {line_no} del manifiesto: {e}")
+            jobs.append({
+                "topic": topic,
+                "age_group": age_group,
+                "output": (row.get("output") or "").strip() or None,
+                "mode": mode,
+            })
+    return jobs
+
+
+def prepare_jobs(manifest_path: str, mode: str | None = None, use_cache: bool = True,
+                 refresh: bool = False, stream: bool = False, checkpoint: bool = True,
+                 formats: tuple = ("pdf",)) -> list[dict]:
+    """
+    Lee un manifiesto y completa cada trabajo con las opciones del lote.
+
+    Args:
+        manifest_path (str): Ruta del manifiesto CSV o JSONL.
+        mode, use_cache, refresh, stream, checkpoint, formats: Opciones de run_batch.
+
+    Returns:
+        list[dict]: Trabajos listos para build_book.
+    """
+    jobs = load_manifest(manifest_path)
+    for job in jobs:
+        job["mode"] = job["mode"] or mode
+        job["use_cache"] = use_cache
+        job["refresh"] = refresh
+        job["stream"] = stream
+        job["checkpoint"] = checkpoint
+        job["formats"] = formats
+    return jobs
+
+
+def _prerender_covers(jobs: list[dict]) -> None:
+    """
+    Con el renderizador NumPy, dibuja todas las portadas del lote de una vez.
+
+    Las portadas quedan en la caché de imágenes y cada proceso las lee de ahí
+    en lugar de dibujarlas por separado.
+    """
+    from book.background_renderer import renderer_name
+    from book.image_cache import get_image_cache
+    if renderer_name() != "numpy" or get_image_cache() is None:
+        return
+    from book.cover_generator import create_simple_covers
+    books = list(dict.fromkeys((job["topic"], job["age_group"]) for job in jobs))
+    start = time.perf_counter()
+    create_simple_covers(books)
+    print(f"Portadas del lote dibujadas en {time.perf_counter() - start:.2f} s")
+
+
+def _share_result(result: dict, job: dict, output_dir: str) -> dict:
+    """
+    Adapta el resultado de un libro al trabajo repetido que se unió a él,
+    copiando cada archivo generado si el trabajo pedía otra ruta.
+
+    Args:
+        result (dict): Resultado de build_book del trabajo líder.
+        job (dict): Trabajo repetido.
+        output_dir (str): Directorio de salida del lote.
+
+    Returns:
+        dict: Resultado para el trabajo repetido.
+    """
+    shared = dict(result, topic=job["topic"], seconds=0.0, cache_hit=False, resumed=None)
+    if result["status"] != "ok":
+        return shared
+    outputs = output_paths_for(job, output_dir)
+    for name, output_path in outputs.items():
+        source = result["outputs"][name]
+        if os.path.abspath(output_path) == os.path.abspath(source):
+            continue
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.copyfile(source, output_path)
+        except OSError as e:
+            return dict(shared, status="error", error=f"No se pudo copiar {source}: {e}")
+    shared.update(outputs=outputs, output=next(iter(outputs.values())))
+    return shared
+
+
+def run_batch(manifest_path: str, output_dir: str = DEFAULT_OUTPUT_DIR, workers: int | None = None,
+              mode: str | None = None, use_cache: bool = True, refresh: bool = False,
+              stream: bool = False, checkpoint: bool = True, formats: tuple = ("pdf",)) -> list[dict]:
+    """
+    Genera todos los libros de un manifiesto usando un pool de procesos.
+
+    Cada proceso importa los módulos de generación una sola vez y construye
+    varios libros, evitando el arranque del intérprete por libro. Las filas
+    repetidas (mismo tema, edad y modo) se generan una sola vez y las demás
+    reciben una copia de los archivos.
+
+    Args:
+        manifest_path (str): Ruta del manifiesto CSV o JSONL.
+        output_dir (str): Directorio de salida para los PDFs.
+        workers (int, optional): Número de procesos. Por defecto, os.cpu_count().
+        mode (str, optional): Modo de generación para las filas que no indican uno.
+        use_cache (bool): Si es False, no se usa la caché de contenido.
+        refresh (bool): Si es True, se regenera el contenido aunque esté en caché.
+        stream (bool): Si es True, cada PDF se maqueta mientras el modelo genera el contenido.
+        checkpoint (bool): Si es True, cada libro guarda puntos de control y, al relanzar el
+            manifiesto, los libros terminados se saltan y los interrumpidos se retoman.
+        formats (tuple): Formatos de salida de cada libro (ver book.document.FORMATS).
+
+    Returns:
+        list[dict]: Resultados de build_book en el orden del manifiesto.
+    """
+    jobs = prepare_jobs(manifest_path, mode, use_cache, refresh, stream, checkpoint, formats)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    # Cada proceso tiene su propio cliente del modelo: repartir entre ellos la cuota de BOOK_LLM_RPM/TPM
+    os.environ["BOOK_LLM_PROCESSES"] = str(workers)
+    _prerender_covers(jobs)
+
+    print(f"Generando {len(jobs)} libros con {workers} procesos...")
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    done = 0
+
+    def report(index, result):
+        nonlocal done
+        results[index] = result
+        done += 1
+        if result["status"] == "ok":
+            print(f"[{done}/{len(jobs)}] ✅ {result['topic']} -> {result['output']} ({result['seconds']:.1f} s)")
+        else:
+            print(f"[{done}/{len(jobs)}] ❌ {result['topic']}: {result['error']}")
+
+    # Solo el primer trabajo de cada libro repetido se envía al pool
+    flights = SingleFlight()
+    shared = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for index, job in enumerate(jobs):
+            key = coalesce_key(job)
+            flight, leader = flights.claim(key, index)
+            if leader == index:
+                futures[executor.submit(build_book, job, output_dir)] = (index, key)
+            else:
+                shared.append((index, flight))
+        for future in as_completed(futures):
+            index, key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Un proceso del pool murió: registrar el fallo y seguir con el resto
+                logger.error(f"Fallo del proceso para '{jobs[index]['topic']}': {e}")
+                result = {"topic": jobs[index]["topic"], "output": None, "outputs": {}, "status": "error",
+                          "seconds": 0.0, "cache_hit": False, "resumed": None, "fallback": False,
+                          "error": str(e)}
+            flights.resolve(key, result)
+            report(index, result)
+    for index, flight in shared:
+        report(index, _share_result(flight.result(), jobs[index], output_dir))
+
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for r in results if r["status"] == "ok")
+    cache_hits = sum(1 for r in results if r.get("cache_hit"))
+    resumed = sum(1 for r in results if r.get("resumed"))
+    fallbacks = sum(1 for r in results if r.get("fallback"))
+    rate = len(jobs) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"\nLote terminado: {ok}/{len(jobs)} libros correctos en {elapsed:.1f} s ({rate:.1f} libros/min)")
+    print(f"Contenido en caché: {cache_hits} aciertos, {len(jobs) - cache_hits - flights.shared} generados")
+    if resumed:
+        print(f"Retomados desde un punto de control: {resumed}")
+    if fallbacks:
+        print(f"Generados con plantillas porque falló el modelo (se reintentarán en la próxima ejecución): {fallbacks}")
+    if flights.shared:
+        print(f"Libros repetidos en el manifiesto, generados una sola vez: {flights.shared}")
+    return results
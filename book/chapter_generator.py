@@ -1,20 +1,29 @@
-from openai import OpenAI
+from book.llm_client import get_client
+from book.stream_parser import ChapterBlockStreamParser
 
-client = OpenAI()
-
-def generate_chapters(topic: str, age_group: str) -> list:
+def generate_chapters(topic: str, age_group: str, stream: bool = False):
     """
     Genera capítulos sobre el tema dado.
 
+    Args:
+        topic (str): Tema del libro.
+        age_group (str): Grupo de edad del público objetivo.
+        stream (bool): Si es True, devuelve un generador que entrega cada
+            capítulo en cuanto el modelo termina de escribirlo.
+
     Returns:
         list of tuples: Cada uno con (título, contenido del capítulo).
+            Con stream=True, un generador de esas mismas tuplas.
     """
     prompt = (
         f"Escribe al menos 5 capítulos detallados sobre el tema '{topic}' para niños de {age_group}. "
         "Cada capítulo debe incluir un título y un desarrollo claro en párrafos."
     )
 
-    response = client.chat.completions.create(
+    if stream:
+        return _iter_chapters_stream(prompt)
+
+    response = get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7
@@ -23,14 +32,20 @@ def generate_chapters(topic: str, age_group: str) -> list:
     text = response.choices[0].message.content
 
     # Separar los capítulos por títulos (asume formato: Capítulo X: Título)
-    import re
-    matches = re.findall(r"(Capítulo\s\d+:.*?)(?=Capítulo\s\d+:|\Z)", text, re.DOTALL)
+    parser = ChapterBlockStreamParser()
+    return parser.feed(text) + parser.close()
+
+def _iter_chapters_stream(prompt: str):
+    from book.streaming import iter_completion_text
 
-    chapters = []
-    for match in matches:
-        title_match = re.search(r"Capítulo\s\d+:\s*(.*)", match)
-        title = title_match.group(1).strip() if title_match else "Capítulo"
-        content = match.replace(title, "", 1).strip()
-        chapters.append((title, content))
+    response = get_client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        stream=True
+    )
 
-    return chapters
+    parser = ChapterBlockStreamParser()
+    for text in iter_completion_text(response):
+        yield from parser.feed(text)
+    yield from parser.close()
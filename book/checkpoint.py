@@ -0,0 +1,221 @@
+"""
+Puntos de control de los trabajos de libros.
+
+Cada trabajo guarda en su propio directorio el contenido generado, las
+ilustraciones ya dibujadas y las etapas completadas. Si el proceso muere o
+create_pdf falla a mitad del libro, al relanzar el mismo trabajo se retoma
+desde la última etapa completada sin volver a llamar al modelo.
+
+Estructura del directorio de un trabajo:
+
+    stages.json      etapas completadas y último error
+    book_data.json   contenido del libro en formato compacto (etapa "content")
+    images/<clave>.jpg
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import shutil
+import threading
+
+from book.model import Book
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                      "output", "checkpoints")
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class JobCheckpoint:
+    """Estado persistente de un trabajo de libro."""
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Directorio del trabajo (se crea si no existe)
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "images"), exist_ok=True)
+        self._stages = self._read_stages()
+
+    @staticmethod
+    def directory_for(job, output_path, root=None):
+        """
+        Devuelve el directorio del punto de control de un trabajo, sin crearlo.
+
+        Dos ejecuciones del mismo trabajo (mismo tema, edad, modo y PDF de
+        salida) comparten el punto de control.
+
+        Args:
+            job (dict): Trabajo de build_book
+            output_path (str): Ruta del PDF del trabajo
+            root (str, optional): Directorio raíz. Por defecto, la variable
+                BOOK_CHECKPOINT_DIR u output/checkpoints
+
+        Returns:
+            str: Directorio del punto de control
+        """
+        root = root or os.getenv("BOOK_CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+        raw = "\x1f".join([job["topic"].strip().lower(), job["age_group"].strip().lower(),
+                           job.get("mode") or "single", os.path.abspath(output_path)])
+        key = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(root, key)
+
+    @classmethod
+    def for_job(cls, job, output_path, root=None):
+        """
+        Devuelve el punto de control de un trabajo (ver directory_for).
+
+        Args:
+            job (dict): Trabajo de build_book
+            output_path (str): Ruta del PDF del trabajo
+            root (str, optional): Directorio raíz
+
+        Returns:
+            JobCheckpoint: El punto de control
+        """
+        return cls(cls.directory_for(job, output_path, root))
+
+    def _read_stages(self):
+        try:
+            with open(os.path.join(self.directory, "stages.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_stages(self):
+        data = json.dumps(self._stages, ensure_ascii=False, indent=2).encode("utf-8")
+        _write_atomic(os.path.join(self.directory, "stages.json"), data)
+
+    def is_done(self, stage):
+        """
+        Indica si una etapa está completada.
+
+        Args:
+            stage (str): Nombre de la etapa ("content", "pdf"...)
+
+        Returns:
+            bool: True si la etapa se completó
+        """
+        with self._lock:
+            return stage in self._stages.get("done", {})
+
+    def mark_done(self, stage, **info):
+        """
+        Marca una etapa como completada.
+
+        Args:
+            stage (str): Nombre de la etapa
+            **info: Datos adicionales de la etapa (ruta del PDF...)
+        """
+        with self._lock:
+            self._stages.setdefault("done", {})[stage] = dict(info, at=time.time())
+            self._stages.pop("error", None)
+            self._save_stages()
+
+    def stage_info(self, stage):
+        """
+        Devuelve los datos guardados al completar una etapa.
+
+        Args:
+            stage (str): Nombre de la etapa
+
+        Returns:
+            dict or None: Datos de la etapa, o None si no está completada
+        """
+        with self._lock:
+            return self._stages.get("done", {}).get(stage)
+
+    def record_error(self, stage, error):
+        """
+        Registra el fallo de una etapa para diagnosticarlo después.
+
+        Args:
+            stage (str): Etapa que falló
+            error (Exception or str): Error
+        """
+        with self._lock:
+            self._stages["error"] = {"stage": stage, "message": str(error), "at": time.time()}
+            self._save_stages()
+
+    def save_book_data(self, book):
+        """
+        Guarda el contenido del libro y completa la etapa "content".
+
+        Args:
+            book (Book): Contenido del libro
+        """
+        data = json.dumps(book.to_compact(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        _write_atomic(os.path.join(self.directory, "book_data.json"), data)
+        self.mark_done("content")
+
+    def load_book_data(self):
+        """
+        Devuelve el contenido guardado si la etapa "content" está completada.
+
+        Returns:
+            Book or None: Contenido del libro
+        """
+        if not self.is_done("content"):
+            return None
+        try:
+            with open(os.path.join(self.directory, "book_data.json"), encoding="utf-8") as f:
+                return Book.load(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer el contenido del punto de control: {e}")
+            return None
+
+    def _image_path(self, key):
+        return os.path.join(self.directory, "images", f"{key}.jpg")
+
+    def has_image(self, key):
+        """Indica si hay una ilustración guardada con esa clave."""
+        return os.path.exists(self._image_path(key))
+
+    def save_image(self, key, data):
+        """
+        Guarda una ilustración ya dibujada.
+
+        Args:
+            key (str): Clave de la ilustración ("cover", "chapter_3"...)
+            data (bytes): Datos de la imagen
+        """
+        try:
+            _write_atomic(self._image_path(key), data)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la ilustración {key} en el punto de control: {e}")
+
+    def load_image(self, key):
+        """
+        Devuelve una ilustración guardada.
+
+        Args:
+            key (str): Clave de la ilustración
+
+        Returns:
+            bytes or None: Datos de la imagen
+        """
+        try:
+            with open(self._image_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def discard_images(self):
+        """Borra las ilustraciones guardadas (ya no hacen falta cuando el PDF está terminado)."""
+        shutil.rmtree(os.path.join(self.directory, "images"), ignore_errors=True)
+
+    def clear(self):
+        """Borra el punto de control completo para empezar el trabajo desde cero."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, "images"), exist_ok=True)
+        with self._lock:
+            self._stages = {}
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+from book.model import Book
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "cache", "content")
+
+class ContentCache:
+    """
+    Caché en disco del contenido generado, un archivo JSON por entrada con el
+    libro en el formato compacto de Book.to_compact.
+
+    Las entradas se identifican por un hash del tema y la edad normalizados,
+    el modelo, la temperatura y el hash de los prompts. Se eliminan las
+    entradas más antiguas que max_age segundos y, si se supera max_entries o
+    max_bytes, las de uso menos reciente.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=1000, max_bytes=200 * 1024 * 1024,
+                 max_age=30 * 24 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(topic, age_group, model, temperature, prompt_hash):
+        """
+        Calcula la clave de caché de un libro.
+
+        Args:
+            topic (str): Tema del libro
+            age_group (str): Grupo de edad del público objetivo
+            model (str): Modelo usado para generar el contenido
+            temperature (float): Temperatura de generación
+            prompt_hash (str): Hash de los prompts usados
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        normalized = [" ".join(str(value).lower().split()) for value in (topic, age_group)]
+        raw = json.dumps(normalized + [model, float(temperature), prompt_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """
+        Devuelve el libro guardado para una clave, o None si no existe, ha
+        caducado o no es válido. Las entradas escritas como diccionario antes
+        del formato compacto se siguen leyendo.
+
+        Args:
+            key (str): Clave calculada con make_key
+
+        Returns:
+            Book or None: Contenido del libro
+        """
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, encoding="utf-8") as f:
+                book = Book.load(json.load(f))
+            # Marcar como usada recientemente para la expulsión LRU
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return book
+
+    def put(self, key, book):
+        """
+        Guarda un libro en la caché y aplica la política de expulsión.
+
+        Args:
+            key (str): Clave calculada con make_key
+            book (Book): Contenido del libro
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(book.to_compact(), f, ensure_ascii=False, separators=(",", ":"))
+            # Escritura atómica: otros procesos nunca leen un archivo a medias
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el contenido en caché: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Elimina las entradas caducadas y, después, las de uso menos reciente
+        hasta cumplir los límites de número de entradas y tamaño total.
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                # st_atime se actualiza explícitamente en get() (no depende de noatime)
+                entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        Devuelve los contadores de aciertos y fallos de la caché.
+
+        Returns:
+            dict: Diccionario con "hits" y "misses"
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_content_cache():
+    """
+    Devuelve la caché de contenido compartida por el proceso.
+
+    Se configura con las variables de entorno BOOK_CACHE_DIR,
+    BOOK_CACHE_MAX_ENTRIES, BOOK_CACHE_MAX_MB y BOOK_CACHE_MAX_AGE_DAYS.
+
+    Returns:
+        ContentCache: La caché compartida
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ContentCache(
+                directory=os.getenv("BOOK_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_entries=int(os.getenv("BOOK_CACHE_MAX_ENTRIES", "1000")),
+                max_bytes=int(float(os.getenv("BOOK_CACHE_MAX_MB", "200")) * 1024 * 1024),
+                max_age=float(os.getenv("BOOK_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+            )
+        return _cache
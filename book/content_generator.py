@@ -1,174 +1,351 @@
-import os
 import json
+import hashlib
 import logging
-from openai import OpenAI  # Importación actualizada para OpenAI v1.0+
+from book.llm_client import get_client
+from book.model import Book
+from utils.instrumentation import span
 
 logger = logging.getLogger(__name__)
 
-# Inicializar el cliente de OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Cliente del modelo; con None se usa el cliente compartido del proceso (ver book.llm_client)
+client = None
 
-def generate_book_content(topic, age_group):
+MODEL = "gpt-4"  # O el modelo que prefieras usar
+TEMPERATURE = 0.7
+SYSTEM_PROMPT = "Eres un experto en crear contenido educativo extenso y detallado para niños."
+
+# Secciones que se vuelven a pedir por separado si faltan en una respuesta cortada
+REPAIRABLE_SECTIONS = ("introduction", "exercises", "glossary", "conclusion")
+
+# Prompt para generar el libro completo en una sola llamada (se rellena con topic y age_group)
+BOOK_PROMPT = """
+    Crea un libro educativo extenso sobre "{topic}" para niños de {age_group}. 
+    El libro debe tener aproximadamente 50 páginas de contenido y estar organizado de la siguiente manera:
+    
+    1. Una introducción atractiva que despierte el interés.
+    2. De 8 a 10 capítulos principales, cada uno con:
+       - Un título atractivo
+       - Contenido educativo extenso y detallado (aproximadamente 3-4 páginas por capítulo)
+       - Datos curiosos o "¿Sabías que...?" en cada capítulo
+    3. Una sección de ejercicios y actividades para reforzar el aprendizaje.
+    4. Un glosario con términos importantes.
+    5. Una conclusión que resuma los puntos principales.
+    
+    Asegúrate de que el contenido sea:
+    - Apropiado para la edad indicada ({age_group})
+    - Educativo pero entretenido
+    - Detallado y con explicaciones claras
+    - Con suficiente texto para cubrir aproximadamente 50 páginas
+    - Con lenguaje sencillo pero preciso
+    
+    Formatea tu respuesta como un JSON con la siguiente estructura:
+    {{
+        "title": "Título principal del libro",
+        "introduction": "Texto de introducción",
+        "chapters": [
+            {{
+                "title": "Título del capítulo 1", 
+                "content": "Texto extenso del capítulo 1",
+                "fun_fact": "Dato curioso relacionado con este capítulo"
+            }},
+            {{
+                "title": "Título del capítulo 2", 
+                "content": "Texto extenso del capítulo 2",
+                "fun_fact": "Dato curioso relacionado con este capítulo"
+            }},
+            // Más capítulos aquí...
+        ],
+        "exercises": "Ejercicios y actividades detalladas",
+        "glossary": [
+            {{"term": "Término 1", "definition": "Definición 1"}},
+            {{"term": "Término 2", "definition": "Definición 2"}},
+            // Más términos del glosario...
+        ],
+        "conclusion": "Texto de conclusión"
+    }}
     """
-    Genera el contenido de un libro educativo sobre un tema específico para un grupo de edad.
+
+def _strip_markdown(text):
+    content_json = text.strip()
+    
+    # Eliminar cualquier línea de código markdown si existe
+    if "```json" in content_json:
+        content_json = content_json.split("```json")[1].split("```")[0].strip()
+    elif "```" in content_json:
+        content_json = content_json.split("```")[1].split("```")[0].strip()
+    return content_json
+
+def extract_json(text):
+    """
+    Extrae y parsea el JSON de una respuesta del modelo.
+    
+    Args:
+        text (str): Respuesta del modelo, posiblemente envuelta en bloques de código markdown
+        
+    Returns:
+        dict or list: El JSON parseado
+    """
+    with span("json.parse", chars=len(text)):
+        return json.loads(_strip_markdown(text))
+
+def prompt_fingerprint(mode="single"):
+    """
+    Calcula un hash de los prompts usados por un modo de generación.
+    
+    Cambiar el texto de los prompts invalida automáticamente el contenido en caché.
+    
+    Args:
+        mode (str): Modo de generación ("single" u "outline")
+        
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    if mode == "outline":
+        from book.outline_generator import prompt_templates
+        text = prompt_templates()
+    else:
+        text = SYSTEM_PROMPT + BOOK_PROMPT
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _client():
+    return client if client is not None else get_client()
+
+def _generate_single(topic, age_group):
+    """
+    Genera el libro completo con una única llamada al modelo.
     
     Args:
         topic (str): El tema del libro
         age_group (str): El grupo de edad del público objetivo
         
     Returns:
-        dict: Un diccionario con el contenido del libro
+        tuple: El contenido del libro (Book) y False si se tuvo que reparar
+            con _repair_book (True si la respuesta estaba completa)
     """
+    # Crear el prompt para la generación del contenido
+    prompt = BOOK_PROMPT.format(topic=topic, age_group=age_group)
+    
+    # Llamada a la API de OpenAI con la nueva sintaxis
+    with span("llm.request", model=MODEL, mode="single"):
+        response = _client().chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=TEMPERATURE,
+            max_tokens=4000  # Aumentado para permitir más contenido
+        )
+    
+    # Extraer el contenido generado, parsearlo como JSON y validar su estructura
+    choice = response.choices[0]
     try:
-        print(f"Generando contenido para un libro sobre {topic} para niños de {age_group}...")
-        
-        # Crear el prompt para la generación del contenido
-        prompt = f"""
-        Crea un libro educativo extenso sobre "{topic}" para niños de {age_group}. 
-        El libro debe tener aproximadamente 50 páginas de contenido y estar organizado de la siguiente manera:
-        
-        1. Una introducción atractiva que despierte el interés.
-        2. De 8 a 10 capítulos principales, cada uno con:
-           - Un título atractivo
-           - Contenido educativo extenso y detallado (aproximadamente 3-4 páginas por capítulo)
-           - Datos curiosos o "¿Sabías que...?" en cada capítulo
-        3. Una sección de ejercicios y actividades para reforzar el aprendizaje.
-        4. Un glosario con términos importantes.
-        5. Una conclusión que resuma los puntos principales.
+        return Book.from_dict(extract_json(choice.message.content), topic, age_group), True
+    except ValueError as e:
+        reason = "cortada por max_tokens" if choice.finish_reason == "length" else e
+        logger.warning(f"Respuesta del modelo no válida ({reason}); se intenta reparar")
+        return _repair_book(choice.message.content, topic, age_group), False
+
+def _repair_book(text, topic, age_group):
+    """
+    Aprovecha una respuesta cortada o mal formada en lugar de descartarla.
+    
+    Se conservan el título y los capítulos completos, y solo se piden de
+    nuevo al modelo las secciones que faltan (introducción, ejercicios,
+    glosario o conclusión), cada una con una petición corta.
+    
+    Args:
+        text (str): Respuesta del modelo
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
         
-        Asegúrate de que el contenido sea:
-        - Apropiado para la edad indicada ({age_group})
-        - Educativo pero entretenido
-        - Detallado y con explicaciones claras
-        - Con suficiente texto para cubrir aproximadamente 50 páginas
-        - Con lenguaje sencillo pero preciso
+    Returns:
+        Book: El contenido del libro
         
-        Formatea tu respuesta como un JSON con la siguiente estructura:
-        {{
-            "title": "Título principal del libro",
-            "introduction": "Texto de introducción",
-            "chapters": [
-                {{
-                    "title": "Título del capítulo 1", 
-                    "content": "Texto extenso del capítulo 1",
-                    "fun_fact": "Dato curioso relacionado con este capítulo"
-                }},
-                {{
-                    "title": "Título del capítulo 2", 
-                    "content": "Texto extenso del capítulo 2",
-                    "fun_fact": "Dato curioso relacionado con este capítulo"
-                }},
-                // Más capítulos aquí...
-            ],
-            "exercises": "Ejercicios y actividades detalladas",
-            "glossary": [
-                {{"term": "Término 1", "definition": "Definición 1"}},
-                {{"term": "Término 2", "definition": "Definición 2"}},
-                // Más términos del glosario...
-            ],
-            "conclusion": "Texto de conclusión"
-        }}
-        """
+    Raises:
+        ValueError: Si la respuesta no tiene título ni ningún capítulo completo
+    """
+    from book.json_repair import repair_json
+    
+    with span("json.repair", chars=len(text)):
+        data = repair_json(_strip_markdown(text))
+    if not isinstance(data, dict):
+        raise ValueError("El contenido generado no es un objeto JSON")
+    chapters = [chapter for chapter in data.get("chapters") or []
+                if isinstance(chapter, dict) and chapter.get("title") and chapter.get("content")]
+    if not data.get("title") or not chapters:
+        raise ValueError("La respuesta no tiene ningún capítulo completo que aprovechar")
+    data["chapters"] = chapters
+    
+    missing = [section for section in REPAIRABLE_SECTIONS if not data.get(section)]
+    print(f"Respuesta incompleta: se conservan {len(chapters)} capítulos"
+          + (f" y se piden de nuevo: {', '.join(missing)}" if missing else ""))
+    if missing:
+        from book.outline_generator import complete_sections
+        try:
+            data.update(complete_sections(topic, age_group, data["title"],
+                                          [chapter["title"] for chapter in chapters], missing, client=_client()))
+        except Exception as e:
+            # Sin modelo, las secciones que faltan salen de las plantillas offline
+            logger.warning(f"No se pudieron pedir las secciones que faltan ({e}); se usan plantillas")
+            from book.offline_generator import DEFAULT_PACK, generate_offline_book
+            offline = generate_offline_book(topic, age_group, pack=DEFAULT_PACK).to_dict()
+            data.update({section: offline[section] for section in missing})
+    return Book.from_dict(data, topic, age_group)
+
+def _generate_single_stream(topic, age_group, on_complete=None, on_repaired=None, on_fallback=None):
+    """
+    Genera el libro completo con una única llamada al modelo en modo streaming.
+    
+    Si la respuesta se corta (por max_tokens) o el stream falla, el libro se
+    reconstruye con _repair_book a partir del texto recibido y, si no tiene
+    ningún capítulo completo, con las plantillas offline. Los capítulos que
+    ya se estaban maquetando se conservan.
+    
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        on_complete (callable, optional): Se llama con el Book completo al terminar
+        on_repaired (callable, optional): Se llama con el Book reconstruido con
+            _repair_book (nunca con el de las plantillas)
+        on_fallback (callable, optional): Se llama sin argumentos si el libro
+            se tiene que rellenar con las plantillas
         
-        # Llamada a la API de OpenAI con la nueva sintaxis
-        response = client.chat.completions.create(
-            model="gpt-4",  # O el modelo que prefieras usar
+    Returns:
+        StreamedBookData: libro que se rellena a medida que llega la respuesta
+    """
+    from book.streaming import StreamedBookData, iter_book_events, iter_completion_text
+    
+    # Solo se mide hasta la respuesta inicial: el resto llega mientras se maqueta
+    with span("llm.request", model=MODEL, mode="stream"):
+        stream = _client().chat.completions.create(
+            model=MODEL,
             messages=[
-                {"role": "system", "content": "Eres un experto en crear contenido educativo extenso y detallado para niños."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": BOOK_PROMPT.format(topic=topic, age_group=age_group)}
             ],
-            temperature=0.7,
-            max_tokens=4000  # Aumentado para permitir más contenido
+            temperature=TEMPERATURE,
+            max_tokens=4000,
+            stream=True
         )
+    received = []
+    
+    def chunks():
+        for text in iter_completion_text(stream):
+            received.append(text)
+            yield text
+    
+    def recover():
+        try:
+            book = _repair_book("".join(received), topic, age_group)
+        except Exception as e:
+            logger.error(f"No se pudo aprovechar la respuesta en streaming ({e}); se usan plantillas")
+            print(f"Error al generar el contenido del libro: {e}")
+            from book.offline_generator import DEFAULT_PACK, generate_offline_book
+            if on_fallback is not None:
+                on_fallback()
+            return generate_offline_book(topic, age_group, pack=DEFAULT_PACK)
+        if on_repaired is not None:
+            on_repaired(book)
+        return book
+    
+    return StreamedBookData(topic, age_group, iter_book_events(chunks()), on_complete, recover)
+
+def generate_book_content(topic, age_group, mode="single", use_cache=True, refresh=False, stream=False,
+                          on_content=None, on_fallback=None):
+    """
+    Genera el contenido de un libro educativo sobre un tema específico para un grupo de edad.
+    
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        mode (str): "single" para una única llamada al modelo, "outline" para generar
+            primero un esquema y después cada sección en paralelo, u "offline" para
+            rellenar plantillas sin llamar al modelo ni usar la caché (ver book.offline_generator)
+        use_cache (bool): Si es False, no se lee ni se escribe la caché de contenido
+        refresh (bool): Si es True, se ignora el contenido en caché y se regenera
+        stream (bool): En modo "single", devuelve un StreamedBookData que se rellena
+            mientras el modelo genera, para que create_pdf empiece con los primeros capítulos
+        on_content (callable, optional): Se llama con el Book cuando el contenido se
+            obtiene correctamente (de la caché o del modelo), nunca con el de respaldo.
+            Con streaming se llama desde el hilo del stream al terminar
+        on_fallback (callable, optional): Se llama sin argumentos cuando, por un
+            error del modelo, se devuelve el contenido de respaldo de las
+            plantillas. Con streaming se llama desde el hilo del stream, antes
+            de que el libro termine de rellenarse
+        
+    Returns:
+        Book: El contenido del libro (un StreamedBookData con stream=True)
+        
+    Raises:
+        ValueError: Si el modo no es uno de book.jobs.MODES
+    """
+    from book.jobs import MODES
+    
+    # Un modo mal escrito es un error del que llama, no un fallo del modelo
+    if mode not in MODES:
+        raise ValueError(f"Modo de generación desconocido: {mode}")
+    
+    cache = None
+    if use_cache and mode != "offline":
+        from book.content_cache import get_content_cache
+        cache = get_content_cache()
         
-        # Extraer el contenido generado y parsearlo como JSON
-        content_json = response.choices[0].message.content.strip()
+    try:
+        if cache is not None:
+            if mode == "outline":
+                from book.outline_generator import MODEL as model, TEMPERATURE as temperature
+            else:
+                model, temperature = MODEL, TEMPERATURE
+            cache_key = cache.make_key(topic, age_group, model, temperature, prompt_fingerprint(mode))
+            if not refresh:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    print(f"Usando contenido en caché para {topic} ({age_group})")
+                    cached.topic = topic
+                    cached.age_group = age_group
+                    if on_content is not None:
+                        on_content(cached)
+                    return cached
+        
+        print(f"Generando contenido para un libro sobre {topic} para niños de {age_group}...")
         
-        # Eliminar cualquier línea de código markdown si existe
-        if "```json" in content_json:
-            content_json = content_json.split("```json")[1].split("```")[0].strip()
-        elif "```" in content_json:
-            content_json = content_json.split("```")[1].split("```")[0].strip()
-            
-        # Parsear el JSON
-        book_data = json.loads(content_json)
+        complete = True
+        if mode == "outline":
+            from book.outline_generator import generate_book_content_outline
+            with span("llm.outline_book"):
+                book_data = generate_book_content_outline(topic, age_group)
+        elif mode == "offline":
+            from book.offline_generator import generate_offline_book
+            book_data = generate_offline_book(topic, age_group)
+        elif mode == "single" and stream:
+            # La caché se actualiza cuando termina el stream, desde su propio hilo
+            def on_complete(data):
+                if cache is not None:
+                    cache.put(cache_key, data)
+                if on_content is not None:
+                    on_content(data)
+            # Un libro reconstruido no se guarda en la caché, para que se vuelva a generar entero
+            return _generate_single_stream(topic, age_group, on_complete, on_repaired=on_content,
+                                           on_fallback=on_fallback)
+        else:
+            book_data, complete = _generate_single(topic, age_group)
         
-        # Verificar que el JSON tenga la estructura esperada
-        required_keys = ["title", "introduction", "chapters", "exercises", "conclusion"]
-        for key in required_keys:
-            if key not in book_data:
-                raise ValueError(f"El contenido generado no tiene la clave '{key}' esperada")
-            
-        # Agregar topic y age_group al diccionario para uso posterior
-        book_data["topic"] = topic
-        book_data["age_group"] = age_group
+        # Solo se guarda el contenido generado con éxito y entero: ni el de
+        # respaldo ni uno reparado, que se vuelve a generar la próxima vez
+        if cache is not None and complete:
+            cache.put(cache_key, book_data)
+        if on_content is not None:
+            on_content(book_data)
         
         return book_data
         
     except Exception as e:
         logger.error(f"Error al generar el contenido del libro: {e}")
         print(f"Error al generar el contenido del libro: {e}")
-        # Devolver un contenido de respaldo en caso de error
-        return {
-            "topic": topic,
-            "age_group": age_group,
-            "title": f"Todo sobre {topic}",
-            "introduction": f"Bienvenidos a este fascinante viaje por el mundo de {topic}. En este libro exploraremos todos los aspectos interesantes de este tema, adaptados especialmente para niños de {age_group}.",
-            "chapters": [
-                {
-                    "title": f"Introducción a {topic}", 
-                    "content": f"Este capítulo presenta una introducción básica sobre {topic} para niños de {age_group}. Explica los conceptos principales de manera sencilla y amigable.\n\nContinúa con más detalles sobre la importancia de {topic} en nuestra vida diaria y por qué es un tema tan fascinante de estudiar. Los niños aprenderán las bases fundamentales que les ayudarán a entender los siguientes capítulos.",
-                    "fun_fact": f"¿Sabías que...? Un dato muy interesante sobre {topic} es que tiene una historia que se remonta a muchos años atrás."
-                },
-                {
-                    "title": "Conceptos importantes", 
-                    "content": f"Aquí explicamos los conceptos más importantes sobre {topic} de forma sencilla pero detallada. Cada concepto viene con ejemplos prácticos y explicaciones adaptadas para niños de {age_group}.\n\nAdemás, se incluyen ilustraciones conceptuales que ayudarán a los niños a visualizar estos conceptos abstractos de manera concreta y comprensible.",
-                    "fun_fact": f"¿Sabías que...? Hay más de 1000 formas diferentes de aplicar lo que aprendemos sobre {topic} en nuestra vida diaria."
-                },
-                {
-                    "title": "Historia y evolución", 
-                    "content": f"Este capítulo narra la fascinante historia y evolución de {topic} a lo largo del tiempo. Los niños aprenderán cómo ha cambiado y desarrollado, desde sus orígenes hasta la actualidad.\n\nSe presentan las figuras históricas más relevantes que contribuyeron al desarrollo de {topic} y cómo sus descubrimientos o invenciones impactaron al mundo.",
-                    "fun_fact": f"¿Sabías que...? El primer descubrimiento relacionado con {topic} ocurrió por accidente cuando un científico estaba buscando algo completamente diferente."
-                },
-                {
-                    "title": "Aplicaciones prácticas", 
-                    "content": f"Descubre las múltiples aplicaciones prácticas de {topic} en el mundo real. Este capítulo explora cómo se utiliza {topic} en diferentes campos y situaciones cotidianas.\n\nLos niños aprenderán a identificar ejemplos de {topic} en su entorno y comprenderán su importancia práctica a través de ejemplos concretos y relevantes para su edad.",
-                    "fun_fact": f"¿Sabías que...? Todos los días utilizamos al menos 5 cosas que están relacionadas con {topic} sin darnos cuenta."
-                },
-                {
-                    "title": "Experimentos y actividades", 
-                    "content": f"Este emocionante capítulo presenta experimentos y actividades prácticas relacionadas con {topic} que los niños pueden realizar con supervisión adulta. Cada experimento viene con instrucciones paso a paso y explicaciones sobre los principios científicos involucrados.\n\nEstas actividades prácticas refuerzan el aprendizaje teórico y permiten a los niños experimentar de primera mano los conceptos relacionados con {topic}.",
-                    "fun_fact": f"¿Sabías que...? Los científicos que estudian {topic} realizan experimentos similares a los que harás en este capítulo, pero con equipos mucho más sofisticados."
-                },
-                {
-                    "title": "Datos curiosos", 
-                    "content": f"Este capítulo está repleto de datos curiosos y sorprendentes sobre {topic} que fascinarán a los niños. Cada dato viene con una explicación detallada para satisfacer su curiosidad y ampliar su conocimiento.\n\nEstos datos están seleccionados específicamente para captar la atención de niños de {age_group} y despertar su interés por aprender más sobre {topic}.",
-                    "fun_fact": f"¿Sabías que...? El dato más sorprendente sobre {topic} fue descubierto hace apenas 10 años por un equipo internacional de investigadores."
-                },
-                {
-                    "title": f"{topic} en el futuro", 
-                    "content": f"¿Cómo será el futuro de {topic}? Este capítulo explora las tendencias actuales y las posibles evoluciones futuras relacionadas con {topic}. Los niños aprenderán sobre las investigaciones en curso y los desarrollos más prometedores.\n\nTambién se discute cómo estos avances podrían cambiar nuestra forma de vida y qué papel podrían jugar ellos mismos en ese futuro.",
-                    "fun_fact": f"¿Sabías que...? Los expertos predicen que en los próximos 20 años, {topic} cambiará radicalmente gracias a nuevos descubrimientos."
-                },
-                {
-                    "title": "Preguntas frecuentes", 
-                    "content": f"Este capítulo responde a las preguntas más frecuentes que suelen tener los niños sobre {topic}. Cada pregunta tiene una respuesta clara, directa y adaptada al nivel de comprensión de niños de {age_group}.\n\nLas preguntas han sido seleccionadas basándose en la curiosidad natural de los niños y cubren aspectos que quizás no se hayan tratado en profundidad en otros capítulos.",
-                    "fun_fact": f"¿Sabías que...? La pregunta más común sobre {topic} que hacen los niños de todo el mundo es '¿Por qué es importante?'"
-                }
-            ],
-            "exercises": f"Esta sección contiene una variedad de ejercicios y actividades para reforzar lo aprendido sobre {topic}.\n\n1. Preguntas de comprensión: Responde a las siguientes preguntas sobre los capítulos anteriores.\n\n2. Actividades prácticas: Realiza estas actividades con ayuda de un adulto para aplicar lo aprendido.\n\n3. Crucigramas y sopas de letras: Encuentra las palabras clave relacionadas con {topic}.\n\n4. Experimentos sencillos: Siguiendo las instrucciones de seguridad, realiza estos experimentos para ver {topic} en acción.\n\n5. Proyectos creativos: Crea tus propios proyectos relacionados con {topic}.",
-            "glossary": [
-                {"term": f"{topic}", "definition": f"Definición básica de {topic} adaptada para niños de {age_group}."},
-                {"term": "Concepto relacionado 1", "definition": "Definición del primer concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 2", "definition": "Definición del segundo concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 3", "definition": "Definición del tercer concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 4", "definition": "Definición del cuarto concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 5", "definition": "Definición del quinto concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 6", "definition": "Definición del sexto concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 7", "definition": "Definición del séptimo concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 8", "definition": "Definición del octavo concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 9", "definition": "Definición del noveno concepto importante relacionado con el tema."},
-                {"term": "Concepto relacionado 10", "definition": "Definición del décimo concepto importante relacionado con el tema."}
-            ],
-            "conclusion": f"En conclusión, hemos explorado muchos aspectos fascinantes de {topic} a lo largo de este libro. Hemos aprendido sobre su historia, conceptos importantes, aplicaciones prácticas y su posible futuro. Esperamos que este viaje de conocimiento haya sido tan emocionante para ti como lo fue para nosotros al crear este libro.\n\nRecuerda que {topic} es un tema muy amplio y siempre hay más por descubrir. Te animamos a seguir explorando, preguntando y aprendiendo más sobre este fascinante tema. ¡Tu curiosidad es el motor más poderoso para el aprendizaje!"
-        }
\ No newline at end of file
+        # Devolver un contenido de respaldo en caso de error, generado con las
+        # plantillas del paquete incluido (que no depende de ningún archivo)
+        from book.offline_generator import DEFAULT_PACK, generate_offline_book
+        if on_fallback is not None:
+            on_fallback()
+        return generate_offline_book(topic, age_group, pack=DEFAULT_PACK)
\ No newline at end of file
@@ -3,138 +3,210 @@ import logging
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 import random
+from book.fonts import get_font, text_width
+from book.image_cache import get_image_cache, seed_for
+from book.background_renderer import render_backgrounds, renderer_name
+from utils.instrumentation import span
 
 logger = logging.getLogger(__name__)
 
-def generate_cover(topic, age_group):
+# Cambiar la versión cuando cambie el dibujo, para invalidar la caché de imágenes
+RENDERER_VERSION = 1
+COVER_SIZE = (1000, 1400)
+
+def generate_cover(topic, age_group, renderer=None):
     """
     Genera una imagen de portada simple para el libro.
     
     Args:
         topic (str): Tema del libro
         age_group (str): Grupo de edad del público objetivo
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
     Returns:
         bytes: Datos binarios de la imagen generada
     """
     try:
-        return create_simple_cover(topic, age_group)
+        return create_simple_cover(topic, age_group, renderer)
     except Exception as e:
         logger.error(f"Error en la generación de portada: {e}")
         print(f"Error general de portada: {e}")
         return None
 
-def create_simple_cover(topic, age_group):
+def cover_spec(topic, age_group):
     """
-    Crea una portada simple con texto.
+    Describe el fondo de una portada (color, borde, formas y área del título).
     
     Args:
         topic (str): Tema del libro
         age_group (str): Grupo de edad del público objetivo
         
     Returns:
-        bytes: Datos binarios de la imagen generada
+        dict: Especificación para background_renderer
     """
-    try:
-        # Crear una imagen con dimensiones de portada
-        width, height = 1000, 1400
+    width, height = COVER_SIZE
+    rng = random.Random(seed_for(topic, age_group))
+    
+    # Usar un color aleatorio para el fondo
+    background_colors = [
+        (135, 206, 235),  # Azul cielo
+        (144, 238, 144),  # Verde claro
+        (255, 182, 193),  # Rosa claro
+        (255, 218, 185),  # Melocotón
+        (230, 230, 250)   # Lavanda
+    ]
+    bg_color = rng.choice(background_colors)
+    
+    # Borde decorativo
+    border_width = 30
+    border_color = (bg_color[0]-30, bg_color[1]-30, bg_color[2]-30)
+    
+    # Formas decorativas
+    shapes = []
+    for _ in range(20):
+        shape_color = (
+            rng.randint(100, 250),
+            rng.randint(100, 250),
+            rng.randint(100, 250)
+        )
         
-        # Usar un color aleatorio para el fondo
-        background_colors = [
-            (135, 206, 235),  # Azul cielo
-            (144, 238, 144),  # Verde claro
-            (255, 182, 193),  # Rosa claro
-            (255, 218, 185),  # Melocotón
-            (230, 230, 250)   # Lavanda
-        ]
-        bg_color = random.choice(background_colors)
-        img = Image.new('RGB', (width, height), color=bg_color)
-        draw = ImageDraw.Draw(img)
+        # Posición y tamaño aleatorios
+        x = rng.randint(border_width*2, width-border_width*3)
+        y = rng.randint(border_width*2, height-border_width*3)
+        size = rng.randint(30, 100)
         
-        # Añadir un borde decorativo
-        border_width = 30
-        border_color = (bg_color[0]-30, bg_color[1]-30, bg_color[2]-30)
-        draw.rectangle([(border_width, border_width), 
-                        (width-border_width, height-border_width)], 
-                        outline=border_color, width=border_width//2)
+        # Alternar entre círculos y rectángulos
+        kind = "ellipse" if rng.choice([True, False]) else "rectangle"
+        shapes.append((kind, (x, y, x+size, y+size), shape_color))
+    
+    return {
+        "size": COVER_SIZE,
+        "background": bg_color,
+        "border": ((border_width, border_width, width-border_width, height-border_width),
+                   border_color, border_width//2),
+        "shapes": shapes,
+        # Área blanca para el título
+        "boxes": [((100, height//3-100, width-100, height//3+200), (255, 255, 255))],
+    }
+
+def _draw_texts(img, topic, age_group):
+    width, height = img.size
+    draw = ImageDraw.Draw(img)
+    
+    # Fuentes para el texto (se resuelven y cargan una sola vez por proceso)
+    title_font = get_font(72)
+    subtitle_font = get_font(36)
+    
+    # Textos
+    title_text = topic
+    subtitle_text = f"Para niños de {age_group}"
+    author_text = "Un libro educativo ilustrado"
+    
+    # Dibujar textos centrados
+    # Título
+    w_title = text_width(title_font, title_text)
+    x_title = (width - w_title) // 2
+    draw.text((x_title, height//3-50), title_text, fill=(0, 0, 0), font=title_font)
+    
+    # Subtítulo
+    w_subtitle = text_width(subtitle_font, subtitle_text)
+    x_subtitle = (width - w_subtitle) // 2
+    draw.text((x_subtitle, height//3+80), subtitle_text, fill=(0, 0, 0), font=subtitle_font)
+    
+    # Autor/descripción
+    w_author = text_width(subtitle_font, author_text)
+    x_author = (width - w_author) // 2
+    draw.text((x_author, height//3+140), author_text, fill=(0, 0, 0), font=subtitle_font)
+
+def _solid_cover(topic):
+    # Último recurso: crear una portada extremadamente básica
+    try:
+        solid_img = Image.new('RGB', (1000, 1400), color=(240, 240, 240))
+        solid_draw = ImageDraw.Draw(solid_img)
+        solid_draw.rectangle([(50, 50), (950, 1350)], outline=(0, 0, 0), width=10)
         
-        # Añadir formas decorativas
-        for _ in range(20):
-            shape_color = (
-                random.randint(100, 250),
-                random.randint(100, 250),
-                random.randint(100, 250)
-            )
-            
-            # Posición y tamaño aleatorios
-            x = random.randint(border_width*2, width-border_width*3)
-            y = random.randint(border_width*2, height-border_width*3)
-            size = random.randint(30, 100)
-            
-            # Alternar entre círculos y rectángulos
-            if random.choice([True, False]):
-                draw.ellipse([x, y, x+size, y+size], fill=shape_color)
-            else:
-                draw.rectangle([x, y, x+size, y+size], fill=shape_color)
+        font = ImageFont.load_default()
+        solid_draw.text((500, 700), f"Libro sobre {topic}", fill=(0, 0, 0), anchor="mm")
         
-        # Área para el título
-        title_bg = (255, 255, 255, 200)  # Blanco semi-transparente
-        title_box = [(100, height//3-100), (width-100, height//3+200)]
-        draw.rectangle(title_box, fill=title_bg)
+        solid_byte_arr = BytesIO()
+        solid_img.save(solid_byte_arr, format='JPEG')
+        solid_byte_arr.seek(0)
+        return solid_byte_arr.getvalue()
+    except Exception:
+        return None
+
+def create_simple_covers(books, renderer=None):
+    """
+    Crea varias portadas simples de una vez.
+    
+    Las portadas son deterministas para un mismo tema y edad, y el resultado
+    se guarda en la caché de imágenes. Con el renderizador "numpy" los fondos
+    de todas las portadas que no están en caché se componen en un solo lote.
+    
+    Args:
+        books (list[tuple]): Pares (tema, grupo de edad)
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
-        # Fuente para el texto
+    Returns:
+        list[bytes]: Datos de cada portada, en el mismo orden que books
+    """
+    renderer = renderer_name(renderer)
+    cache = get_image_cache()
+    results = [None] * len(books)
+    keys = {}
+    pending = []
+    
+    # Servir desde la caché las portadas que ya se dibujaron
+    for index, (topic, age_group) in enumerate(books):
+        if cache is not None:
+            keys[index] = cache.make_key("cover", topic, age_group, RENDERER_VERSION, renderer, *COVER_SIZE)
+            cached = cache.get(keys[index])
+            if cached is not None:
+                results[index] = cached
+                continue
+        pending.append(index)
+    
+    if not pending:
+        return results
+    
+    with span("cover.render", renderer=renderer, count=len(pending)):
         try:
-            # Intentar usar fuentes del sistema
-            title_font = ImageFont.truetype("arial.ttf", 72)
-            subtitle_font = ImageFont.truetype("arial.ttf", 36)
-        except Exception:
-            # Si falla, usar la fuente por defecto
-            title_font = ImageFont.load_default()
-            subtitle_font = title_font
-        
-        # Textos
-        title_text = topic
-        subtitle_text = f"Para niños de {age_group}"
-        author_text = "Un libro educativo ilustrado"
-        
-        # Dibujar textos centrados
-        # Título
-        w_title = title_font.getbbox(title_text)[2]
-        x_title = (width - w_title) // 2
-        draw.text((x_title, height//3-50), title_text, fill=(0, 0, 0), font=title_font)
+            images = render_backgrounds([cover_spec(*books[i]) for i in pending], renderer)
+        except Exception as e:
+            logger.error(f"Error al crear portada simple: {e}")
+            print(f"Error al crear portada simple: {e}")
+            images = [None] * len(pending)
         
-        # Subtítulo
-        w_subtitle = subtitle_font.getbbox(subtitle_text)[2]
-        x_subtitle = (width - w_subtitle) // 2
-        draw.text((x_subtitle, height//3+80), subtitle_text, fill=(0, 0, 0), font=subtitle_font)
-        
-        # Autor/descripción
-        w_author = subtitle_font.getbbox(author_text)[2]
-        x_author = (width - w_author) // 2
-        draw.text((x_author, height//3+140), author_text, fill=(0, 0, 0), font=subtitle_font)
-        
-        # Guardar la imagen
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        return img_byte_arr.getvalue()
-        
-    except Exception as e:
-        logger.error(f"Error al crear portada simple: {e}")
-        print(f"Error al crear portada simple: {e}")
+        for index, img in zip(pending, images):
+            topic, age_group = books[index]
+            try:
+                if img is None:
+                    raise ValueError("fondo no disponible")
+                _draw_texts(img, topic, age_group)
+                img_byte_arr = BytesIO()
+                img.save(img_byte_arr, format='JPEG')
+                results[index] = img_byte_arr.getvalue()
+                if index in keys:
+                    cache.put(keys[index], results[index])
+            except Exception as e:
+                logger.error(f"Error al crear portada simple: {e}")
+                print(f"Error al crear portada simple: {e}")
+                results[index] = _solid_cover(topic)
+    return results
+
+def create_simple_cover(topic, age_group, renderer=None):
+    """
+    Crea una portada simple con texto.
+    
+    La portada es determinista para un mismo tema y edad, y el resultado se
+    guarda en la caché de imágenes.
+    
+    Args:
+        topic (str): Tema del libro
+        age_group (str): Grupo de edad del público objetivo
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
-        # Último recurso: crear una portada extremadamente básica
-        try:
-            solid_img = Image.new('RGB', (1000, 1400), color=(240, 240, 240))
-            solid_draw = ImageDraw.Draw(solid_img)
-            solid_draw.rectangle([(50, 50), (950, 1350)], outline=(0, 0, 0), width=10)
-            
-            font = ImageFont.load_default()
-            solid_draw.text((500, 700), f"Libro sobre {topic}", fill=(0, 0, 0), anchor="mm")
-            
-            solid_byte_arr = BytesIO()
-            solid_img.save(solid_byte_arr, format='JPEG')
-            solid_byte_arr.seek(0)
-            return solid_byte_arr.getvalue()
-        except:
-            return None
\ No newline at end of file
+    Returns:
+        bytes: Datos binarios de la imagen generada
+    """
+    return create_simple_covers([(topic, age_group)], renderer)[0]
@@ -0,0 +1,257 @@
+"""
+Representación intermedia de un libro listo para maquetar.
+
+El Document se construye una sola vez a partir del contenido (Book) y de las
+ilustraciones, y lo recorren los escritores de cada formato:
+
+- pdf: book.pdf_creator.create_pdf
+- epub: book.epub_writer.write_epub
+- html: book.html_writer.write_html (una página estática autocontenida)
+
+Pedir varios formatos reutiliza el mismo contenido, las mismas imágenes y
+los mismos párrafos ya divididos en lugar de repetir la generación:
+
+    paths = render_book(book, "output/libro.pdf", formats=("pdf", "epub", "html"))
+
+Las secciones se construyen a medida que el primer escritor las recorre, así
+que el PDF puede empezar a maquetarse mientras llegan los capítulos en
+streaming; los siguientes formatos recorren las secciones ya construidas.
+"""
+import os
+import logging
+
+from book.model import Book
+
+logger = logging.getLogger(__name__)
+
+# Formatos de salida admitidos, en el orden en que se escriben
+FORMATS = ("pdf", "epub", "html")
+
+# Extensión del archivo de cada formato
+EXTENSIONS = {"pdf": ".pdf", "epub": ".epub", "html": ".html"}
+
+def split_paragraphs(text):
+    """
+    Divide un texto en párrafos (separados por líneas en blanco).
+
+    Args:
+        text (str): Texto de una sección
+
+    Returns:
+        list[str]: Párrafos
+    """
+    return text.split("\n\n")
+
+def parse_formats(value):
+    """
+    Normaliza una lista de formatos ("pdf,epub" o ["pdf", "epub"]).
+
+    Args:
+        value (str or list): Formatos pedidos; vacío para solo "pdf"
+
+    Returns:
+        tuple: Formatos sin repetir, en el orden de FORMATS
+
+    Raises:
+        ValueError: Si value no es una cadena ni una lista de cadenas, o si
+            algún formato no está en FORMATS
+    """
+    if isinstance(value, str):
+        value = value.split(",")
+    elif value is None:
+        value = ()
+    elif not isinstance(value, (list, tuple)) or not all(isinstance(name, str) for name in value):
+        raise ValueError(f"Los formatos deben ser una cadena o una lista de cadenas, no {value!r}")
+    requested = {name.strip().lower() for name in value if name.strip()} or {"pdf"}
+    unknown = requested - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Formato de salida desconocido: {', '.join(sorted(unknown))}")
+    return tuple(name for name in FORMATS if name in requested)
+
+def output_paths(output_path, formats):
+    """
+    Devuelve la ruta de cada formato, cambiando la extensión de output_path.
+
+    Args:
+        output_path (str): Ruta del libro (normalmente la del PDF)
+        formats (tuple): Formatos de salida
+
+    Returns:
+        dict: Ruta por formato
+    """
+    base = os.path.splitext(output_path)[0]
+    return {name: base + EXTENSIONS[name] for name in formats}
+
+class Section:
+    """Sección del libro en orden de lectura (introducción, capítulo, glosario...)."""
+
+    __slots__ = ("key", "title", "paragraphs", "image_key", "fun_fact", "glossary")
+
+    def __init__(self, key, title, paragraphs=(), image_key=None, fun_fact="", glossary=()):
+        """
+        Args:
+            key (str): Identificador de la sección ("introduction", "chapter_1", "glossary"...)
+            title (str): Título de la sección
+            paragraphs (list[str]): Párrafos del texto
+            image_key (str, optional): Clave de la ilustración de la sección
+            fun_fact (str): Dato curioso (solo en los capítulos)
+            glossary (list[GlossaryEntry]): Términos (solo en el glosario)
+        """
+        self.key = key
+        self.title = title
+        self.paragraphs = paragraphs
+        self.image_key = image_key
+        self.fun_fact = fun_fact
+        self.glossary = glossary
+
+    @property
+    def is_chapter(self):
+        return self.key.startswith("chapter_")
+
+    def __repr__(self):
+        return f"Section({self.key!r})"
+
+class Document:
+    """
+    Libro listo para maquetar: título, secciones e ilustraciones.
+
+    Al crearlo se encargan todas las ilustraciones conocidas; image() espera
+    a cada una cuando un escritor la necesita. Recorrer el documento entrega
+    sus secciones en orden; la primera vez se construyen (esperando al
+    streaming si lo hay) y, con keep_sections=True, las siguientes se
+    reutilizan. Con keep_sections=False el documento solo se puede recorrer
+    una vez y no guarda las secciones ya entregadas.
+    """
+
+    def __init__(self, book, illustrations, keep_sections=True):
+        """
+        Args:
+            book (Book): Contenido del libro (también se acepta el diccionario
+                del JSON del modelo, o un StreamedBookData)
+            illustrations (BookIllustrations): Ilustraciones del libro
+            keep_sections (bool): Si se guardan las secciones para recorrer
+                el documento más de una vez (un escritor por formato)
+        """
+        from book.illustration_pipeline import chapter_image_prompt, exercises_image_prompt
+
+        if type(book) is dict:
+            book = Book.from_dict(book)
+        self.topic = book.topic
+        self.age_group = book.age_group
+        self.title = book.title or f"Libro sobre {self.topic}"
+        chapters = book.chapters
+        # Con streaming los capítulos llegan como un iterador y no se sabe cuántos habrá
+        self.chapter_count = len(chapters) if isinstance(chapters, list) else None
+        self.sections = []
+        self.keep_sections = keep_sections
+        self._illustrations = illustrations
+        self._error = None
+
+        # Encargar todas las ilustraciones conocidas antes de empezar a maquetar;
+        # con streaming, las de los capítulos se encargan a medida que llegan
+        illustrations.request_cover(self.topic, self.age_group)
+        items = [("exercises", exercises_image_prompt(self.topic))]
+        if self.chapter_count is not None:
+            items += [(f"chapter_{i + 1}", chapter_image_prompt(chapter.title, self.topic))
+                      for i, chapter in enumerate(chapters)]
+        illustrations.request(items)
+        self._pending = self._build(book, chapters)
+
+    def _build(self, book, chapters):
+        from book.illustration_pipeline import chapter_image_prompt
+
+        yield Section("introduction", "Introducción", split_paragraphs(book.introduction))
+        for i, chapter in enumerate(chapters):
+            key = f"chapter_{i + 1}"
+            self._illustrations.request([(key, chapter_image_prompt(chapter.title, self.topic))])
+            yield Section(key, chapter.title, split_paragraphs(chapter.content), key, chapter.fun_fact)
+        yield Section("exercises", "Ejercicios y Actividades", split_paragraphs(book.exercises), "exercises")
+        yield Section("glossary", "Glosario", glossary=book.glossary)
+        yield Section("conclusion", "Conclusión", split_paragraphs(book.conclusion))
+
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self.sections):
+                # Un error del streaming se repite a cada escritor, que nunca
+                # debe dar por terminado un libro a medias
+                if self._error is not None:
+                    raise self._error
+                try:
+                    section = next(self._pending, None)
+                except Exception as e:
+                    self._error = e
+                    raise
+                if section is None:
+                    return
+                if not self.keep_sections:
+                    yield section
+                    continue
+                self.sections.append(section)
+            yield self.sections[index]
+            index += 1
+
+    def image(self, key):
+        """
+        Espera y devuelve una ilustración del libro.
+
+        Args:
+            key (str): "cover" o la image_key de una sección
+
+        Returns:
+            bytes or None: Imagen JPEG, o None si no se pudo generar
+        """
+        return self._illustrations.get(key)
+
+def render_book(book, output_path, formats=("pdf",), image_workers=None, checkpoint=None):
+    """
+    Escribe un libro en uno o varios formatos a partir de un único Document.
+
+    Nunca lanza excepciones: como create_pdf, un formato que falla se
+    devuelve con ruta None y los demás se escriben igualmente.
+
+    Args:
+        book (Book): Contenido del libro (o un StreamedBookData)
+        output_path (str): Ruta del libro; cada formato usa su propia extensión
+        formats (tuple): Formatos de salida (ver FORMATS)
+        image_workers (int, optional): Hilos para generar las ilustraciones
+        checkpoint (JobCheckpoint, optional): Punto de control del trabajo
+
+    Returns:
+        dict: Ruta generada por formato, o None si ese formato falló
+    """
+    from book.illustration_pipeline import BookIllustrations
+
+    paths = output_paths(os.path.abspath(output_path), parse_formats(formats))
+    results = dict.fromkeys(paths)
+    illustrations = None
+    try:
+        # Las secciones y las ilustraciones solo se guardan si las lee más de un escritor
+        keep = len(paths) > 1
+        illustrations = BookIllustrations(workers=image_workers, checkpoint=checkpoint, keep=keep)
+        document = Document(book, illustrations, keep_sections=keep)
+        for name, path in paths.items():
+            if name == "pdf":
+                from book.pdf_creator import create_pdf
+                results[name] = create_pdf(book, path, checkpoint=checkpoint, document=document)
+                continue
+            try:
+                if name == "epub":
+                    from book.epub_writer import write_epub
+                    results[name] = write_epub(document, path)
+                else:
+                    from book.html_writer import write_html
+                    results[name] = write_html(document, path)
+                print(f"{name.upper()} generado en {path}")
+            except Exception as e:
+                logger.error(f"Error al generar el {name.upper()}: {e}")
+                print(f"\n❌ Error al generar el {name.upper()}: {e}")
+    except Exception as e:
+        logger.error(f"Error al preparar el libro: {e}")
+        print(f"\n❌ Error al preparar el libro: {e}")
+        if checkpoint is not None:
+            checkpoint.record_error("pdf", e)
+    finally:
+        if illustrations is not None:
+            illustrations.close()
+    return results
@@ -0,0 +1,121 @@
+"""
+Escritor del libro en formato EPUB 3.
+
+Cada sección del Document es un documento XHTML del libro (con el mismo
+marcado que la página HTML) y cada ilustración se guarda una sola vez como
+JPEG dentro del archivo.
+"""
+import os
+import time
+import uuid
+import zipfile
+import threading
+from html import escape
+
+from book.html_writer import STYLE, section_html
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+"""
+
+def _xhtml(title, body):
+    return "\n".join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        "<!DOCTYPE html>",
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" '
+        'lang="es" xml:lang="es">',
+        "<head>",
+        f"<title>{escape(title)}</title>",
+        '<link rel="stylesheet" type="text/css" href="style.css"/>',
+        "</head>",
+        "<body>",
+        body,
+        "</body>",
+        "</html>",
+    ])
+
+def write_epub(document, output_path):
+    """
+    Escribe el libro como EPUB 3.
+
+    Args:
+        document (Document): Libro preparado (ver book.document)
+        output_path (str): Ruta del archivo .epub
+
+    Returns:
+        str: Ruta del archivo generado
+    """
+    sections = list(document)
+    # Identificador estable: el mismo libro genera siempre el mismo EPUB
+    identifier = uuid.uuid5(uuid.NAMESPACE_URL, f"{document.topic}|{document.age_group}|{document.title}")
+    modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    # (id, ruta dentro de OEBPS, tipo MIME, propiedades) de cada archivo del manifiesto
+    manifest = [("nav", "nav.xhtml", "application/xhtml+xml", "nav"),
+                ("style", "style.css", "text/css", None)]
+    files = {"style.css": STYLE}
+
+    cover = document.image("cover")
+    cover_body = [f"<h1>{escape(document.title)}</h1>",
+                  f"<p>Un libro educativo para niños de {escape(document.age_group)}</p>"]
+    if cover:
+        files["images/cover.jpg"] = cover
+        manifest.append(("cover-image", "images/cover.jpg", "image/jpeg", "cover-image"))
+        cover_body.append('<figure><img src="images/cover.jpg" alt="Portada"/></figure>')
+    files["cover.xhtml"] = _xhtml(document.title, "\n".join(cover_body))
+    manifest.append(("cover", "cover.xhtml", "application/xhtml+xml", None))
+    spine = ["cover"]
+
+    for section in sections:
+        image = document.image(section.image_key) if section.image_key else None
+        image_src = None
+        if image:
+            image_src = f"images/{section.image_key}.jpg"
+            files[image_src] = image
+            manifest.append((f"img-{section.image_key}", image_src, "image/jpeg", None))
+        files[f"{section.key}.xhtml"] = _xhtml(section.title, section_html(section, image_src))
+        manifest.append((section.key, f"{section.key}.xhtml", "application/xhtml+xml", None))
+        spine.append(section.key)
+
+    toc = "\n".join(f'<li><a href="{section.key}.xhtml">{escape(section.title)}</a></li>' for section in sections)
+    files["nav.xhtml"] = _xhtml("Índice", f'<nav epub:type="toc" id="toc">\n<h1>Índice</h1>\n<ol>\n{toc}\n</ol>\n</nav>')
+
+    items = "\n".join(
+        f'    <item id="{item_id}" href="{href}" media-type="{media_type}"'
+        + (f' properties="{properties}"' if properties else "") + "/>"
+        for item_id, href, media_type, properties in manifest)
+    itemrefs = "\n".join(f'    <itemref idref="{item_id}"/>' for item_id in spine)
+    files["content.opf"] = f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="es">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:{identifier}</dc:identifier>
+    <dc:title>{escape(document.title)}</dc:title>
+    <dc:language>es</dc:language>
+    <dc:creator>Sistema de Generación de Libros Educativos</dc:creator>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+{items}
+  </manifest>
+  <spine>
+{itemrefs}
+  </spine>
+</package>
+"""
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with zipfile.ZipFile(tmp_path, "w") as epub:
+        # El tipo MIME va primero y sin comprimir, como exige el formato
+        epub.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        epub.writestr("META-INF/container.xml", CONTAINER_XML, compress_type=zipfile.ZIP_DEFLATED)
+        for name, data in files.items():
+            # Las imágenes JPEG ya están comprimidas
+            compression = zipfile.ZIP_STORED if name.endswith(".jpg") else zipfile.ZIP_DEFLATED
+            epub.writestr(f"OEBPS/{name}", data, compress_type=compression)
+    os.replace(tmp_path, output_path)
+    return output_path
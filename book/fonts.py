@@ -0,0 +1,118 @@
+import os
+import logging
+import threading
+from functools import lru_cache
+from PIL import ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Directorios donde se buscan las fuentes, además de los de BOOK_FONT_DIRS
+DEFAULT_FONT_DIRS = [
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    os.path.expanduser("~/Library/Fonts"),
+]
+
+DEFAULT_FONT = "arial.ttf"
+
+_font_dirs = None
+_lock = threading.Lock()
+
+def font_dirs():
+    """
+    Devuelve los directorios de búsqueda de fuentes.
+
+    Returns:
+        list[str]: Directorios de BOOK_FONT_DIRS (separados por os.pathsep)
+            seguidos de los directorios del sistema
+    """
+    global _font_dirs
+    with _lock:
+        if _font_dirs is None:
+            extra = [d for d in os.getenv("BOOK_FONT_DIRS", "").split(os.pathsep) if d]
+            _font_dirs = extra + DEFAULT_FONT_DIRS
+        return list(_font_dirs)
+
+def set_font_dirs(dirs):
+    """
+    Cambia los directorios de búsqueda y vacía las cachés de fuentes.
+
+    Args:
+        dirs (list[str]): Directorios, en orden de preferencia
+    """
+    global _font_dirs
+    with _lock:
+        _font_dirs = list(dirs)
+    _font_index.cache_clear()
+    resolve_font_path.cache_clear()
+    get_font.cache_clear()
+    text_width.cache_clear()
+
+@lru_cache(maxsize=None)
+def _font_index(dirs):
+    # Recorrer los directorios una sola vez: nombre en minúsculas -> ruta
+    index = {}
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.lower().endswith((".ttf", ".otf", ".ttc")):
+                    index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+@lru_cache(maxsize=None)
+def resolve_font_path(name=DEFAULT_FONT):
+    """
+    Busca la ruta de un archivo de fuente (sin distinguir mayúsculas).
+
+    Args:
+        name (str): Nombre del archivo, por ejemplo "arial.ttf"
+
+    Returns:
+        str or None: Ruta absoluta, o None si no se encuentra
+    """
+    if os.path.isabs(name):
+        return name if os.path.exists(name) else None
+    path = _font_index(tuple(font_dirs())).get(name.lower())
+    if path is None:
+        logger.info(f"No se encontró la fuente {name}; se usará la fuente por defecto")
+    return path
+
+@lru_cache(maxsize=64)
+def get_font(size, name=DEFAULT_FONT):
+    """
+    Devuelve la fuente para un tamaño, cargándola una sola vez por proceso.
+
+    Args:
+        size (int): Tamaño en píxeles
+        name (str): Nombre del archivo de fuente
+
+    Returns:
+        ImageFont.FreeTypeFont or ImageFont.ImageFont: La fuente, o la fuente
+            por defecto de PIL si no se encuentra
+    """
+    path = resolve_font_path(name)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError as e:
+            logger.warning(f"No se pudo cargar la fuente {path}: {e}")
+    return ImageFont.load_default()
+
+@lru_cache(maxsize=4096)
+def text_width(font, text):
+    """
+    Mide el ancho de un texto con una fuente, memorizando el resultado.
+
+    Args:
+        font: Fuente devuelta por get_font
+        text (str): Texto a medir
+
+    Returns:
+        int: Ancho en píxeles
+    """
+    return font.getbbox(text)[2]
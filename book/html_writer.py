@@ -0,0 +1,100 @@
+"""
+Escritor del libro como página HTML estática.
+
+La página es un único archivo autocontenido, con los estilos y las
+ilustraciones incrustados, lista para publicarse en cualquier servidor
+estático. El marcado de cada sección es XHTML válido y lo reutiliza el
+escritor de EPUB.
+"""
+import os
+import base64
+import threading
+from html import escape
+
+STYLE = """
+body { font-family: Georgia, serif; max-width: 46em; margin: 0 auto; padding: 1em; line-height: 1.6; color: #222; }
+h1, h2 { font-family: Arial, sans-serif; text-align: center; }
+h2 { margin-top: 3em; }
+figure { margin: 1.5em 0; text-align: center; }
+figure img { max-width: 100%; height: auto; }
+.subtitle { text-align: center; font-size: 1.2em; }
+.fun-fact { background: #f0f0c8; border: 1px solid #c8c896; padding: 0.5em 1em; font-style: italic; }
+dt { font-weight: bold; margin-top: 1em; }
+"""
+
+def _paragraph(text):
+    return "<p>" + escape(text.strip()).replace("\n", "<br/>") + "</p>"
+
+def section_html(section, image_src=None):
+    """
+    Devuelve el marcado de una sección del libro.
+
+    Args:
+        section (Section): Sección del Document
+        image_src (str, optional): URL de la ilustración de la sección
+
+    Returns:
+        str: Elemento <section> en XHTML
+    """
+    parts = [f'<section id="{section.key}">', f"<h2>{escape(section.title)}</h2>"]
+    parts += [_paragraph(paragraph) for paragraph in section.paragraphs if paragraph.strip()]
+    if section.glossary:
+        parts.append("<dl>")
+        for entry in section.glossary:
+            parts.append(f"<dt>{escape(entry.term)}</dt><dd>{escape(entry.definition)}</dd>")
+        parts.append("</dl>")
+    if image_src:
+        parts.append(f'<figure><img src="{image_src}" alt="{escape(section.title)}"/></figure>')
+    if section.fun_fact:
+        parts.append(f'<aside class="fun-fact">{_paragraph(section.fun_fact)}</aside>')
+    parts.append("</section>")
+    return "\n".join(parts)
+
+def _data_uri(image):
+    return "data:image/jpeg;base64," + base64.b64encode(image).decode("ascii")
+
+def write_html(document, output_path):
+    """
+    Escribe el libro como una página HTML autocontenida.
+
+    Args:
+        document (Document): Libro preparado (ver book.document)
+        output_path (str): Ruta del archivo .html
+
+    Returns:
+        str: Ruta del archivo generado
+    """
+    sections = list(document)
+    cover = document.image("cover")
+    body = [f"<h1>{escape(document.title)}</h1>",
+            f'<p class="subtitle">Un libro educativo para niños de {escape(document.age_group)}</p>']
+    if cover:
+        body.append(f'<figure><img src="{_data_uri(cover)}" alt="Portada"/></figure>')
+
+    body.append("<nav>\n<h2>Índice</h2>\n<ol>")
+    body += [f'<li><a href="#{section.key}">{escape(section.title)}</a></li>' for section in sections]
+    body.append("</ol>\n</nav>")
+    for section in sections:
+        image = document.image(section.image_key) if section.image_key else None
+        body.append(section_html(section, _data_uri(image) if image else None))
+
+    page = "\n".join([
+        "<!DOCTYPE html>",
+        '<html lang="es">',
+        "<head>",
+        '<meta charset="utf-8"/>',
+        '<meta name="viewport" content="width=device-width, initial-scale=1"/>',
+        f"<title>{escape(document.title)}</title>",
+        f"<style>{STYLE}</style>",
+        "</head>",
+        "<body>",
+        *body,
+        "</body>",
+        "</html>",
+    ])
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(page)
+    os.replace(tmp_path, output_path)
+    return output_path
@@ -0,0 +1,220 @@
+import os
+import logging
+import contextvars
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from book.cover_generator import generate_cover
+from book.image_generator import generate_image, generate_images
+from book.background_renderer import renderer_name
+
+logger = logging.getLogger(__name__)
+
+# Máximo de hilos o procesos de ilustración por libro si no se indica otro número
+MAX_DEFAULT_WORKERS = 4
+
+def default_workers():
+    """
+    Devuelve los hilos o procesos de ilustración por defecto de un libro.
+
+    Son las CPUs repartidas entre los procesos que generan libros a la vez
+    (run_batch o el servidor con un pool de procesos, ver BOOK_LLM_PROCESSES),
+    hasta MAX_DEFAULT_WORKERS, para que varios libros en paralelo no
+    multipliquen los hilos de dibujo.
+
+    Returns:
+        int: Número de hilos o procesos, al menos 1
+    """
+    processes = max(1, int(os.getenv("BOOK_LLM_PROCESSES", "1")))
+    return max(1, min(MAX_DEFAULT_WORKERS, (os.cpu_count() or 1) // processes))
+
+def chapter_image_prompt(chapter_title, topic):
+    return f"Ilustración educativa para niños sobre '{chapter_title}' relacionado con {topic}"
+
+def exercises_image_prompt(topic):
+    return f"Ilustración para ejercicios y actividades sobre {topic} para niños"
+
+class IllustrationPipeline:
+    """
+    Genera las ilustraciones de un libro en un pool de hilos o procesos.
+
+    Las ilustraciones se encargan al principio (o en cuanto se conoce su
+    prompt) y la maquetación las recoge por clave cuando las necesita, de
+    modo que dibujar y codificar la imagen del capítulo N no bloquea la
+    maquetación del capítulo N+1. El resultado de cada clave es siempre el
+    de su prompt, independientemente del orden en que terminen.
+    """
+
+    def __init__(self, workers=None, executor=None, renderer=None):
+        """
+        Args:
+            workers (int, optional): Número de hilos o procesos. Por defecto,
+                la variable BOOK_IMAGE_WORKERS o default_workers()
+            executor (str, optional): "thread" o "process". Por defecto, la
+                variable BOOK_IMAGE_EXECUTOR o "thread"
+            renderer (str, optional): "pil" o "numpy". Por defecto, la
+                variable BOOK_IMAGE_RENDERER o "pil"
+        """
+        self.renderer = renderer_name(renderer)
+        workers = workers or int(os.getenv("BOOK_IMAGE_WORKERS", "0")) or default_workers()
+        executor = executor or os.getenv("BOOK_IMAGE_EXECUTOR", "thread")
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        elif executor == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ilustraciones")
+        else:
+            raise ValueError(f"Tipo de pool desconocido: {executor}")
+        self._futures = {}
+
+    def _submit(self, func, *args):
+        # En hilos, ejecutar con el contexto actual para que los tiempos se
+        # registren en el libro que encargó la ilustración
+        if isinstance(self._executor, ThreadPoolExecutor):
+            return self._executor.submit(contextvars.copy_context().run, func, *args)
+        return self._executor.submit(func, *args)
+
+    def submit_cover(self, key, topic, age_group):
+        """Encarga la portada del libro."""
+        if key not in self._futures:
+            self._futures[key] = self._submit(generate_cover, topic, age_group, self.renderer)
+
+    def submit(self, key, prompt):
+        """Encarga una ilustración a partir de su prompt."""
+        if key not in self._futures:
+            self._futures[key] = self._submit(generate_image, prompt, self.renderer)
+
+    def submit_many(self, items):
+        """
+        Encarga varias ilustraciones a la vez.
+        
+        Con el renderizador "numpy" se dibujan todas en una sola tarea por
+        lotes; con "pil" cada una va a su propia tarea del pool.
+        
+        Args:
+            items (list[tuple]): Pares (clave, prompt)
+        """
+        items = [(key, prompt) for key, prompt in items if key not in self._futures]
+        if self.renderer != "numpy" or len(items) < 2:
+            for key, prompt in items:
+                self.submit(key, prompt)
+            return
+        
+        batch = self._submit(generate_images, [prompt for _, prompt in items], self.renderer)
+        futures = []
+        for key, _ in items:
+            self._futures[key] = Future()
+            futures.append(self._futures[key])
+        
+        def _distribute(done):
+            # Repartir el resultado del lote entre las claves
+            try:
+                images = done.result()
+            except BaseException as e:
+                for future in futures:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                return
+            for future, image in zip(futures, images):
+                if future.set_running_or_notify_cancel():
+                    future.set_result(image)
+        batch.add_done_callback(_distribute)
+
+    def result(self, key):
+        """
+        Espera y devuelve la ilustración encargada con una clave.
+
+        Args:
+            key (str): Clave usada al encargarla
+
+        Returns:
+            bytes or None: Datos de la imagen, o None si no se pudo generar
+        """
+        future = self._futures.pop(key, None)
+        if future is None:
+            logger.warning(f"No se encargó ninguna ilustración con la clave {key}")
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"Error al generar la ilustración {key}: {e}")
+            return None
+
+    def close(self):
+        """Cancela las ilustraciones pendientes y libera el pool."""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class BookIllustrations:
+    """
+    Ilustraciones de un libro: se encargan al pipeline una sola vez, de modo
+    que todos los formatos de salida usan las mismas imágenes. Las que ya
+    tiene el punto de control del trabajo no se vuelven a dibujar.
+
+    Con keep=True las ilustraciones recogidas se pueden volver a pedir (para
+    un segundo formato): se releen del punto de control o, si no lo hay, se
+    guardan en memoria. Con keep=False cada una se recoge una sola vez y no
+    se guarda, para que la memoria no crezca con la longitud del libro.
+    """
+
+    def __init__(self, workers=None, checkpoint=None, keep=True):
+        """
+        Args:
+            workers (int, optional): Hilos o procesos del pipeline (ver IllustrationPipeline)
+            checkpoint (JobCheckpoint, optional): Punto de control del trabajo
+            keep (bool): Si las ilustraciones se pueden recoger más de una vez
+        """
+        self.checkpoint = checkpoint
+        self.pipeline = IllustrationPipeline(workers=workers)
+        self.keep = keep
+        self._images = {}
+
+    def _pending(self, key):
+        return key not in self._images and (self.checkpoint is None or not self.checkpoint.has_image(key))
+
+    def request_cover(self, topic, age_group):
+        """Encarga la portada si todavía no existe."""
+        if self._pending("cover"):
+            self.pipeline.submit_cover("cover", topic, age_group)
+
+    def request(self, items):
+        """
+        Encarga las ilustraciones que todavía no existen.
+
+        Args:
+            items (list[tuple]): Pares (clave, prompt)
+        """
+        self.pipeline.submit_many([(key, prompt) for key, prompt in items if self._pending(key)])
+
+    def get(self, key):
+        """
+        Espera y devuelve una ilustración; con keep=True las siguientes
+        llamadas con la misma clave devuelven la misma imagen sin esperar.
+
+        Args:
+            key (str): Clave usada al encargarla
+
+        Returns:
+            bytes or None: Datos de la imagen, o None si no se pudo generar
+        """
+        if key in self._images:
+            return self._images[key]
+        image = self.checkpoint.load_image(key) if self.checkpoint is not None else None
+        if image is None:
+            image = self.pipeline.result(key)
+            if image and self.checkpoint is not None:
+                self.checkpoint.save_image(key, image)
+        # Lo que está en el punto de control se relee en lugar de guardarlo en memoria
+        if self.keep and (self.checkpoint is None or not self.checkpoint.has_image(key)):
+            self._images[key] = image
+        return image
+
+    def close(self):
+        """Cancela las ilustraciones pendientes y libera el pool."""
+        self.pipeline.close()
@@ -0,0 +1,179 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output", "cache", "images")
+
+def seed_for(*parts):
+    """
+    Deriva una semilla reproducible a partir del prompt o del tema.
+
+    Args:
+        *parts: Valores que identifican la imagen (prompt, tema, edad...)
+
+    Returns:
+        int: Semilla para random.Random
+    """
+    raw = "\x1f".join(str(part) for part in parts)
+    return int.from_bytes(hashlib.sha256(raw.encode("utf-8")).digest()[:8], "big")
+
+class ImageCache:
+    """
+    Caché en disco de imágenes generadas, direccionada por contenido.
+
+    La clave es un hash de todo lo que determina los bytes de la imagen
+    (tipo, prompt, versión del renderizador y tamaño), así que prompts
+    idénticos en distintos libros o ejecuciones comparten la misma entrada.
+    Cuando el tamaño total supera max_bytes se eliminan las imágenes de uso
+    menos reciente.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Calcula la clave de una imagen.
+
+        Args:
+            *parts: Todo lo que determina los bytes de la imagen
+
+        Returns:
+            str: Clave hexadecimal
+        """
+        raw = "\x1f".join(str(part) for part in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def get(self, key):
+        """
+        Devuelve los bytes de una imagen en caché, o None si no está.
+
+        Args:
+            key (str): Clave calculada con make_key
+
+        Returns:
+            bytes or None: Datos de la imagen
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Marcar como usada recientemente para la expulsión LRU
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """
+        Guarda una imagen y expulsa las menos usadas si se supera el tamaño máximo.
+
+        Args:
+            key (str): Clave calculada con make_key
+            data (bytes): Datos de la imagen
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la imagen en caché: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += len(data)
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _scan_total(self):
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".jpg"):
+                try:
+                    total += os.path.getsize(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        return total
+
+    def evict(self):
+        """Elimina las imágenes de uso menos reciente hasta cumplir max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".jpg"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((max(stat.st_atime, stat.st_mtime), stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and total_bytes > self.max_bytes:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_bytes -= size
+        with self._lock:
+            self._total_bytes = total_bytes
+
+    def stats(self):
+        """
+        Devuelve los contadores de aciertos y fallos de la caché.
+
+        Returns:
+            dict: Diccionario con "hits" y "misses"
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """
+    Devuelve la caché de imágenes compartida por el proceso.
+
+    Se configura con BOOK_IMAGE_CACHE_DIR y BOOK_IMAGE_CACHE_MAX_MB; con
+    BOOK_IMAGE_CACHE=0 se desactiva.
+
+    Returns:
+        ImageCache or None: La caché compartida, o None si está desactivada
+    """
+    global _cache
+    if os.getenv("BOOK_IMAGE_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache(
+                directory=os.getenv("BOOK_IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(float(os.getenv("BOOK_IMAGE_CACHE_MAX_MB", "500")) * 1024 * 1024),
+            )
+        return _cache
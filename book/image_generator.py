@@ -2,110 +2,192 @@ import os
 import requests
 import logging
 from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import random
+from book.fonts import get_font, text_width
+from book.image_cache import get_image_cache, seed_for
+from book.background_renderer import render_backgrounds, renderer_name
+from utils.instrumentation import span
 
 logger = logging.getLogger(__name__)
 
-def generate_image(prompt):
+# Cambiar la versión cuando cambie el dibujo, para invalidar la caché de imágenes
+RENDERER_VERSION = 1
+IMAGE_SIZE = (800, 600)
+
+def generate_image(prompt, renderer=None):
     """
     Genera una imagen simple basada en un prompt.
     
     Args:
         prompt (str): Descripción de la imagen a generar
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
     Returns:
         bytes: Datos binarios de la imagen generada
     """
     try:
         # Método simple: crear una imagen con texto
-        return create_simple_image(prompt)
+        return create_simple_image(prompt, renderer)
     except Exception as e:
         logger.error(f"Error en la generación de imagen: {e}")
         print(f"Error general de imagen: {e}")
         return None
 
-def create_simple_image(text):
+def generate_images(prompts, renderer=None):
     """
-    Crea una imagen simple con texto.
+    Genera varias imágenes simples de una vez.
+    
+    Con el renderizador "numpy" los fondos de todas las imágenes que no están
+    en caché se componen en un solo lote.
     
     Args:
-        text (str): Texto para mostrar en la imagen
+        prompts (list[str]): Descripciones de las imágenes
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
     Returns:
-        bytes: Datos binarios de la imagen generada
+        list[bytes]: Datos de cada imagen (None si no se pudo generar), en el
+            mismo orden que prompts
     """
     try:
-        # Crear una imagen con colores aleatorios
-        width, height = 800, 600
-        
-        # Usar colores pastel aleatorios
-        r = random.randint(180, 240)
-        g = random.randint(180, 240)
-        b = random.randint(180, 240)
-        img = Image.new('RGB', (width, height), color=(r, g, b))
-        
-        # Preparar para dibujar
-        draw = ImageDraw.Draw(img)
-        
-        # Añadir un borde
-        border_color = (r-40, g-40, b-40)
-        draw.rectangle([(20, 20), (width-20, height-20)], outline=border_color, width=10)
-        
-        # Añadir algunas formas decorativas
-        for _ in range(5):
-            shape_r = random.randint(100, 200)
-            shape_g = random.randint(100, 200)
-            shape_b = random.randint(100, 200)
-            shape_color = (shape_r, shape_g, shape_b)
-            
-            # Dibujar círculos aleatorios
-            x = random.randint(50, width-100)
-            y = random.randint(50, height-100)
-            size = random.randint(30, 100)
-            draw.ellipse([x, y, x+size, y+size], fill=shape_color)
+        return create_simple_images(prompts, renderer)
+    except Exception as e:
+        logger.error(f"Error en la generación de imágenes: {e}")
+        print(f"Error general de imagen: {e}")
+        return [generate_image(prompt) for prompt in prompts]
+
+def image_spec(text):
+    """
+    Describe el fondo de una imagen simple (colores, borde y formas).
+    
+    Args:
+        text (str): Texto de la imagen; determina la semilla
         
-        # Preparar el texto
-        # El texto será una versión resumida del prompt
-        if len(text) > 100:
-            display_text = text[:97] + "..."
-        else:
-            display_text = text
-            
-        # Dibujar un rectángulo para el texto
-        text_bg = (255, 255, 255, 180)  # Blanco semi-transparente
-        text_box = [(50, height//2-50), (width-50, height//2+50)]
-        draw.rectangle(text_box, fill=text_bg)
+    Returns:
+        dict: Especificación para background_renderer
+    """
+    width, height = IMAGE_SIZE
+    rng = random.Random(seed_for(text))
+    
+    # Usar colores pastel aleatorios
+    r = rng.randint(180, 240)
+    g = rng.randint(180, 240)
+    b = rng.randint(180, 240)
+    
+    # Borde y caja blanca para el texto
+    border_color = (r-40, g-40, b-40)
+    text_box = (50, height//2-50, width-50, height//2+50)
+    
+    # Círculos decorativos
+    shapes = []
+    for _ in range(5):
+        shape_color = (rng.randint(100, 200), rng.randint(100, 200), rng.randint(100, 200))
+        x = rng.randint(50, width-100)
+        y = rng.randint(50, height-100)
+        size = rng.randint(30, 100)
+        shapes.append(("ellipse", (x, y, x+size, y+size), shape_color))
+    
+    return {
+        "size": IMAGE_SIZE,
+        "background": (r, g, b),
+        "border": ((20, 20, width-20, height-20), border_color, 10),
+        "shapes": shapes,
+        "boxes": [(text_box, (255, 255, 255))],
+    }
+
+def _draw_text(img, text):
+    # El texto será una versión resumida del prompt
+    if len(text) > 100:
+        display_text = text[:97] + "..."
+    else:
+        display_text = text
+    
+    width, height = img.size
+    draw = ImageDraw.Draw(img)
+    # La fuente se resuelve y carga una sola vez por proceso
+    font = get_font(24)
+    text_x = (width - text_width(font, display_text)) // 2
+    draw.text((text_x, height//2-10), display_text, fill=(0, 0, 0), font=font)
+
+def _to_jpeg(img):
+    img_byte_arr = BytesIO()
+    img.save(img_byte_arr, format='JPEG')
+    return img_byte_arr.getvalue()
+
+def _solid_image():
+    # Último recurso: crear una imagen completamente básica
+    try:
+        return _to_jpeg(Image.new('RGB', IMAGE_SIZE, color=(240, 240, 240)))
+    except Exception:
+        return None
+
+def create_simple_images(texts, renderer=None):
+    """
+    Crea varias imágenes simples con texto.
+    
+    Las imágenes son deterministas: los colores y formas salen de una semilla
+    derivada de cada texto, y el resultado se guarda en la caché de imágenes.
+    
+    Args:
+        texts (list[str]): Textos para mostrar en las imágenes
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
-        # Añadir el texto
+    Returns:
+        list[bytes]: Datos de cada imagen, en el mismo orden que texts
+    """
+    renderer = renderer_name(renderer)
+    cache = get_image_cache()
+    results = [None] * len(texts)
+    keys = {}
+    pending = []
+    
+    # Servir desde la caché los prompts que ya se dibujaron
+    for index, text in enumerate(texts):
+        if cache is not None:
+            keys[index] = cache.make_key("image", text, RENDERER_VERSION, renderer, *IMAGE_SIZE)
+            cached = cache.get(keys[index])
+            if cached is not None:
+                results[index] = cached
+                continue
+        pending.append(index)
+    
+    if not pending:
+        return results
+    
+    with span("image.render", renderer=renderer, count=len(pending)):
         try:
-            # Intentar usar una fuente del sistema
-            font = ImageFont.truetype("arial.ttf", 24)
-        except Exception:
-            # Si falla, usar la fuente por defecto
-            font = ImageFont.load_default()
-        
-        # Centrar texto
-        text_width = font.getbbox(display_text)[2]
-        text_x = (width - text_width) // 2
-        draw.text((text_x, height//2-10), display_text, fill=(0, 0, 0), font=font)
-        
-        # Guardar la imagen
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format='JPEG')
-        img_byte_arr.seek(0)
-        return img_byte_arr.getvalue()
+            images = render_backgrounds([image_spec(texts[i]) for i in pending], renderer)
+        except Exception as e:
+            logger.error(f"Error al crear imagen simple: {e}")
+            print(f"Error al crear imagen simple: {e}")
+            images = [None] * len(pending)
         
-    except Exception as e:
-        logger.error(f"Error al crear imagen simple: {e}")
-        print(f"Error al crear imagen simple: {e}")
+        for index, img in zip(pending, images):
+            try:
+                if img is None:
+                    raise ValueError("fondo no disponible")
+                _draw_text(img, texts[index])
+                results[index] = _to_jpeg(img)
+                if index in keys:
+                    cache.put(keys[index], results[index])
+            except Exception as e:
+                logger.error(f"Error al crear imagen simple: {e}")
+                print(f"Error al crear imagen simple: {e}")
+                results[index] = _solid_image()
+    return results
+
+def create_simple_image(text, renderer=None):
+    """
+    Crea una imagen simple con texto.
+    
+    La imagen es determinista: los colores y formas salen de una semilla
+    derivada del texto, y el resultado se guarda en la caché de imágenes.
+    
+    Args:
+        text (str): Texto para mostrar en la imagen
+        renderer (str, optional): "pil" o "numpy" (ver background_renderer)
         
-        # Último recurso: crear una imagen completamente básica
-        try:
-            solid_img = Image.new('RGB', (800, 600), color=(240, 240, 240))
-            solid_byte_arr = BytesIO()
-            solid_img.save(solid_byte_arr, format='JPEG')
-            solid_byte_arr.seek(0)
-            return solid_byte_arr.getvalue()
-        except:
-            return None
\ No newline at end of file
+    Returns:
+        bytes: Datos binarios de la imagen generada
+    """
+    return create_simple_images([text], renderer)[0]
@@ -0,0 +1,259 @@
+import os
+import re
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Directorio de salida por defecto (output/ junto a main.py)
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output")
+
+# Modos de generación de generate_book_content
+MODES = ("single", "outline", "offline")
+
+
+def parse_mode(value) -> str:
+    """
+    Valida el modo de generación de un trabajo.
+
+    Args:
+        value: Modo pedido; vacío o None para "single".
+
+    Returns:
+        str: Uno de MODES.
+
+    Raises:
+        ValueError: Si el modo no es uno de MODES.
+    """
+    if value is None or value == "":
+        return "single"
+    if not isinstance(value, str) or value.strip() not in MODES:
+        raise ValueError(f"Modo de generación desconocido: {value!r} (se admiten: {', '.join(MODES)})")
+    return value.strip()
+
+
+def parse_flag(value, name: str, default: bool) -> bool:
+    """
+    Valida una opción booleana de un trabajo (por ejemplo, del cuerpo JSON de
+    una petición).
+
+    Args:
+        value: Valor pedido: booleano, o cadena "true"/"false", "1"/"0",
+            "yes"/"no", "sí"/"no"; None o vacío para el valor por defecto.
+        name (str): Nombre de la opción, para el mensaje de error.
+        default (bool): Valor si no se indica.
+
+    Returns:
+        bool: El valor de la opción.
+
+    Raises:
+        ValueError: Si el valor no se puede interpretar como booleano.
+    """
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ("true", "1", "yes", "si", "sí"):
+            return True
+        if text in ("false", "0", "no"):
+            return False
+    raise ValueError(f"La opción {name!r} debe ser true o false, no {value!r}")
+
+
+def output_filename(topic: str) -> str:
+    """
+    Devuelve el nombre de archivo PDF por defecto para un tema.
+
+    Todo lo que no es una letra, un dígito o un guion se sustituye por "_",
+    de modo que el nombre nunca contiene separadores de ruta ni "..": el
+    tema puede venir del cuerpo de una petición al servidor.
+
+    Args:
+        topic (str): Tema del libro.
+
+    Returns:
+        str: Nombre del archivo, por ejemplo "libro_los_planetas.pdf".
+    """
+    name = re.sub(r"[^\w-]+", "_", topic.lower()).strip("_")
+    return f"libro_{name}.pdf"
+
+
+def output_path_for(job: dict, output_dir: str = DEFAULT_OUTPUT_DIR) -> str:
+    """
+    Devuelve la ruta del PDF de un trabajo.
+
+    Args:
+        job (dict): Trabajo con "topic" y, opcionalmente, "output".
+        output_dir (str): Directorio para las rutas relativas.
+
+    Returns:
+        str: Ruta del PDF.
+    """
+    output_path = job.get("output") or output_filename(job["topic"])
+    if not os.path.isabs(output_path):
+        output_path = os.path.join(output_dir, output_path)
+    return output_path
+
+
+def output_paths_for(job: dict, output_dir: str = DEFAULT_OUTPUT_DIR) -> dict:
+    """
+    Devuelve la ruta de cada formato de salida de un trabajo.
+
+    Args:
+        job (dict): Trabajo con "topic" y, opcionalmente, "output" y "formats".
+        output_dir (str): Directorio para las rutas relativas.
+
+    Returns:
+        dict: Ruta por formato, en el orden de book.document.FORMATS.
+    """
+    from book.document import output_paths, parse_formats
+
+    return output_paths(output_path_for(job, output_dir), parse_formats(job.get("formats")))
+
+
+def coalesce_key(job: dict) -> tuple:
+    """
+    Devuelve la clave con la que se agrupan los trabajos idénticos en curso
+    (ver book.singleflight): dos trabajos con la misma clave generan el mismo
+    libro aunque se guarden en rutas distintas.
+
+    Args:
+        job (dict): Trabajo como en build_book.
+
+    Returns:
+        tuple: Tema y edad normalizados, modo, opciones de caché y formatos.
+    """
+    from book.document import parse_formats
+
+    return (" ".join(job["topic"].split()).lower(), " ".join(job["age_group"].split()).lower(),
+            job.get("mode") or "single", job.get("use_cache", True), job.get("refresh", False),
+            parse_formats(job.get("formats")))
+
+
+def plan_job(job: dict, output_dir: str = DEFAULT_OUTPUT_DIR) -> dict:
+    """
+    Describe lo que haría build_book con un trabajo, sin llamar al modelo ni
+    importar los módulos de generación (para --dry-run).
+
+    Args:
+        job (dict): Trabajo como en build_book.
+        output_dir (str): Directorio donde se guardan los PDFs con nombre relativo.
+
+    Returns:
+        dict: "topic", "age_group", "mode", "output" (ruta del primer formato),
+            "outputs" (ruta por formato) y "resume" (etapa desde la
+            que se retomaría el trabajo: "pdf" si ya está terminado, "content"
+            si el contenido está guardado, o None si empieza de cero).
+    """
+    from book.checkpoint import JobCheckpoint
+
+    output_path = output_path_for(job, output_dir)
+    outputs = output_paths_for(job, output_dir)
+    resume = None
+    if job.get("checkpoint", True) and not job.get("refresh", False) and os.getenv("BOOK_CHECKPOINTS", "1") != "0":
+        directory = JobCheckpoint.directory_for(job, output_path)
+        if os.path.isdir(directory):
+            checkpoint = JobCheckpoint(directory)
+            if checkpoint.is_done("pdf") and all(os.path.exists(path) for path in outputs.values()):
+                resume = "pdf"
+            elif checkpoint.is_done("content"):
+                resume = "content"
+    return {"topic": job["topic"], "age_group": job["age_group"], "mode": job.get("mode") or "single",
+            "output": next(iter(outputs.values())), "outputs": outputs, "resume": resume}
+
+
+def build_book(job: dict, output_dir: str = DEFAULT_OUTPUT_DIR) -> dict:
+    """
+    Genera el contenido y el PDF de un único libro.
+
+    Es la unidad de trabajo que ejecutan tanto el modo interactivo como el
+    modo por lotes, por lo que nunca lanza excepciones: los errores se
+    devuelven en el resultado.
+
+    Args:
+        job (dict): Trabajo con las claves "topic", "age_group" y, opcionalmente,
+            "output", "mode" (modo de generación de generate_book_content),
+            "use_cache" y "refresh" (uso de la caché de contenido), "stream"
+            (maquetar los capítulos a medida que el modelo los genera) y
+            "checkpoint" (False para no guardar ni retomar puntos de control) y
+            "formats" (formatos de salida, ver book.document.FORMATS; por defecto, solo PDF).
+        output_dir (str): Directorio donde se guardan los PDFs con nombre relativo.
+
+    Returns:
+        dict: Resultado con "topic", "output" (ruta del primer formato),
+            "outputs" (ruta por formato), "status" ("ok" o "error"),
+            "seconds", "cache_hit", "resumed" (última etapa retomada de un
+            punto de control, o None), "fallback" (True si el modelo falló y
+            el libro se rellenó con las plantillas; el punto de control no lo
+            da por terminado, para que la siguiente ejecución lo vuelva a
+            intentar) y "error".
+    """
+    # Los módulos de cada etapa se importan al llegar a ella: un trabajo ya
+    # terminado no carga OpenAI ni FPDF, y uno retomado no carga OpenAI
+    from book.checkpoint import JobCheckpoint
+    from utils.instrumentation import record, span
+
+    topic = job["topic"]
+    age_group = job["age_group"]
+    output_path = output_path_for(job, output_dir)
+    outputs = output_paths_for(job, output_dir)
+
+    start = time.perf_counter()
+    result = {"topic": topic, "output": next(iter(outputs.values())), "outputs": outputs, "status": "error",
+              "seconds": 0.0, "cache_hit": False, "resumed": None, "fallback": False, "error": None}
+    use_cache = job.get("use_cache", True)
+    try:
+        checkpoint = None
+        if job.get("checkpoint", True) and os.getenv("BOOK_CHECKPOINTS", "1") != "0":
+            checkpoint = JobCheckpoint.for_job(job, output_path)
+            if job.get("refresh", False):
+                checkpoint.clear()
+            elif checkpoint.is_done("pdf") and all(os.path.exists(path) for path in outputs.values()):
+                # El trabajo ya terminó en una ejecución anterior
+                result.update(status="ok", resumed="pdf", seconds=time.perf_counter() - start)
+                return result
+
+        with record(topic):
+            book_data = checkpoint.load_book_data() if checkpoint is not None else None
+            if book_data is not None:
+                print(f"Retomando {topic} ({age_group}) desde el punto de control")
+                result["resumed"] = "content"
+            else:
+                from book.content_generator import generate_book_content
+                if use_cache:
+                    from book.content_cache import get_content_cache
+                    hits_before = get_content_cache().stats()["hits"]
+                with span("content"):
+                    book_data = generate_book_content(
+                        topic, age_group, mode=job.get("mode") or "single", use_cache=use_cache,
+                        refresh=job.get("refresh", False), stream=job.get("stream", False),
+                        on_content=checkpoint.save_book_data if checkpoint is not None else None,
+                        on_fallback=lambda: result.update(fallback=True))
+                if use_cache:
+                    result["cache_hit"] = get_content_cache().stats()["hits"] > hits_before
+            from book.document import render_book
+            with span("pdf"):
+                generated = render_book(book_data, output_path, tuple(outputs), checkpoint=checkpoint)
+        failed = [name for name, path in generated.items() if not path]
+        if not failed:
+            result["status"] = "ok"
+            result["outputs"] = generated
+            result["output"] = next(iter(generated.values()))
+            if result["fallback"]:
+                # Un libro de plantillas no es una etapa terminada: las
+                # ilustraciones son de sus capítulos, no de los del modelo
+                print(f"⚠️ {topic}: el modelo falló y se usaron plantillas; se volverá a generar la próxima vez")
+                if checkpoint is not None:
+                    checkpoint.discard_images()
+            elif checkpoint is not None:
+                checkpoint.mark_done("pdf", output=result["output"], outputs=generated)
+                checkpoint.discard_images()
+        else:
+            result["error"] = f"No se generó el archivo: {', '.join(failed)}"
+    except Exception as e:
+        logger.error(f"Error al generar el libro sobre {topic}: {e}")
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
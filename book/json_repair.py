@@ -0,0 +1,120 @@
+"""
+Reparación del JSON incompleto o mal formado que devuelve el modelo.
+
+Cuando la respuesta se corta por max_tokens, el JSON queda abierto a mitad de
+un capítulo o de una sección. En lugar de tirar la respuesta entera,
+repair_json la recorta hasta el último valor completo y cierra las cadenas,
+listas y objetos que quedaron abiertos:
+
+    {"title": "Volcanes", "chapters": [{"title": "1", "content": "..."},
+     {"title": "2", "conte
+
+se convierte en
+
+    {"title": "Volcanes", "chapters": [{"title": "1", "content": "..."}]}
+
+Además se toleran los errores habituales del modelo: comentarios // copiados
+de la plantilla del prompt, comas antes de } o ], saltos de línea sin escapar
+dentro de las cadenas y texto después del JSON.
+"""
+import json
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _closing(stack):
+    return "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+def _drop_trailing_comma(out):
+    # Quitar la coma (y los espacios) que queden justo antes de un cierre
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+def repair_json(text):
+    """
+    Parsea un JSON posiblemente cortado o con errores menores.
+
+    Si el JSON no está completo, se conserva todo hasta el último valor
+    completo: los miembros del objeto principal que estén enteros y, dentro
+    de las listas, los elementos que se cerraron. Un capítulo cortado a medias
+    se descarta entero en lugar de conservarse con el texto incompleto.
+
+    Args:
+        text (str): Texto del JSON, sin bloques de código markdown
+
+    Returns:
+        dict or list: El JSON reparado
+
+    Raises:
+        ValueError: Si el texto no contiene un JSON que se pueda reparar
+    """
+    starts = [index for index in (text.find("{"), text.find("[")) if index >= 0]
+    if not starts:
+        raise ValueError("La respuesta no contiene ningún JSON")
+
+    out = []
+    stack = []
+    in_string = escape = False
+    # Último punto en que todo lo anterior es JSON completo: (longitud de out, pila)
+    safe = None
+    i, n = min(starts), len(text)
+    while i < n:
+        ch = text[i]
+        i += 1
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+            continue
+        if ch == "/" and text.startswith("/", i):
+            # Comentario hasta el final de la línea
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            out.append(ch)
+            if stack:
+                stack.pop()
+            if not stack:
+                # JSON completo; lo que venga después no forma parte de él
+                break
+            if len(stack) == 1 or (len(stack) == 2 and stack[-1] == "["):
+                # Se cerró un miembro del objeto principal o un elemento de una
+                # de sus listas (un capítulo entero); lo que se cierra más
+                # adentro, como una lista de párrafos, no basta para conservar
+                # el capítulo que la contiene
+                safe = (len(out), tuple(stack))
+            continue
+        elif ch == "," and len(stack) == 1:
+            safe = (len(out), tuple(stack))
+        out.append(ch)
+
+    candidates = []
+    if not stack:
+        candidates.append("".join(out))
+    else:
+        if not in_string and len(stack) == 1:
+            # Cortado entre dos miembros del objeto principal: basta con cerrarlo
+            body = "".join(out).rstrip().rstrip(",")
+            candidates.append(body + _closing(stack))
+        if safe is not None:
+            length, safe_stack = safe
+            candidates.append("".join(out[:length]).rstrip().rstrip(",") + _closing(safe_stack))
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate, strict=False)
+        except ValueError:
+            continue
+    raise ValueError("No se pudo reparar el JSON de la respuesta")
@@ -0,0 +1,352 @@
+"""
+Cliente compartido del modelo de lenguaje.
+
+Todos los generadores de contenido piden el cliente con get_client() en lugar
+de crear el suyo al importarse. El cliente es único por proceso y añade a las
+llamadas de OpenAI:
+
+- Un pool de conexiones HTTP (httpx) que se reutiliza entre libros.
+- Límites de peticiones y de tokens por minuto (cubos de tokens).
+- Concurrencia adaptativa (AIMD): el número de peticiones simultáneas crece
+  poco a poco mientras todo va bien y se reduce a la mitad con cada 429.
+- Reintentos con espera exponencial y jitter ante 429, errores 5xx, timeouts
+  y fallos de conexión. Un 429 con cabecera Retry-After detiene todas las
+  peticiones del proceso durante ese tiempo, no solo la que lo recibió.
+
+Configuración (variables de entorno):
+
+- OPENAI_API_KEY y OPENAI_BASE_URL: como en el cliente de OpenAI; con
+  OPENAI_BASE_URL se puede apuntar a utils/fake_openai_server.py.
+- BOOK_LLM_RPM y BOOK_LLM_TPM: peticiones y tokens por minuto de la cuota
+  (0, el valor por defecto, para no limitar). En el modo por lotes la cuota
+  se reparte entre los procesos (BOOK_LLM_PROCESSES).
+- BOOK_LLM_CONCURRENCY: máximo de peticiones simultáneas por proceso.
+- BOOK_LLM_MAX_RETRIES: reintentos por petición.
+- BOOK_LLM_TIMEOUT: segundos de espera de cada petición.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_TIMEOUT = 120.0
+
+# Espera de los reintentos: BACKOFF_BASE * 2^intento, como mucho BACKOFF_MAX segundos
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Caracteres por token para estimar el tamaño de un prompt antes de enviarlo
+CHARS_PER_TOKEN = 4
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _env_number(name, default, kind=float):
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        logger.warning(f"Valor no válido en {name}: {value}")
+        return default
+
+class TokenBucket:
+    """
+    Cubo de tokens que limita un consumo por minuto.
+
+    El cubo empieza lleno (se permite una ráfaga de una cuota completa) y se
+    rellena de forma continua. El saldo puede quedar negativo cuando el
+    consumo real resulta mayor que el estimado; las siguientes peticiones
+    esperan hasta pagar la deuda.
+    """
+
+    def __init__(self, per_minute):
+        """
+        Args:
+            per_minute (float): Consumo permitido por minuto
+        """
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1.0):
+        """
+        Espera hasta que haya saldo y lo consume.
+
+        Args:
+            amount (float): Cantidad a consumir (se limita a la capacidad del cubo)
+
+        Returns:
+            float: Segundos de espera
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, amount):
+        """
+        Corrige el saldo con el consumo real (positivo para devolver, negativo para cobrar).
+
+        Args:
+            amount (float): Diferencia entre lo estimado y lo consumido
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+class AdaptiveConcurrency:
+    """
+    Límite de peticiones simultáneas con incremento aditivo y reducción
+    multiplicativa (AIMD), como el control de congestión de TCP.
+
+    Cada petición correcta suma 1/límite (un hueco más por cada "ventana"
+    completa sin errores) y cada 429 divide el límite entre dos.
+    """
+
+    def __init__(self, maximum, initial=None, minimum=1):
+        """
+        Args:
+            maximum (int): Límite máximo
+            initial (int, optional): Límite inicial. Por defecto, la mitad del máximo
+            minimum (int): Límite mínimo
+        """
+        self.maximum = max(1, int(maximum))
+        self.minimum = max(1, min(int(minimum), self.maximum))
+        self.limit = float(initial if initial is not None else max(self.minimum, self.maximum // 2))
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Espera a que haya un hueco libre y lo ocupa."""
+        with self._condition:
+            while self.active >= int(self.limit):
+                self._condition.wait()
+            self.active += 1
+
+    def release(self, throttled=False):
+        """
+        Libera un hueco y ajusta el límite.
+
+        Args:
+            throttled (bool): True si la petición recibió un 429
+        """
+        with self._condition:
+            self.active -= 1
+            if throttled:
+                self.limit = max(float(self.minimum), self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+def _retry_after(error):
+    # Segundos indicados por el servidor en la cabecera Retry-After, si los hay
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Calcula la espera antes de un reintento (exponencial con jitter completo).
+
+    Args:
+        attempt (int): Número de reintento, empezando en 0
+        retry_after (float, optional): Espera mínima indicada por el servidor
+
+    Returns:
+        float: Segundos de espera
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+def estimate_tokens(kwargs):
+    """
+    Estima los tokens de una petición de chat: prompt más respuesta máxima.
+
+    Args:
+        kwargs (dict): Argumentos de chat.completions.create
+
+    Returns:
+        int: Tokens estimados
+    """
+    chars = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", ()))
+    return chars // CHARS_PER_TOKEN + int(kwargs.get("max_tokens") or 0)
+
+class LLMClient:
+    """
+    Cliente de chat de OpenAI con pool de conexiones, límites de cuota,
+    concurrencia adaptativa y reintentos.
+
+    Se usa igual que el cliente de OpenAI (client.chat.completions.create),
+    así que los generadores no necesitan saber qué cliente reciben. Desde
+    código asíncrono se usa acreate.
+    """
+
+    def __init__(self, api_key=None, base_url=None, rpm=None, tpm=None, concurrency=None,
+                 max_retries=None, timeout=None):
+        """
+        Args:
+            api_key (str, optional): Clave de la API. Por defecto, OPENAI_API_KEY
+            base_url (str, optional): URL de la API. Por defecto, OPENAI_BASE_URL
+            rpm (float, optional): Peticiones por minuto (0 para no limitar)
+            tpm (float, optional): Tokens por minuto (0 para no limitar)
+            concurrency (int, optional): Máximo de peticiones simultáneas
+            max_retries (int, optional): Reintentos por petición
+            timeout (float, optional): Segundos de espera de cada petición
+        """
+        import httpx
+        from openai import OpenAI
+
+        processes = max(1, _env_number("BOOK_LLM_PROCESSES", 1, int))
+        rpm = _env_number("BOOK_LLM_RPM", 0) / processes if rpm is None else rpm
+        tpm = _env_number("BOOK_LLM_TPM", 0) / processes if tpm is None else tpm
+        concurrency = concurrency or _env_number("BOOK_LLM_CONCURRENCY", DEFAULT_CONCURRENCY, int)
+        self.max_retries = (max_retries if max_retries is not None
+                            else _env_number("BOOK_LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES, int))
+        timeout = timeout or _env_number("BOOK_LLM_TIMEOUT", DEFAULT_TIMEOUT)
+
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveConcurrency(concurrency)
+        self._paused_until = 0.0
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "waited": 0.0}
+        self._stats_lock = threading.Lock()
+
+        # Los reintentos los gestiona este cliente, no el de OpenAI
+        self._http = httpx.Client(limits=httpx.Limits(max_connections=concurrency * 2,
+                                                      max_keepalive_connections=concurrency),
+                                  timeout=timeout)
+        self._openai = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), base_url=base_url,
+                              http_client=self._http, max_retries=0, timeout=timeout)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _count(self, **changes):
+        with self._stats_lock:
+            for key, value in changes.items():
+                self.stats[key] += value
+
+    def create(self, **kwargs):
+        """
+        Llama a chat.completions.create respetando los límites y reintentando
+        los errores transitorios.
+
+        Con stream=True el hueco de concurrencia se libera al recibir la
+        respuesta inicial; el resto del stream no cuenta para el límite.
+
+        Args:
+            **kwargs: Argumentos de chat.completions.create
+
+        Returns:
+            La respuesta de OpenAI (o el stream con stream=True)
+
+        Raises:
+            openai.APIError: Si la petición falla tras agotar los reintentos
+                o con un error que no se reintenta (400, 401...)
+        """
+        import openai
+
+        estimate = estimate_tokens(kwargs)
+        if self.tokens is not None:
+            # acquire no cobra más que la capacidad del cubo: corregir sobre lo cobrado
+            estimate = min(estimate, self.tokens.capacity)
+        attempt = 0
+        while True:
+            with self._stats_lock:
+                paused_until = self._paused_until
+            waited = max(0.0, paused_until - time.monotonic())
+            if waited:
+                time.sleep(waited)
+            if self.requests is not None:
+                waited += self.requests.acquire(1)
+            if self.tokens is not None:
+                waited += self.tokens.acquire(estimate)
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                self._count(requests=1, waited=waited)
+                response = self._openai.chat.completions.create(**kwargs)
+            except (openai.RateLimitError, openai.InternalServerError,
+                    openai.APIConnectionError) as e:
+                throttled = isinstance(e, openai.RateLimitError)
+                self._count(throttled=int(throttled), errors=1)
+                if attempt >= self.max_retries:
+                    raise
+                retry_after = _retry_after(e)
+                if throttled and retry_after:
+                    with self._stats_lock:
+                        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                delay = backoff_delay(attempt, retry_after)
+                logger.warning(f"Error transitorio del modelo ({e.__class__.__name__}); "
+                               f"reintento {attempt + 1}/{self.max_retries} en {delay:.1f} s")
+                attempt += 1
+                self._count(retries=1)
+            else:
+                usage = getattr(response, "usage", None)
+                if self.tokens is not None and usage is not None:
+                    self.tokens.adjust(estimate - usage.total_tokens)
+                return response
+            finally:
+                self.concurrency.release(throttled)
+            time.sleep(delay)
+
+    async def acreate(self, **kwargs):
+        """
+        Versión asíncrona de create: ejecuta la petición en un hilo para no
+        bloquear el bucle de eventos.
+
+        Args:
+            **kwargs: Argumentos de chat.completions.create
+
+        Returns:
+            La respuesta de OpenAI
+        """
+        import asyncio
+        return await asyncio.to_thread(self.create, **kwargs)
+
+    def close(self):
+        """Cierra las conexiones del pool."""
+        self._http.close()
+
+def get_client():
+    """
+    Devuelve el cliente compartido del proceso, creándolo la primera vez.
+
+    Los procesos hijos (pool del modo por lotes o del servidor) crean el suyo
+    propio en lugar de heredar las conexiones del padre.
+
+    Returns:
+        LLMClient: El cliente compartido
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = LLMClient()
+            _client_pid = os.getpid()
+        return _client
@@ -0,0 +1,266 @@
+"""
+Modelo tipado del contenido de un libro.
+
+El contenido generado circula como un Book con sus Chapter y GlossaryEntry,
+clases con __slots__ que ocupan bastante menos memoria que los diccionarios
+anidados del JSON del modelo.
+
+Formatos:
+
+- Book.from_dict: carga y valida el JSON del modelo (o un book_data antiguo).
+- Book.to_dict: el mismo diccionario, para quien lo necesite en ese formato.
+- Book.to_compact / Book.from_compact: lista sin nombres de clave, que es lo
+  que guardan la caché de contenido y los puntos de control.
+- Book.load: acepta cualquiera de los dos formatos (las entradas de caché
+  escritas antes de existir el modelo siguen siendo válidas).
+"""
+
+# Claves que debe tener el JSON generado por el modelo
+REQUIRED_FIELDS = ("title", "introduction", "chapters", "exercises", "conclusion")
+
+# Versión del formato compacto (primer elemento de la lista)
+COMPACT_VERSION = 1
+
+def text_value(value, field):
+    """
+    Normaliza un campo de texto del JSON del modelo.
+
+    Args:
+        value: Valor del campo
+        field (str): Nombre del campo, para el mensaje de error
+
+    Returns:
+        str: El texto; las listas de párrafos se unen con líneas en blanco
+
+    Raises:
+        ValueError: Si el valor no se puede interpretar como texto
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    # El modelo a veces devuelve los párrafos como lista
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return "\n\n".join(value)
+    raise ValueError(f"El campo '{field}' del contenido generado no es texto")
+
+def load_glossary(value):
+    """
+    Carga el glosario del JSON del modelo.
+
+    Los términos sin término o sin definición se descartan, igual que hacía
+    create_pdf al maquetarlos.
+
+    Args:
+        value: Lista de objetos con "term" y "definition" (o None)
+
+    Returns:
+        list[GlossaryEntry]: Los términos del glosario
+
+    Raises:
+        ValueError: Si el glosario no es una lista
+    """
+    glossary = value or []
+    if not isinstance(glossary, list):
+        raise ValueError("La clave 'glossary' del contenido generado no es una lista")
+    entries = []
+    for entry in glossary:
+        if isinstance(entry, dict):
+            term = text_value(entry.get("term"), "term")
+            definition = text_value(entry.get("definition"), "definition")
+            if term and definition:
+                entries.append(GlossaryEntry(term, definition))
+    return entries
+
+class GlossaryEntry:
+    """Término del glosario."""
+
+    __slots__ = ("term", "definition")
+
+    def __init__(self, term, definition):
+        self.term = term
+        self.definition = definition
+
+    def __eq__(self, other):
+        return isinstance(other, GlossaryEntry) and (self.term, self.definition) == (other.term, other.definition)
+
+    def __repr__(self):
+        return f"GlossaryEntry({self.term!r})"
+
+class Chapter:
+    """Capítulo del libro."""
+
+    __slots__ = ("title", "content", "fun_fact")
+
+    def __init__(self, title, content="", fun_fact=""):
+        self.title = title
+        self.content = content
+        self.fun_fact = fun_fact
+
+    @classmethod
+    def from_dict(cls, data, index=0):
+        """
+        Carga un capítulo del JSON del modelo.
+
+        Args:
+            data (dict): Capítulo con "title", "content" y "fun_fact"
+            index (int): Posición del capítulo, para el título por defecto y los errores
+
+        Returns:
+            Chapter: El capítulo
+
+        Raises:
+            ValueError: Si el capítulo no es un objeto o sus campos no son texto
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"El capítulo {index + 1} del contenido generado no es un objeto")
+        return cls(text_value(data.get("title"), "title") or f"Capítulo {index + 1}",
+                   text_value(data.get("content"), "content"),
+                   text_value(data.get("fun_fact"), "fun_fact"))
+
+    def to_dict(self):
+        return {"title": self.title, "content": self.content, "fun_fact": self.fun_fact}
+
+    def __eq__(self, other):
+        return (isinstance(other, Chapter)
+                and (self.title, self.content, self.fun_fact) == (other.title, other.content, other.fun_fact))
+
+    def __repr__(self):
+        return f"Chapter({self.title!r})"
+
+class Book:
+    """Contenido completo de un libro."""
+
+    __slots__ = ("topic", "age_group", "title", "introduction", "chapters", "exercises", "glossary", "conclusion")
+
+    def __init__(self, topic, age_group, title, introduction="", chapters=None, exercises="", glossary=None,
+                 conclusion=""):
+        """
+        Args:
+            topic (str): El tema del libro
+            age_group (str): El grupo de edad del público objetivo
+            title (str): Título del libro
+            introduction (str): Introducción
+            chapters (list[Chapter]): Capítulos
+            exercises (str): Ejercicios y actividades
+            glossary (list[GlossaryEntry]): Glosario
+            conclusion (str): Conclusión
+        """
+        self.topic = topic
+        self.age_group = age_group
+        self.title = title
+        self.introduction = introduction
+        self.chapters = chapters if chapters is not None else []
+        self.exercises = exercises
+        self.glossary = glossary if glossary is not None else []
+        self.conclusion = conclusion
+
+    @classmethod
+    def from_dict(cls, data, topic=None, age_group=None):
+        """
+        Carga y valida el JSON del libro generado por el modelo.
+
+        Args:
+            data (dict): JSON del libro
+            topic (str, optional): Tema; por defecto, el de data
+            age_group (str, optional): Grupo de edad; por defecto, el de data
+
+        Returns:
+            Book: El libro
+
+        Raises:
+            ValueError: Si falta alguna de REQUIRED_FIELDS o algún campo tiene un tipo inesperado
+        """
+        if not isinstance(data, dict):
+            raise ValueError("El contenido generado no es un objeto JSON")
+        for key in REQUIRED_FIELDS:
+            if key not in data:
+                raise ValueError(f"El contenido generado no tiene la clave '{key}' esperada")
+        chapters = data["chapters"]
+        if not isinstance(chapters, list):
+            raise ValueError("La clave 'chapters' del contenido generado no es una lista")
+        return cls(topic if topic is not None else text_value(data.get("topic"), "topic"),
+                   age_group if age_group is not None else text_value(data.get("age_group"), "age_group"),
+                   text_value(data["title"], "title"),
+                   text_value(data["introduction"], "introduction"),
+                   [Chapter.from_dict(chapter, i) for i, chapter in enumerate(chapters)],
+                   text_value(data["exercises"], "exercises"),
+                   load_glossary(data.get("glossary")),
+                   text_value(data["conclusion"], "conclusion"))
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: El libro con la estructura del JSON del modelo
+        """
+        return {
+            "topic": self.topic,
+            "age_group": self.age_group,
+            "title": self.title,
+            "introduction": self.introduction,
+            "chapters": [chapter.to_dict() for chapter in self.chapters],
+            "exercises": self.exercises,
+            "glossary": [{"term": entry.term, "definition": entry.definition} for entry in self.glossary],
+            "conclusion": self.conclusion,
+        }
+
+    def to_compact(self):
+        """
+        Devuelve el libro como listas anidadas, sin nombres de clave.
+
+        Returns:
+            list: Lista serializable con json, que se lee con from_compact
+        """
+        return [COMPACT_VERSION, self.topic, self.age_group, self.title, self.introduction,
+                [[chapter.title, chapter.content, chapter.fun_fact] for chapter in self.chapters],
+                self.exercises,
+                [[entry.term, entry.definition] for entry in self.glossary],
+                self.conclusion]
+
+    @classmethod
+    def from_compact(cls, data):
+        """
+        Lee un libro escrito con to_compact.
+
+        Args:
+            data (list): Lista devuelta por to_compact
+
+        Returns:
+            Book: El libro
+
+        Raises:
+            ValueError: Si la lista no tiene el formato esperado
+        """
+        if not data or data[0] != COMPACT_VERSION:
+            raise ValueError(f"Versión del formato compacto desconocida: {data[0] if data else None}")
+        try:
+            _, topic, age_group, title, introduction, chapters, exercises, glossary, conclusion = data
+            return cls(topic, age_group, title, introduction,
+                       [Chapter(*chapter) for chapter in chapters], exercises,
+                       [GlossaryEntry(*entry) for entry in glossary], conclusion)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Libro en formato compacto no válido: {e}")
+
+    @classmethod
+    def load(cls, data):
+        """
+        Lee un libro guardado en formato compacto o como diccionario.
+
+        Args:
+            data (list or dict): Libro leído de un JSON
+
+        Returns:
+            Book: El libro
+        """
+        if isinstance(data, list):
+            return cls.from_compact(data)
+        return cls.from_dict(data)
+
+    def __eq__(self, other):
+        return isinstance(other, Book) and all(getattr(self, name) == getattr(other, name)
+                                               for name in self.__slots__)
+
+    def __repr__(self):
+        return f"Book({self.title!r}, {len(self.chapters)} capítulos)"
@@ -0,0 +1,281 @@
+"""
+Generación de libros sin red a partir de plantillas.
+
+El motor offline arma un Book completo sin llamar al modelo: la introducción,
+los ejercicios y la conclusión salen de book.introduction,
+book.exercises_generator y book.conclusion, y el título, los capítulos y el
+glosario de un paquete de plantillas. Tarda milisegundos, así que se usa para
+vistas previas, pruebas de carga y como respaldo cuando el modelo no responde:
+
+    book = generate_offline_book("Los volcanes", "8-10 años")
+
+o, por trabajo, con mode="offline" en generate_book_content.
+
+Un paquete de plantillas es un diccionario (o un archivo JSON) con "title",
+"chapters" (objetos con "title", "content" y "fun_fact") y "glossary"
+(objetos con "term" y "definition"). Puede incluir también "introduction",
+"exercises" y "conclusion" para sustituir los textos de los módulos. Los
+textos son plantillas de string.Template con $topic y $age_group.
+
+Paquetes disponibles:
+
+- "basico": el incluido aquí.
+- Los que se registren con register_pack.
+- Cada archivo <nombre>.json del directorio de la variable BOOK_TEMPLATE_PACKS.
+
+El paquete por defecto es el de la variable BOOK_TEMPLATE_PACK o "basico".
+Las plantillas se compilan y validan una sola vez, al cargar cada paquete;
+generar un libro solo las rellena.
+"""
+import os
+import json
+import logging
+import textwrap
+import threading
+from string import Template
+
+from book.model import Book, Chapter, GlossaryEntry
+from book.introduction import generate_introduction
+from book.exercises_generator import generate_exercises
+from book.conclusion import generate_conclusion
+
+logger = logging.getLogger(__name__)
+
+# Variables que pueden usar las plantillas
+PLACEHOLDERS = ("topic", "age_group")
+
+DEFAULT_PACK = "basico"
+
+# Paquete incluido (el antiguo contenido de respaldo de generate_book_content)
+BASIC_PACK = {
+    "title": "Todo sobre $topic",
+    "chapters": [
+        {
+            "title": "Introducción a $topic",
+            "content": "Este capítulo presenta una introducción básica sobre $topic para niños de $age_group. Explica los conceptos principales de manera sencilla y amigable.\n\nContinúa con más detalles sobre la importancia de $topic en nuestra vida diaria y por qué es un tema tan fascinante de estudiar. Los niños aprenderán las bases fundamentales que les ayudarán a entender los siguientes capítulos.",
+            "fun_fact": "¿Sabías que...? Un dato muy interesante sobre $topic es que tiene una historia que se remonta a muchos años atrás.",
+        },
+        {
+            "title": "Conceptos importantes",
+            "content": "Aquí explicamos los conceptos más importantes sobre $topic de forma sencilla pero detallada. Cada concepto viene con ejemplos prácticos y explicaciones adaptadas para niños de $age_group.\n\nAdemás, se incluyen ilustraciones conceptuales que ayudarán a los niños a visualizar estos conceptos abstractos de manera concreta y comprensible.",
+            "fun_fact": "¿Sabías que...? Hay más de 1000 formas diferentes de aplicar lo que aprendemos sobre $topic en nuestra vida diaria.",
+        },
+        {
+            "title": "Historia y evolución",
+            "content": "Este capítulo narra la fascinante historia y evolución de $topic a lo largo del tiempo. Los niños aprenderán cómo ha cambiado y desarrollado, desde sus orígenes hasta la actualidad.\n\nSe presentan las figuras históricas más relevantes que contribuyeron al desarrollo de $topic y cómo sus descubrimientos o invenciones impactaron al mundo.",
+            "fun_fact": "¿Sabías que...? El primer descubrimiento relacionado con $topic ocurrió por accidente cuando un científico estaba buscando algo completamente diferente.",
+        },
+        {
+            "title": "Aplicaciones prácticas",
+            "content": "Descubre las múltiples aplicaciones prácticas de $topic en el mundo real. Este capítulo explora cómo se utiliza $topic en diferentes campos y situaciones cotidianas.\n\nLos niños aprenderán a identificar ejemplos de $topic en su entorno y comprenderán su importancia práctica a través de ejemplos concretos y relevantes para su edad.",
+            "fun_fact": "¿Sabías que...? Todos los días utilizamos al menos 5 cosas que están relacionadas con $topic sin darnos cuenta.",
+        },
+        {
+            "title": "Experimentos y actividades",
+            "content": "Este emocionante capítulo presenta experimentos y actividades prácticas relacionadas con $topic que los niños pueden realizar con supervisión adulta. Cada experimento viene con instrucciones paso a paso y explicaciones sobre los principios científicos involucrados.\n\nEstas actividades prácticas refuerzan el aprendizaje teórico y permiten a los niños experimentar de primera mano los conceptos relacionados con $topic.",
+            "fun_fact": "¿Sabías que...? Los científicos que estudian $topic realizan experimentos similares a los que harás en este capítulo, pero con equipos mucho más sofisticados.",
+        },
+        {
+            "title": "Datos curiosos",
+            "content": "Este capítulo está repleto de datos curiosos y sorprendentes sobre $topic que fascinarán a los niños. Cada dato viene con una explicación detallada para satisfacer su curiosidad y ampliar su conocimiento.\n\nEstos datos están seleccionados específicamente para captar la atención de niños de $age_group y despertar su interés por aprender más sobre $topic.",
+            "fun_fact": "¿Sabías que...? El dato más sorprendente sobre $topic fue descubierto hace apenas 10 años por un equipo internacional de investigadores.",
+        },
+        {
+            "title": "$topic en el futuro",
+            "content": "¿Cómo será el futuro de $topic? Este capítulo explora las tendencias actuales y las posibles evoluciones futuras relacionadas con $topic. Los niños aprenderán sobre las investigaciones en curso y los desarrollos más prometedores.\n\nTambién se discute cómo estos avances podrían cambiar nuestra forma de vida y qué papel podrían jugar ellos mismos en ese futuro.",
+            "fun_fact": "¿Sabías que...? Los expertos predicen que en los próximos 20 años, $topic cambiará radicalmente gracias a nuevos descubrimientos.",
+        },
+        {
+            "title": "Preguntas frecuentes",
+            "content": "Este capítulo responde a las preguntas más frecuentes que suelen tener los niños sobre $topic. Cada pregunta tiene una respuesta clara, directa y adaptada al nivel de comprensión de niños de $age_group.\n\nLas preguntas han sido seleccionadas basándose en la curiosidad natural de los niños y cubren aspectos que quizás no se hayan tratado en profundidad en otros capítulos.",
+            "fun_fact": "¿Sabías que...? La pregunta más común sobre $topic que hacen los niños de todo el mundo es '¿Por qué es importante?'",
+        },
+    ],
+    "glossary": [
+        {"term": "$topic", "definition": "Definición básica de $topic adaptada para niños de $age_group."},
+        {"term": "Concepto relacionado 1", "definition": "Definición del primer concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 2", "definition": "Definición del segundo concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 3", "definition": "Definición del tercer concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 4", "definition": "Definición del cuarto concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 5", "definition": "Definición del quinto concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 6", "definition": "Definición del sexto concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 7", "definition": "Definición del séptimo concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 8", "definition": "Definición del octavo concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 9", "definition": "Definición del noveno concepto importante relacionado con el tema."},
+        {"term": "Concepto relacionado 10", "definition": "Definición del décimo concepto importante relacionado con el tema."},
+    ],
+}
+
+def _compile(text, field):
+    """
+    Compila una plantilla y comprueba sus variables.
+
+    Args:
+        text (str): Texto de la plantilla
+        field (str): Campo del paquete, para el mensaje de error
+
+    Returns:
+        Template: La plantilla
+
+    Raises:
+        ValueError: Si el texto no es una plantilla válida o usa variables desconocidas
+    """
+    if not isinstance(text, str):
+        raise ValueError(f"El campo '{field}' del paquete de plantillas no es texto")
+    template = Template(text)
+    if not template.is_valid():
+        raise ValueError(f"El campo '{field}' del paquete de plantillas tiene un '$' mal escrito")
+    unknown = set(template.get_identifiers()) - set(PLACEHOLDERS)
+    if unknown:
+        raise ValueError(f"El campo '{field}' del paquete de plantillas usa variables desconocidas: "
+                         f"{', '.join(sorted(unknown))}")
+    return template
+
+# Marcadores con los que se llama a los módulos de plantillas en lugar del tema y la edad
+_MARKERS = tuple(f"\x00{name}\x00" for name in PLACEHOLDERS)
+
+def _module_template(text):
+    # Convertir el texto de un módulo, generado con _MARKERS, en una
+    # plantilla: su texto es el mismo para todos los libros
+    text = textwrap.dedent(text).strip().replace("$", "$$")
+    for name, marker in zip(PLACEHOLDERS, _MARKERS):
+        text = text.replace(marker, "${" + name + "}")
+    return Template(text)
+
+class TemplatePack:
+    """Paquete de plantillas ya compilado."""
+
+    __slots__ = ("name", "title", "introduction", "chapters", "exercises", "glossary", "conclusion")
+
+    def __init__(self, name, data):
+        """
+        Args:
+            name (str): Nombre del paquete
+            data (dict): Plantillas (ver el docstring del módulo)
+
+        Raises:
+            ValueError: Si al paquete le falta algún campo o alguna plantilla no es válida
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"El paquete de plantillas '{name}' no es un objeto")
+        chapters = data.get("chapters")
+        if not isinstance(chapters, list) or not chapters:
+            raise ValueError(f"El paquete de plantillas '{name}' no tiene capítulos")
+        self.name = name
+        self.title = _compile(data.get("title", "$topic"), "title")
+        self.chapters = [tuple(_compile(chapter.get(key, ""), f"chapters.{key}")
+                               for key in ("title", "content", "fun_fact"))
+                         for chapter in chapters if isinstance(chapter, dict)]
+        self.glossary = [(_compile(entry.get("term", ""), "glossary.term"),
+                          _compile(entry.get("definition", ""), "glossary.definition"))
+                         for entry in data.get("glossary") or () if isinstance(entry, dict)]
+        # Las secciones que el paquete no trae salen de los módulos de plantillas
+        self.introduction = _compile(data["introduction"], "introduction") if "introduction" in data \
+            else _module_template(generate_introduction(*_MARKERS))
+        self.exercises = _compile(data["exercises"], "exercises") if "exercises" in data \
+            else _module_template("\n\n".join(textwrap.dedent(section).strip()
+                                              for section in generate_exercises(*_MARKERS)))
+        self.conclusion = _compile(data["conclusion"], "conclusion") if "conclusion" in data \
+            else _module_template(generate_conclusion(*_MARKERS))
+
+    def render(self, topic, age_group):
+        """
+        Rellena las plantillas para un libro.
+
+        Args:
+            topic (str): El tema del libro
+            age_group (str): El grupo de edad del público objetivo
+
+        Returns:
+            Book: El contenido del libro
+        """
+        values = {"topic": topic, "age_group": age_group}
+        return Book(topic, age_group, self.title.substitute(values),
+                    self.introduction.substitute(values),
+                    [Chapter(*(template.substitute(values) for template in chapter)) for chapter in self.chapters],
+                    self.exercises.substitute(values),
+                    [GlossaryEntry(term.substitute(values), definition.substitute(values))
+                     for term, definition in self.glossary],
+                    self.conclusion.substitute(values))
+
+    def __repr__(self):
+        return f"TemplatePack({self.name!r}, {len(self.chapters)} capítulos)"
+
+_packs = {}
+_packs_lock = threading.Lock()
+_directory_loaded = False
+
+def register_pack(name, data):
+    """
+    Registra (o sustituye) un paquete de plantillas.
+
+    Args:
+        name (str): Nombre del paquete
+        data (dict): Plantillas (ver el docstring del módulo)
+
+    Returns:
+        TemplatePack: El paquete compilado
+
+    Raises:
+        ValueError: Si alguna plantilla no es válida
+    """
+    pack = TemplatePack(name, data)
+    with _packs_lock:
+        _packs[name] = pack
+    return pack
+
+def _load_directory():
+    # Cargar una sola vez los paquetes del directorio de BOOK_TEMPLATE_PACKS
+    global _directory_loaded
+    directory = os.getenv("BOOK_TEMPLATE_PACKS", "")
+    if directory and os.path.isdir(directory):
+        for filename in sorted(os.listdir(directory)):
+            name, extension = os.path.splitext(filename)
+            if extension != ".json" or name in _packs:
+                continue
+            try:
+                with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                    _packs[name] = TemplatePack(name, json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo cargar el paquete de plantillas {filename}: {e}")
+    _directory_loaded = True
+
+def get_pack(name=None):
+    """
+    Devuelve un paquete de plantillas, compilándolo la primera vez.
+
+    Args:
+        name (str, optional): Nombre del paquete. Por defecto, la variable
+            BOOK_TEMPLATE_PACK o DEFAULT_PACK
+
+    Returns:
+        TemplatePack: El paquete
+
+    Raises:
+        ValueError: Si no existe ningún paquete con ese nombre
+    """
+    name = name or os.getenv("BOOK_TEMPLATE_PACK", "") or DEFAULT_PACK
+    with _packs_lock:
+        if name not in _packs:
+            if name == DEFAULT_PACK:
+                _packs[name] = TemplatePack(name, BASIC_PACK)
+            elif not _directory_loaded:
+                _load_directory()
+        pack = _packs.get(name)
+    if pack is None:
+        raise ValueError(f"Paquete de plantillas desconocido: {name}")
+    return pack
+
+def generate_offline_book(topic, age_group, pack=None):
+    """
+    Genera el contenido de un libro con plantillas, sin llamar al modelo.
+
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        pack (str, optional): Nombre del paquete de plantillas (ver get_pack)
+
+    Returns:
+        Book: El contenido del libro
+    """
+    return get_pack(pack).render(topic, age_group)
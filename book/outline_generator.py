@@ -0,0 +1,256 @@
+import asyncio
+import logging
+
+from book.llm_client import get_client
+from book.content_generator import SYSTEM_PROMPT, extract_json
+from book.model import REQUIRED_FIELDS, Book
+from utils.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+MODEL = "gpt-4"
+TEMPERATURE = 0.7
+
+# Número máximo de peticiones simultáneas al modelo por libro
+DEFAULT_CONCURRENCY = 4
+
+def _outline_prompt(topic, age_group):
+    return f"""
+    Crea el esquema de un libro educativo sobre "{topic}" para niños de {age_group}.
+    No escribas todavía el contenido de los capítulos, solo el esquema.
+
+    Formatea tu respuesta como un JSON con la siguiente estructura:
+    {{
+        "title": "Título principal del libro",
+        "chapter_titles": ["Título del capítulo 1", "Título del capítulo 2"],
+        "glossary": [
+            {{"term": "Término 1", "definition": "Definición breve 1"}}
+        ]
+    }}
+
+    Incluye de 8 a 10 capítulos y de 8 a 12 términos en el glosario.
+    """
+
+def _chapter_prompt(topic, age_group, book_title, chapter_titles, index):
+    outline = "\n".join(f"{i + 1}. {title}" for i, title in enumerate(chapter_titles))
+    return f"""
+    Estás escribiendo el libro educativo "{book_title}" sobre "{topic}" para niños de {age_group}.
+    Este es el índice completo del libro:
+    {outline}
+
+    Escribe únicamente el capítulo {index + 1}: "{chapter_titles[index]}".
+    El contenido debe ser extenso y detallado (aproximadamente 3-4 páginas), con lenguaje
+    sencillo pero preciso, sin repetir lo que corresponde a otros capítulos.
+
+    Formatea tu respuesta como un JSON con la siguiente estructura:
+    {{
+        "content": "Texto extenso del capítulo, con párrafos separados por líneas en blanco",
+        "fun_fact": "Dato curioso relacionado con este capítulo"
+    }}
+    """
+
+def _section_prompt(topic, age_group, book_title, chapter_titles, section):
+    outline = "\n".join(f"{i + 1}. {title}" for i, title in enumerate(chapter_titles))
+    instructions = {
+        "introduction": "Escribe una introducción atractiva que despierte el interés del lector.",
+        "exercises": "Escribe una sección de ejercicios y actividades detalladas para reforzar lo aprendido en todos los capítulos.",
+        "conclusion": "Escribe una conclusión que resuma los puntos principales del libro.",
+    }[section]
+    return f"""
+    Estás escribiendo el libro educativo "{book_title}" sobre "{topic}" para niños de {age_group}.
+    Este es el índice completo del libro:
+    {outline}
+
+    {instructions}
+    Responde solo con el texto, sin formato JSON ni markdown, con párrafos separados por líneas en blanco.
+    """
+
+def _glossary_prompt(topic, age_group, book_title, chapter_titles):
+    outline = "\n".join(f"{i + 1}. {title}" for i, title in enumerate(chapter_titles))
+    return f"""
+    Estás escribiendo el libro educativo "{book_title}" sobre "{topic}" para niños de {age_group}.
+    Este es el índice completo del libro:
+    {outline}
+
+    Escribe el glosario del libro, con los términos importantes de todos los capítulos.
+
+    Formatea tu respuesta como un JSON con la siguiente estructura:
+    {{
+        "glossary": [
+            {{"term": "Término 1", "definition": "Definición breve 1"}}
+        ]
+    }}
+
+    Incluye de 8 a 12 términos.
+    """
+
+def prompt_templates():
+    """
+    Devuelve el texto de todos los prompts de este modo con valores de ejemplo,
+    para detectar cambios en ellos (por ejemplo, al calcular claves de caché).
+
+    Returns:
+        str: Concatenación de los prompts
+    """
+    titles = ["{chapter}"]
+    parts = [SYSTEM_PROMPT, _outline_prompt("{topic}", "{age_group}"),
+             _chapter_prompt("{topic}", "{age_group}", "{title}", titles, 0)]
+    for section in ("introduction", "exercises", "conclusion"):
+        parts.append(_section_prompt("{topic}", "{age_group}", "{title}", titles, section))
+    return "\n".join(parts)
+
+async def _complete(client, semaphore, prompt, max_tokens):
+    """
+    Realiza una petición al modelo respetando el límite de concurrencia.
+
+    Args:
+        client (LLMClient): Cliente del modelo; también se acepta un cliente
+            compatible con OpenAI sin acreate, cuyas llamadas se hacen en un hilo
+        semaphore (asyncio.Semaphore): Límite de peticiones simultáneas
+        prompt (str): Prompt del usuario
+        max_tokens (int): Máximo de tokens de la respuesta
+
+    Returns:
+        str: Texto de la respuesta
+    """
+    request = dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=TEMPERATURE,
+        max_tokens=max_tokens
+    )
+    async with semaphore:
+        with span("llm.request", model=MODEL, mode="outline"):
+            if hasattr(client, "acreate"):
+                response = await client.acreate(**request)
+            else:
+                response = await asyncio.to_thread(client.chat.completions.create, **request)
+    return response.choices[0].message.content.strip()
+
+async def generate_book_content_outline_async(topic, age_group, client=None, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Genera el contenido de un libro pidiendo primero un esquema y después
+    cada sección como una petición independiente y concurrente.
+
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        client (LLMClient, optional): Cliente a utilizar; por defecto, el compartido del proceso
+        concurrency (int): Máximo de peticiones simultáneas de este libro (el cliente
+            limita además las de todos los libros del proceso)
+
+    Returns:
+        Book: El contenido del libro, con la misma estructura
+            que devuelve generate_book_content
+    """
+    client = client or get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # 1. Esquema corto: título, capítulos y glosario
+    outline = extract_json(await _complete(client, semaphore, _outline_prompt(topic, age_group), 800))
+    book_title = outline["title"]
+    chapter_titles = [str(title) for title in outline["chapter_titles"]]
+    if not chapter_titles:
+        raise ValueError("El esquema generado no tiene capítulos")
+
+    # 2. Expandir cada sección en paralelo; el tiempo total depende de la sección más larga
+    chapter_tasks = [
+        _complete(client, semaphore, _chapter_prompt(topic, age_group, book_title, chapter_titles, i), 1500)
+        for i in range(len(chapter_titles))
+    ]
+    section_tasks = [
+        _complete(client, semaphore, _section_prompt(topic, age_group, book_title, chapter_titles, section), 800)
+        for section in ("introduction", "exercises", "conclusion")
+    ]
+    results = await asyncio.gather(*chapter_tasks, *section_tasks)
+
+    chapter_texts = results[:len(chapter_titles)]
+    introduction, exercises, conclusion = results[len(chapter_titles):]
+
+    chapters = []
+    for title, text in zip(chapter_titles, chapter_texts):
+        chapter = extract_json(text)
+        chapters.append({
+            "title": title,
+            "content": chapter["content"],
+            "fun_fact": chapter.get("fun_fact", "")
+        })
+
+    book_data = {
+        "title": book_title,
+        "introduction": introduction,
+        "chapters": chapters,
+        "exercises": exercises,
+        "glossary": outline.get("glossary", []),
+        "conclusion": conclusion,
+        "topic": topic,
+        "age_group": age_group
+    }
+    for key in REQUIRED_FIELDS:
+        if not book_data[key]:
+            raise ValueError(f"El contenido generado no tiene la clave '{key}' esperada")
+    return Book.from_dict(book_data)
+
+async def complete_sections_async(topic, age_group, book_title, chapter_titles, sections, client=None,
+                                  concurrency=DEFAULT_CONCURRENCY):
+    """
+    Genera solo algunas secciones de un libro que ya tiene título y capítulos,
+    por ejemplo las que faltaban en una respuesta cortada.
+
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        book_title (str): Título del libro
+        chapter_titles (list[str]): Títulos de los capítulos
+        sections (list[str]): Secciones a generar: "introduction", "exercises",
+            "glossary" o "conclusion"
+        client (LLMClient, optional): Cliente a utilizar; por defecto, el compartido del proceso
+        concurrency (int): Máximo de peticiones simultáneas
+
+    Returns:
+        dict: Cada sección pedida con su contenido (el glosario como lista de términos)
+    """
+    client = client or get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+    for section in sections:
+        if section == "glossary":
+            prompt = _glossary_prompt(topic, age_group, book_title, chapter_titles)
+        else:
+            prompt = _section_prompt(topic, age_group, book_title, chapter_titles, section)
+        tasks.append(_complete(client, semaphore, prompt, 800))
+    results = await asyncio.gather(*tasks)
+
+    completed = {}
+    for section, text in zip(sections, results):
+        completed[section] = extract_json(text)["glossary"] if section == "glossary" else text
+    return completed
+
+def complete_sections(topic, age_group, book_title, chapter_titles, sections, client=None,
+                      concurrency=DEFAULT_CONCURRENCY):
+    """
+    Versión síncrona de complete_sections_async.
+
+    Returns:
+        dict: Cada sección pedida con su contenido
+    """
+    return asyncio.run(complete_sections_async(topic, age_group, book_title, chapter_titles, sections,
+                                               client, concurrency))
+
+def generate_book_content_outline(topic, age_group, client=None, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Versión síncrona de generate_book_content_outline_async.
+
+    Args:
+        topic (str): El tema del libro
+        age_group (str): El grupo de edad del público objetivo
+        client (LLMClient, optional): Cliente a utilizar; por defecto, el compartido del proceso
+        concurrency (int): Máximo de peticiones simultáneas de este libro
+
+    Returns:
+        Book: El contenido del libro
+    """
+    return asyncio.run(generate_book_content_outline_async(topic, age_group, client, concurrency))
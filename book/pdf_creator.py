@@ -1,29 +1,133 @@
 import os
+import struct
+import hashlib
+import zlib
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
-from book.cover_generator import generate_cover
-from book.image_generator import generate_image
+from book.text_layout import break_lines, width_table
+from utils.instrumentation import span
+from book.illustration_pipeline import BookIllustrations
+from book.document import Document, Section
 import logging
-import textwrap
+import re
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Alto de cada línea del índice
+TOC_LINE_HEIGHT = 8
+
+# A partir de este número de capítulos el PDF se escribe en disco a medida que se genera
+STREAMING_MIN_CHAPTERS = 100
+
+# Los párrafos largos se dividen en líneas cortas tratando cualquier espacio en blanco como un espacio
+_WHITESPACE = re.compile(r'[\t\n\x0b\x0c\r]')
+
+# Estado gráfico que add_page arrastra de una página a la siguiente (ver BookPDF.page_state)
+_PAGE_STATE = ("font_family", "font_style", "font_size_pt", "underline", "line_width",
+               "draw_color", "fill_color", "text_color", "color_flag")
+
+# Referencias a fuentes e imágenes en el contenido de una página, que se
+# renumeran al unir un fragmento (ver BookPDF.append_fragment)
+_FONT_REF = re.compile(r'^BT /F(\d+) ', re.M)
+_IMAGE_REF = re.compile(r' cm /I(\d+) Do Q$', re.M)
+
+# Marca que deja el encabezado de un fragmento en lugar del número de página
+_PAGE_NUMBER_MARK = re.compile(r'^%BOOKPDF-PAGENO (\S+) (\S+) (\d) (.*)\n', re.M)
+
+# Pool de maquetación en paralelo, compartido por todos los libros del proceso (ver _render_pool)
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+def _jpeg_bytes(image):
+    """
+    Convierte una imagen en memoria a bytes JPEG.
+    
+    Args:
+        image (bytes, BytesIO o PIL.Image.Image): Imagen en memoria
+        
+    Returns:
+        bytes: Datos JPEG
+    """
+    if isinstance(image, BytesIO):
+        image = image.getvalue()
+    if isinstance(image, (bytes, bytearray)) and image[:2] == b"\xff\xd8":
+        return bytes(image)
+    
+    # Otros formatos (PNG, objetos PIL...) se recodifican como JPEG
+    from PIL import Image
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(BytesIO(image))
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def _parse_jpeg(data):
+    """
+    Extrae de unos bytes JPEG la información que FPDF necesita para incrustarlos.
+    
+    Equivale a FPDF._parsejpg, pero sin leer un archivo del disco.
+    
+    Args:
+        data (bytes): Datos JPEG
+        
+    Returns:
+        dict: Información de la imagen en el formato de FPDF.images
+    """
+    pos = 2  # Saltar el marcador SOI
+    while pos < len(data):
+        marker_high, marker_low = data[pos], data[pos + 1]
+        pos += 2
+        if marker_high != 0xFF or marker_low < 0xC0:
+            raise ValueError("No se encontró un marcador JPEG válido")
+        if marker_low == 0xDA:  # SOS antes de SOF
+            raise ValueError("No se encontró el marcador SOF del JPEG")
+        if marker_low == 0xC8 or 0xD0 <= marker_low <= 0xD9 or 0xF0 <= marker_low <= 0xFD:
+            continue
+        size, = struct.unpack(">H", data[pos:pos + 2])
+        segment = data[pos + 2:pos + size]
+        pos += size
+        if marker_low in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                          0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            bpc, height, width, layers = struct.unpack_from(">BHHB", segment)
+            colspace = "DeviceRGB" if layers == 3 else ("DeviceCMYK" if layers == 4 else "DeviceGray")
+            return {"w": width, "h": height, "cs": colspace, "bpc": bpc, "f": "DCTDecode", "data": data}
+    raise ValueError("No se encontró el marcador SOF del JPEG")
+
 class BookPDF(FPDF):
     def __init__(self):
         super().__init__()
         self.set_auto_page_break(auto=True, margin=15)
         self.chapter_title = ""
         self.page_count = 0
+        self.templates = {}
+        self._template = None
+        # En los fragmentos (ver render_fragment) el número de página se
+        # escribe al unirlos, y todas sus páginas van después de la portada
+        self.defer_page_numbers = False
         
     def header(self):
-        if self.page_no() > 1:  # No mostrar encabezado en la primera página
+        if self.page_no() > 1 or self.defer_page_numbers:  # No mostrar encabezado en la primera página
             self.set_font('Arial', 'I', 8)
             if self.chapter_title:
                 self.cell(0, 10, self.chapter_title, 0, 0, 'L')
-            self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'R')
+            if self.defer_page_numbers:
+                self._out(f'%BOOKPDF-PAGENO {self.x!r} {self.y!r} {int(self.color_flag)} {self.text_color}')
+            else:
+                self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'R')
             self.ln(10)
             
+    def _page_number_cell(self, x, y, color_flag, text_color):
+        # Escribe el número de la página actual donde header dejó la marca,
+        # con la misma fuente, posición y colores que tenía el encabezado
+        self.x, self.y = x, y
+        self.color_flag, self.text_color = color_flag, text_color
+        self._select_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'R')
+            
     def footer(self):
-        if self.page_no() > 1:  # No mostrar pie de página en la primera página
+        if self.page_no() > 1 or self.defer_page_numbers:  # No mostrar pie de página en la primera página
             self.set_y(-15)
             self.set_font('Arial', 'I', 8)
             
@@ -35,21 +139,20 @@ class BookPDF(FPDF):
         self.cell(0, 10, title, ln=True, align='C')
         self.ln(10)
         
-    def chapter_body(self, content):
-        # Dividir el contenido en bloques más pequeños para que ocupe más páginas
+    def chapter_body(self, paragraphs):
+        # Párrafos ya divididos por book.document.split_paragraphs
         self.set_font('Arial', '', 12)
-        paragraphs = content.split('\n\n')
         
         for paragraph in paragraphs:
-            # Dividir párrafos largos en partes más pequeñas
+            # Dividir párrafos largos en líneas cortas (de 80 caracteres como
+            # máximo), cada una separada de la siguiente
             if len(paragraph) > 300:
-                parts = textwrap.wrap(paragraph, width=80)
-                for part in parts:
+                for line in self.layout_text(0, _WHITESPACE.sub(' ', paragraph).strip(), max_chars=80):
                     # Espaciar más el contenido para ocupar más páginas
-                    self.multi_cell(0, 8, part)
+                    self.write_lines(0, 8, [line], align='L')
                     self.ln(5)
             else:
-                self.multi_cell(0, 8, paragraph)
+                self.write_lines(0, 8, self.layout_text(0, paragraph))
                 self.ln(5)
             
             # Añadir espacio adicional entre párrafos
@@ -72,9 +175,9 @@ class BookPDF(FPDF):
         self.set_fill_color(240, 240, 200)  # Color amarillo claro
         self.set_draw_color(200, 200, 150)  # Borde más oscuro
         
-        # Calcular altura necesaria para el texto
+        # Dividir el texto una sola vez: las mismas líneas dan la altura y se escriben
         self.set_font('Arial', 'I', 10)
-        lines = self.get_multi_cell_lines(180, 6, fun_fact)
+        lines = self.layout_text(170, fun_fact)
         height = len(lines) * 6 + 10  # Altura calculada + margen
         
         # Dibujar el rectángulo
@@ -83,85 +186,767 @@ class BookPDF(FPDF):
         # Añadir texto del dato curioso
         self.set_xy(20, y + 5)
         self.set_text_color(0, 0, 0)
-        self.multi_cell(170, 6, fun_fact)
+        self.write_lines(170, 6, lines)
         
         # Restaurar posición después del cuadro
         self.set_xy(x, y + height + 5)
         self.set_text_color(0, 0, 0)
         
-    def get_multi_cell_lines(self, w, h, txt):
-        # Función auxiliar para calcular cuántas líneas ocupará un multi_cell
-        cw = self.current_font['cw']
+    def render_section(self, section, image=None):
+        """
+        Maqueta una sección del libro a partir de una página nueva.
+        
+        Args:
+            section (Section): Sección del Document (ver book.document)
+            image (callable, optional): Devuelve la ilustración de la sección
+                (o None). Se llama después de maquetar el texto, para que la
+                imagen pueda terminar de generarse mientras tanto
+                
+        Returns:
+            int: Página en que empieza la sección
+        """
+        self.chapter_title_page(section.title)
+        start = self.page_no()
+        if section.key == "glossary":
+            self.set_font("Arial", "", 12)
+            for entry in section.glossary:
+                self.set_font("Arial", "B", 12)
+                self.cell(0, 8, entry.term, ln=True)
+                self.set_font("Arial", "", 12)
+                self.multi_cell(0, 8, entry.definition)
+                self.ln(5)
+            return start
+        
+        self.chapter_body(section.paragraphs)
+        picture = image() if image is not None and section.image_key else None
+        if picture:
+            try:
+                # Verificar si hay suficiente espacio en la página actual
+                if section.is_chapter and self.get_y() > 180:
+                    self.add_page()
+                # Centrar la imagen
+                self.image(picture, x=(210-150)/2, y=self.get_y(), w=150)
+            except Exception as e:
+                logger.warning(f"No se pudo agregar la imagen de la sección {section.key}: {e}")
+                print(f"Error con la imagen de {section.title}: {e}")
+        
+        if section.is_chapter:
+            # Añadir dato curioso si existe
+            if section.fun_fact:
+                self.ln(10)
+                self.fun_fact_box(section.fun_fact)
+            self.ln(10)
+        return start
+        
+    def page_state(self):
+        """
+        Devuelve el estado gráfico (fuente, colores y grosor de línea) que
+        add_page arrastra a la página siguiente.
+        
+        Returns:
+            dict: Estado, que se restaura con set_page_state
+        """
+        return {name: getattr(self, name) for name in _PAGE_STATE}
+        
+    def set_page_state(self, state):
+        """
+        Adopta un estado gráfico devuelto por page_state sin escribir nada en
+        la página actual.
+        
+        Args:
+            state (dict): Estado devuelto por page_state
+        """
+        if state["font_family"]:
+            self._select_font(state["font_family"], state["font_style"] + ("U" if state["underline"] else ""),
+                              state["font_size_pt"])
+        for name, value in state.items():
+            setattr(self, name, value)
+            
+    def _select_font(self, family, style, size):
+        # set_font sin escribir el cambio en la página: con page == 0 FPDF
+        # solo cambia la fuente actual (y la registra si es la primera vez)
+        page, self.page = self.page, 0
+        self.font_family = ''
+        try:
+            self.set_font(family, style, size)
+        finally:
+            self.page = page
+            
+    def fragment(self):
+        """
+        Devuelve las páginas maquetadas para unirlas a otro BookPDF con
+        append_fragment. La última página queda sin pie, como si siguiera abierta.
+        
+        Returns:
+            dict: Páginas, fuentes, imágenes y estado final del documento
+        """
+        return {
+            "pages": [self.pages[n] for n in range(1, self.page + 1)],
+            "fonts": self.fonts,
+            "images": self.images,
+            "state": self.page_state(),
+            "position": (self.x, self.y),
+            "chapter_title": self.chapter_title,
+        }
+        
+    def append_fragment(self, fragment):
+        """
+        Añade al documento las páginas de un fragmento (ver render_fragment).
+        
+        Las fuentes y las imágenes del fragmento se renumeran con las de este
+        documento (una imagen repetida se incrusta una sola vez) y cada
+        encabezado recibe su número de página definitivo. Después el documento
+        queda igual que si la sección se hubiera maquetado en él: con la
+        última página abierta, el mismo estado gráfico y el mismo chapter_title.
+        
+        Args:
+            fragment (dict): Resultado de BookPDF.fragment
+            
+        Returns:
+            int: Página en que empieza el fragmento
+        """
+        if self.state == 2:
+            # Terminar la página actual igual que lo haría add_page
+            self.in_footer = 1
+            self.footer()
+            self.in_footer = 0
+            self._endpage()
+        fonts = {font['i']: (key, font) for key, font in fragment["fonts"].items()}
+        images = {info['i']: (name, info) for name, info in fragment["images"].items()}
+        
+        def font_ref(match):
+            key, font = fonts[int(match.group(1))]
+            if key not in self.fonts:
+                self.fonts[key] = dict(font, i=len(self.fonts) + 1)
+            return f"BT /F{self.fonts[key]['i']} "
+        
+        def image_ref(match):
+            name, info = images[int(match.group(1))]
+            if name not in self.images:
+                self._add_image(name, dict(info))
+            return f" cm /I{self.images[name]['i']} Do Q"
+        
+        first = self.page + 1
+        for n, content in enumerate(fragment["pages"]):
+            if n:
+                self._endpage()
+            self._beginpage('')
+            content = _IMAGE_REF.sub(image_ref, _FONT_REF.sub(font_ref, content))
+            parts = _PAGE_NUMBER_MARK.split(content)
+            self.pages[self.page] = parts[0]
+            for i in range(1, len(parts), 5):
+                x, y, color_flag, text_color, rest = parts[i:i + 5]
+                self._page_number_cell(float(x), float(y), color_flag == "1", text_color)
+                self.pages[self.page] += rest
+        
+        self.set_page_state(fragment["state"])
+        self.x, self.y = fragment["position"]
+        self.chapter_title = fragment["chapter_title"]
+        return first
+        
+    def _add_image(self, name, info):
+        # Registrar una imagen ya leída con el siguiente número libre
+        info['i'] = len(self.images) + 1
+        self.images[name] = info
+        
+    def image(self, name, x=None, y=None, w=0, h=0, type='', link=''):
+        """
+        Añade una imagen a la página.
+        
+        Además de rutas de archivo, acepta imágenes en memoria (bytes, BytesIO
+        o PIL.Image), que se incrustan sin pasar por el disco. Las imágenes con
+        el mismo contenido se incrustan una sola vez.
+        """
+        if not isinstance(name, str):
+            data = _jpeg_bytes(name)
+            name = "mem:" + hashlib.sha1(data).hexdigest()
+            if name not in self.images:
+                self._add_image(name, _parse_jpeg(data))
+        return super().image(name, x, y, w, h, type, link)
+        
+    def write_toc(self, pages, entries):
+        """
+        Escribe las entradas del índice en páginas reservadas anteriormente.
+        
+        Si no caben (por ejemplo, con streaming no se sabe de antemano cuántos
+        capítulos habrá), la última página reservada remite a la página en
+        que continúa el índice, y las entradas que faltan se escriben en
+        páginas nuevas al final del documento.
+        
+        Args:
+            pages (list): Tuplas (número de página, posición vertical inicial)
+                de las páginas reservadas, en orden
+            entries (list): Tuplas (título, página de inicio)
+        """
+        # Guardar el estado de la página actual
+        saved_page, saved_x, saved_y = self.page, self.x, self.y
+        saved_font = (self.font_family, self.font_style, self.font_size_pt,
+                      self.font_size, self.current_font, self.underline)
+        auto_page_break = self.auto_page_break
+        
+        # Escribir en las páginas del índice sin provocar saltos de página
+        self.set_auto_page_break(False, self.b_margin)
+        pages = list(pages)
+        entries = list(entries)
+        while pages and entries:
+            page, y = pages.pop(0)
+            self.page = page
+            self.set_xy(self.l_margin, y)
+            self.font_family = ''  # Forzar que la fuente se declare en esa página
+            self.set_font("Arial", "", 12)
+            while entries and self.y + TOC_LINE_HEIGHT <= self.page_break_trigger:
+                if not pages and len(entries) > 1 and self.y + 2 * TOC_LINE_HEIGHT > self.page_break_trigger:
+                    # Dejar sitio en la última página reservada para la remisión
+                    break
+                title, number = entries.pop(0)
+                self.cell(0, TOC_LINE_HEIGHT, f"{title}..................................{number}", ln=True)
+        if entries:
+            # El índice sigue en la primera página nueva después de la actual
+            self.cell(0, TOC_LINE_HEIGHT, f"(El índice continúa en la página {saved_page + 1})", ln=True)
+        
+        # Restaurar el estado de la página actual
+        self.page, self.x, self.y = saved_page, saved_x, saved_y
+        (self.font_family, self.font_style, self.font_size_pt,
+         self.font_size, self.current_font, self.underline) = saved_font
+        self.set_auto_page_break(auto_page_break, self.b_margin)
+        
+        if entries:
+            self.add_page()
+            self.chapter_title = "Índice"
+            self.set_font("Arial", "B", 16)
+            self.cell(0, 10, "Índice (continuación)", ln=True)
+            self.ln(5)
+            self.set_font("Arial", "", 12)
+            for title, number in entries:
+                self.cell(0, TOC_LINE_HEIGHT, f"{title}..................................{number}", ln=True)
+        
+    def hold_page(self, page):
+        """
+        Indica que una página se volverá a editar más adelante (por ejemplo,
+        las páginas reservadas para write_toc).
+        
+        BookPDF guarda todas las páginas en memoria hasta el final, así que no
+        hace nada; StreamingBookPDF no escribe la página en disco hasta cerrar
+        el documento.
+        
+        Args:
+            page (int): Número de página
+        """
+        
+    def begin_template(self, name):
+        """
+        Empieza a grabar una plantilla de página.
+        
+        Todo lo que se dibuje hasta end_template (líneas, rectángulos, texto)
+        se guarda en un form XObject en lugar de en la página actual. El
+        contenido se escribe una sola vez en el PDF y cada página que lo use
+        solo lo referencia con use_template.
+        
+        Args:
+            name (str): Nombre de la plantilla
+        """
+        if self._template is not None:
+            raise RuntimeError("Ya se está grabando una plantilla")
+        if name in self.templates:
+            raise ValueError(f"La plantilla {name} ya existe")
+        self._template = (name, [])
+        
+    def end_template(self):
+        """
+        Termina de grabar la plantilla empezada con begin_template.
+        
+        Returns:
+            str: Nombre de la plantilla
+        """
+        name, content = self._template
+        self._template = None
+        self.templates[name] = {"i": len(self.templates) + 1, "data": "\n".join(content)}
+        return name
+        
+    def use_template(self, name):
+        """
+        Dibuja una plantilla en la página actual.
+        
+        Args:
+            name (str): Nombre usado en begin_template
+        """
+        self._out(f"q /TPL{self.templates[name]['i']} Do Q")
+        
+    def lined_page_template(self):
+        """
+        Devuelve la plantilla de las páginas de notas, creándola la primera vez.
+        
+        Returns:
+            str: Nombre de la plantilla
+        """
+        name = "notes_lines"
+        if name not in self.templates:
+            self.begin_template(name)
+            # Dibujar líneas horizontales para notas
+            y = 30
+            while y < 270:
+                self.line(20, y, 190, y)
+                y += 12
+            self.end_template()
+        return name
+        
+    def _out(self, s):
+        if self._template is not None and self.state == 2:
+            if isinstance(s, bytes):
+                s = s.decode("latin1")
+            self._template[1].append(s)
+            return
+        super()._out(s)
+        
+    def _putimages(self):
+        super()._putimages()
+        self._puttemplates()
+        
+    def _puttemplates(self):
+        # Form XObjects de las plantillas, con los mismos recursos que las páginas
+        for name, template in sorted(self.templates.items(), key=lambda item: item[1]["i"]):
+            data = template["data"]
+            if self.compress:
+                data = zlib.compress(data.encode("latin1"))
+                filter = '/Filter /FlateDecode '
+            else:
+                filter = ''
+            self._newobj()
+            template["n"] = self.n
+            self._out('<</Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources 2 0 R'
+                      % (self.w_pt, self.h_pt))
+            self._out(filter + '/Length ' + str(len(data)) + '>>')
+            self._putstream(data)
+            self._out('endobj')
+            
+    def _putxobjectdict(self):
+        super()._putxobjectdict()
+        for template in sorted(self.templates.values(), key=lambda t: t["i"]):
+            self._out(f"/TPL{template['i']} {template['n']} 0 R")
+        
+    def layout_text(self, w, txt, max_chars=None):
+        """
+        Divide un texto en líneas con la fuente actual, como lo haría multi_cell.
+        
+        Args:
+            w (float): Ancho de la celda (0 para llegar al margen derecho)
+            txt (str): Texto a dividir
+            max_chars (int, optional): Máximo de caracteres por línea
+            
+        Returns:
+            list[Line]: Líneas listas para write_lines
+        """
         if w == 0:
             w = self.w - self.r_margin - self.x
-        wmax = (w - 2 * self.c_margin) * 1000 / self.font_size
-        s = txt.replace('\r', '')
-        nb = len(s)
-        if nb > 0 and s[nb-1] == '\n':
-            nb -= 1
-        lines = []
-        sep = -1
-        i = 0
-        j = 0
-        l = 0
-        while i < nb:
-            c = s[i]
-            if c == '\n':
-                lines.append(s[j:i])
-                i += 1
-                sep = -1
-                j = i
-                l = 0
-                continue
-            if c == ' ':
-                sep = i
-            if ord(c) >= 128:
-                l += 1
-            else:
-                l += cw.get(c, 0) / 1000.0 * self.font_size
-            if l > wmax:
-                if sep == -1:
-                    if i == j:
-                        i += 1
-                    lines.append(s[j:i])
+        wmax = (w - 2 * self.c_margin) * 1000.0 / self.font_size
+        return break_lines(txt, width_table(self.current_font), wmax, max_chars)
+        
+    def write_lines(self, w, h, lines, align='J', fill=0):
+        """
+        Escribe líneas ya divididas con layout_text, igual que multi_cell.
+        
+        Args:
+            w (float): Ancho de la celda (0 para llegar al margen derecho)
+            h (float): Alto de cada línea
+            lines (list[Line]): Líneas devueltas por layout_text
+            align (str): Alineación; con 'J' se justifican las líneas cortadas en un espacio
+            fill (int): 1 para rellenar el fondo de las celdas
+        """
+        if w == 0:
+            w = self.w - self.r_margin - self.x
+        wmax = (w - 2 * self.c_margin) * 1000.0 / self.font_size
+        for line in lines:
+            if line.width is not None and align == 'J':
+                # Repartir el espacio sobrante entre las palabras de la línea
+                if line.spaces > 1:
+                    self.ws = (wmax - line.width) / 1000.0 * self.font_size / (line.spaces - 1)
                 else:
-                    lines.append(s[j:sep])
-                    i = sep + 1
-                sep = -1
-                j = i
-                l = 0
-            else:
-                i += 1
-        if i != j:
-            lines.append(s[j:i])
-        return lines
+                    self.ws = 0
+                self._out('%.3f Tw' % (self.ws * self.k))
+            elif line.width is None and self.ws > 0:
+                self.ws = 0
+                self._out('0 Tw')
+            self.cell(w, h, line.text, 0, 2, align, fill)
+        if self.ws > 0:
+            self.ws = 0
+            self._out('0 Tw')
+        self.x = self.l_margin
+        
+    def get_multi_cell_lines(self, w, h, txt):
+        # Función auxiliar para calcular cuántas líneas ocupará un multi_cell
+        return [line.text for line in self.layout_text(w, txt)]
+
+class StreamingBookPDF(BookPDF):
+    """
+    BookPDF que escribe el documento en disco a medida que se genera.
+    
+    FPDF guarda todas las páginas y las imágenes en memoria hasta output(),
+    así que la memoria crece con el tamaño del libro. Esta clase escribe cada
+    página en cuanto termina y cada imagen en cuanto se añade, y al cerrar el
+    documento solo quedan por escribir las fuentes, las plantillas, el
+    diccionario de recursos, la tabla xref y el trailer. La memoria queda
+    prácticamente constante aunque el libro tenga miles de páginas.
+    
+    El PDF se escribe en "<output_path>.part" y se renombra al terminar, de
+    modo que nunca queda un PDF a medias con el nombre definitivo.
+    
+    Limitaciones: no admite enlaces ni el alias del número total de páginas
+    (alias_nb_pages), porque las páginas ya escritas no se pueden modificar.
+    Las páginas que se vayan a editar después hay que retenerlas con
+    hold_page.
+    """
+    
+    def __init__(self, output_path):
+        """
+        Args:
+            output_path (str): Ruta del PDF que se va a generar
+        """
+        super().__init__()
+        self.output_path = os.path.abspath(output_path)
+        self._part_path = self.output_path + ".part"
+        self._file = open(self._part_path, "wb")
+        self._written = 0
+        self._held = set()
+        self._page_objects = {}
+        self._images_written = 0
+        self._putheader()
+        self._flush()
+        
+    def _flush(self):
+        # Pasar al archivo lo acumulado en el buffer de FPDF
+        if self.buffer:
+            data = self.buffer.encode("latin1")
+            self._file.write(data)
+            self._written += len(data)
+            self.buffer = ''
+            
+    def _tell(self):
+        return self._written + len(self.buffer)
+        
+    def _newobj(self):
+        # Las posiciones de la tabla xref son absolutas dentro del archivo
+        self.n += 1
+        self.offsets[self.n] = self._tell()
+        self._out(str(self.n) + ' 0 obj')
+        
+    def _write_objects(self, write, *args):
+        # Con state == 2, _out escribiría en la página actual en lugar del buffer
+        state, self.state = self.state, 1
+        try:
+            write(*args)
+        finally:
+            self.state = state
+        self._flush()
+        
+    def _put_page(self, n):
+        filter = '/Filter /FlateDecode ' if self.compress else ''
+        content = self.pages[n].encode("latin1")
+        if self.compress:
+            content = zlib.compress(content)
+        self._newobj()
+        self._page_objects[n] = self.n
+        self._out('<</Type /Page')
+        self._out('/Parent 1 0 R')
+        self._out('/Resources 2 0 R')
+        if self.pdf_version > '1.3':
+            self._out('/Group <</Type /Group /S /Transparency /CS /DeviceRGB>>')
+        self._out('/Contents ' + str(self.n + 1) + ' 0 R>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<' + filter + '/Length ' + str(len(content)) + '>>')
+        self._putstream(content)
+        self._out('endobj')
+        # Liberar el contenido de la página
+        self.pages[n] = ''
+        
+    def _put_new_images(self):
+        images = sorted(self.images.values(), key=lambda info: info['i'])
+        for info in images[self._images_written:]:
+            self._putimage(info)
+            info.pop('data', None)
+            info.pop('smask', None)
+        self._images_written = len(images)
+        
+    def hold_page(self, page):
+        self._held.add(page)
+        
+    def _add_image(self, name, info):
+        super()._add_image(name, info)
+        self._write_objects(self._put_new_images)
+        
+    def image(self, name, x=None, y=None, w=0, h=0, type='', link=''):
+        result = super().image(name, x, y, w, h, type, link)
+        if len(self.images) > self._images_written:
+            self._write_objects(self._put_new_images)
+        return result
+        
+    def write_toc(self, pages, entries):
+        super().write_toc(pages, entries)
+        # Las páginas del índice ya están completas
+        for page in sorted(self._held):
+            if page != self.page:
+                self._held.discard(page)
+                self._write_objects(self._put_page, page)
+        
+    def _endpage(self):
+        super()._endpage()
+        if self.page not in self._held:
+            self._write_objects(self._put_page, self.page)
+            
+    def _putimages(self):
+        self._put_new_images()
+        self._puttemplates()
+        
+    def _putresources(self):
+        self._putfonts()
+        self._putimages()
+        self.offsets[2] = self._tell()
+        self._out('2 0 obj')
+        self._out('<<')
+        self._putresourcedict()
+        self._out('>>')
+        self._out('endobj')
+        
+    def _enddoc(self):
+        if hasattr(self, 'str_alias_nb_pages') or any(self.page_links.values()):
+            raise RuntimeError("StreamingBookPDF no admite enlaces ni alias_nb_pages")
+        for page in sorted(self._held):
+            self._put_page(page)
+        self._held.clear()
+        
+        # Raíz del árbol de páginas, con las páginas en orden aunque se escribieran desordenadas
+        self.offsets[1] = self._tell()
+        self._out('1 0 obj')
+        self._out('<</Type /Pages')
+        self._out('/Kids [' + ''.join(f'{self._page_objects[n]} 0 R ' for n in range(1, self.page + 1)) + ']')
+        self._out('/Count ' + str(self.page))
+        self._out('/MediaBox [0 0 %.2f %.2f]' % (self.fw_pt, self.fh_pt))
+        self._out('>>')
+        self._out('endobj')
+        self._putresources()
+        self._newobj()
+        self._out('<<')
+        self._putinfo()
+        self._out('>>')
+        self._out('endobj')
+        self._newobj()
+        self._out('<<')
+        self._putcatalog()
+        self._out('>>')
+        self._out('endobj')
+        
+        # Tabla de referencias cruzadas y trailer
+        xref = self._tell()
+        self._out('xref')
+        self._out('0 ' + str(self.n + 1))
+        self._out('0000000000 65535 f ')
+        for i in range(1, self.n + 1):
+            self._out('%010d 00000 n ' % self.offsets[i])
+        self._out('trailer')
+        self._out('<<')
+        self._puttrailer()
+        self._out('>>')
+        self._out('startxref')
+        self._out(xref)
+        self._out('%%EOF')
+        self._flush()
+        self.state = 3
+        self._file.close()
+        os.replace(self._part_path, self.output_path)
+        
+    def output(self, name='', dest=''):
+        """
+        Termina el documento. El PDF ya está en output_path, así que name
+        solo se admite si coincide con esa ruta.
+        
+        Returns:
+            str: Ruta del PDF generado
+        """
+        if name and os.path.abspath(name) != self.output_path:
+            raise ValueError(f"StreamingBookPDF escribe en {self.output_path}, no en {name}")
+        if self.state < 3:
+            self.close()
+        return self.output_path
+        
+    def abort(self):
+        """Descarta el PDF a medio escribir si el documento no llegó a cerrarse."""
+        if self.state < 3 and not self._file.closed:
+            self._file.close()
+            try:
+                os.remove(self._part_path)
+            except OSError:
+                pass
+
+def render_fragment(section, image, chapter_title, state):
+    """
+    Maqueta una sección en un PDF aparte, para unirla al libro con
+    BookPDF.append_fragment. Se ejecuta en los procesos del pool de create_pdf.
+    
+    El fragmento empieza como lo haría la sección dentro del libro: con el
+    título de la sección anterior en el encabezado de su primera página y el
+    estado gráfico en que terminó la anterior. Los números de página se
+    escriben al unirlo.
+    
+    Args:
+        section (Section): Sección a maquetar
+        image (bytes): Ilustración de la sección, o None
+        chapter_title (str): Título de la sección anterior
+        state (dict): Estado gráfico al empezar (ver BookPDF.page_state)
+        
+    Returns:
+        dict: Fragmento (ver BookPDF.fragment)
+    """
+    pdf = BookPDF()
+    pdf.defer_page_numbers = True
+    pdf.chapter_title = chapter_title
+    pdf.set_page_state(state)
+    pdf.render_section(section, lambda: image)
+    return pdf.fragment()
+
+def _end_state(section, state):
+    """
+    Predice el estado gráfico en que termina de maquetarse una sección.
+    
+    Solo depende de las partes que tiene la sección (dato curioso, términos
+    del glosario...) y no de su texto, así que basta con maquetar una
+    versión mínima de ella. Así cada fragmento puede empezar a maquetarse
+    sin esperar a que termine el anterior.
+    
+    Args:
+        section (Section): Sección
+        state (dict): Estado gráfico al empezar la sección
+        
+    Returns:
+        dict: Estado gráfico al terminarla
+    """
+    sketch = Section(section.key, "", ["x"], fun_fact="x" if section.fun_fact else "",
+                     glossary=section.glossary[:1])
+    pdf = BookPDF()
+    pdf.set_page_state(state)
+    pdf.render_section(sketch)
+    return pdf.page_state()
+
+def _render_pool(workers):
+    """
+    Devuelve el pool de procesos de maquetación del proceso actual.
+    
+    Se crea con el primer libro que se maqueta en paralelo y se reutiliza en
+    los siguientes (también desde varios hilos), para no arrancar procesos
+    nuevos con cada libro.
+    
+    Args:
+        workers (int): Procesos del pool si todavía no existe
+        
+    Returns:
+        ProcessPoolExecutor: Pool de maquetación
+    """
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ProcessPoolExecutor(max_workers=workers)
+        return _render_executor
+
+def _default_render_workers():
+    """
+    Devuelve los procesos de maquetación por defecto (BOOK_PDF_WORKERS).
+    
+    Cuando varios procesos generan libros a la vez (run_batch o el servidor
+    con un pool de procesos, ver BOOK_LLM_PROCESSES), BOOK_PDF_WORKERS se
+    reparte entre ellos, igual que la cuota del modelo.
+    
+    Returns:
+        int: Procesos de maquetación; 0 o 1 para maquetar en el proceso actual
+    """
+    workers = int(os.getenv("BOOK_PDF_WORKERS", "0"))
+    processes = max(1, int(os.getenv("BOOK_LLM_PROCESSES", "1")))
+    return workers // processes
+
+def _render_sections_parallel(pdf, sections, workers, wait_image):
+    """
+    Maqueta cada sección en un proceso del pool y une los fragmentos a pdf en orden.
+    
+    Args:
+        pdf (BookPDF): Documento con la portada y el índice ya maquetados
+        sections (iterable): Secciones del Document
+        workers (int): Procesos del pool (ver _render_pool)
+        wait_image (callable): Devuelve la ilustración de una sección
+        
+    Returns:
+        list: Tuplas (título, página de inicio) para el índice
+    """
+    entries = []
+    state = pdf.page_state()
+    chapter_title = pdf.chapter_title
+    pending = []
+    executor = _render_pool(workers)
+    try:
+        for section in sections:
+            # La maquetación de la sección necesita su ilustración desde el principio
+            image = wait_image(section) if section.image_key else None
+            if image is not None:
+                image = _jpeg_bytes(image)
+            pending.append((section, state, executor.submit(render_fragment, section, image, chapter_title, state)))
+            state = _end_state(section, state)
+            chapter_title = section.title
+        
+        for section, state, future in pending:
+            with span("pdf.merge", key=section.key):
+                fragment = future.result()
+                if state != pdf.page_state():
+                    logger.warning(f"La sección {section.key} empezó con un estado gráfico distinto del esperado")
+                entries.append((section.title, pdf.append_fragment(fragment)))
+    finally:
+        # El pool es compartido: no dejar en él trabajos de un libro que falló
+        for _, _, future in pending:
+            future.cancel()
+    return entries
 
-def create_pdf(book_data, output_path="output/book.pdf"):
+def create_pdf(book_data, output_path="output/book.pdf", debug_images=None, image_workers=None, checkpoint=None,
+               streaming=None, document=None, render_workers=None):
     """
     Genera un PDF educativo extenso usando los datos proporcionados.
     
+    Las ilustraciones se generan en paralelo desde el principio y se
+    incrustan directamente desde memoria. En modo de depuración se guarda
+    además una copia de cada una en temp_images/.
+    
     Args:
-        book_data (dict): Diccionario con el contenido del libro
+        book_data (Book): Contenido del libro (también se acepta el diccionario
+            del JSON del modelo, o un StreamedBookData)
         output_path (str): Ruta donde se guardará el PDF
+        debug_images (bool, optional): Guardar copias de las imágenes en disco.
+            Por defecto se activa con la variable de entorno BOOK_DEBUG_IMAGES=1
+        image_workers (int, optional): Hilos para generar las ilustraciones
+            (ver IllustrationPipeline)
+        checkpoint (JobCheckpoint, optional): Punto de control del trabajo; las
+            ilustraciones se guardan en él y las que ya tiene no se vuelven a dibujar
+        streaming (bool, optional): Escribir el PDF en disco a medida que se
+            genera (ver StreamingBookPDF). Por defecto se activa con la variable
+            de entorno BOOK_PDF_STREAMING=1 o para libros de STREAMING_MIN_CHAPTERS
+            capítulos o más
+        document (Document, optional): Documento ya preparado (ver
+            book.document.render_book); se usa en lugar de book_data y sus
+            ilustraciones, para reutilizarlo en otros formatos
+        render_workers (int, optional): Procesos para maquetar las secciones
+            en paralelo; cada una se maqueta en un fragmento aparte y los
+            fragmentos se unen en orden (ver render_fragment). Por defecto, la
+            variable BOOK_PDF_WORKERS (repartida entre los procesos que generan
+            libros a la vez, ver _default_render_workers); con 0 o 1 se maqueta
+            en el proceso actual
         
     Returns:
         str or None: Ruta del PDF generado o None si hubo un error
     """
+    illustrations = None
+    pdf = None
     try:
-        # Extraer información del diccionario
-        topic = book_data["topic"]
-        age_group = book_data["age_group"]
-        book_title = book_data.get("title", f"Libro sobre {topic}")
-        introduction = book_data.get("introduction", "")
-        chapters = book_data.get("chapters", [])
-        exercises = book_data.get("exercises", "")
-        glossary = book_data.get("glossary", [])
-        conclusion = book_data.get("conclusion", "")
-        
-        # Crear el PDF con el contenido generado
-        pdf = BookPDF()
-        pdf.set_title(book_title)
-        pdf.set_author("Sistema de Generación de Libros Educativos")
+        if document is None:
+            illustrations = BookIllustrations(workers=image_workers, checkpoint=checkpoint, keep=False)
+            document = Document(book_data, illustrations, keep_sections=False)
+        topic = document.topic
+        age_group = document.age_group
+        book_title = document.title
+        toc_entries = []
         
         # Asegurar que la ruta output_path sea absoluta o relativa a la ubicación actual
         output_path = os.path.abspath(output_path)
@@ -170,13 +955,34 @@ def create_pdf(book_data, output_path="output/book.pdf"):
         # Crear el directorio de salida si no existe
         os.makedirs(output_dir, exist_ok=True)
         
-        # Crear un directorio temporal para las imágenes si no existe
-        temp_image_dir = os.path.join(output_dir, "temp_images")
-        os.makedirs(temp_image_dir, exist_ok=True)
-
+        # Crear el PDF con el contenido generado; los libros muy largos se
+        # escriben en disco página a página para no tenerlos enteros en memoria
+        if streaming is None:
+            streaming = (os.getenv("BOOK_PDF_STREAMING", "") == "1"
+                         or (document.chapter_count or 0) >= STREAMING_MIN_CHAPTERS)
+        pdf = StreamingBookPDF(output_path) if streaming else BookPDF()
+        pdf.set_title(book_title)
+        pdf.set_author("Sistema de Generación de Libros Educativos")
+        
+        # En modo de depuración, guardar una copia de cada imagen en un directorio
+        # temporal (uno por libro, para que los trabajos en paralelo no se pisen)
+        if debug_images is None:
+            debug_images = os.getenv("BOOK_DEBUG_IMAGES", "") == "1"
+        temp_image_dir = None
+        if debug_images:
+            book_name = os.path.splitext(os.path.basename(output_path))[0]
+            temp_image_dir = os.path.join(output_dir, "temp_images", book_name)
+            os.makedirs(temp_image_dir, exist_ok=True)
+        
+        def save_debug_image(image, filename):
+            if temp_image_dir:
+                with open(os.path.join(temp_image_dir, filename), "wb") as f:
+                    f.write(image)
+        
         # Generar la portada y agregarla al PDF
         print("Generando portada...")
-        cover_image = generate_cover(topic, age_group)
+        with span("image.wait", key="cover"):
+            cover_image = document.image("cover")
         
         # Página de portada
         pdf.add_page()
@@ -188,11 +994,9 @@ def create_pdf(book_data, output_path="output/book.pdf"):
         pdf.ln(20)
 
         if cover_image:
-            cover_path = os.path.join(temp_image_dir, "cover.jpg")
             try:
-                with open(cover_path, "wb") as f:
-                    f.write(cover_image)
-                pdf.image(cover_path, x=30, y=100, w=150)
+                save_debug_image(cover_image, "cover.jpg")
+                pdf.image(cover_image, x=30, y=100, w=150)
             except Exception as e:
                 logger.warning(f"No se pudo agregar la imagen de portada: {e}")
                 print(f"Error con la imagen de portada: {e}")
@@ -206,104 +1010,49 @@ def create_pdf(book_data, output_path="output/book.pdf"):
         pdf.cell(0, 10, "Índice", ln=True)
         pdf.ln(5)
         
-        page_counter = 4  # Empezamos en la página 4 (1-portada, 2-índice, 3-introducción)
-        pdf.set_font("Arial", "", 12)
-        
-        # Introducción en el índice
-        pdf.cell(0, 8, f"Introducción..................................{page_counter}", ln=True)
-        page_counter += 2  # Estimamos 2 páginas para la introducción
-        
-        # Capítulos en el índice
-        for i, chapter in enumerate(chapters):
-            chapter_title = chapter.get("title", f"Capítulo {i+1}")
-            pdf.cell(0, 8, f"{chapter_title}..................................{page_counter}", ln=True)
-            page_counter += 5  # Estimamos 5 páginas por capítulo en promedio
-        
-        # Secciones finales en el índice
-        pdf.cell(0, 8, f"Ejercicios y Actividades..........................{page_counter}", ln=True)
-        page_counter += 3
-        
-        pdf.cell(0, 8, f"Glosario..................................{page_counter}", ln=True)
-        page_counter += 2
+        # Reservar las páginas del índice: las entradas se escriben al final,
+        # cuando ya se conoce la página real en que empieza cada sección
+        toc_pages = [(pdf.page_no(), pdf.get_y())]
+        pdf.hold_page(pdf.page_no())
+        if document.chapter_count is not None:
+            entries = document.chapter_count + 4  # Introducción, capítulos, ejercicios, glosario y conclusión
+            entries -= int((pdf.page_break_trigger - pdf.get_y()) // TOC_LINE_HEIGHT)
+            while entries > 0:
+                pdf.add_page()
+                toc_pages.append((pdf.page_no(), pdf.get_y()))
+                pdf.hold_page(pdf.page_no())
+                entries -= int((pdf.page_break_trigger - pdf.get_y()) // TOC_LINE_HEIGHT)
         
-        pdf.cell(0, 8, f"Conclusión..................................{page_counter}", ln=True)
-        
-        # Página de introducción
-        pdf.chapter_title_page("Introducción")
-        pdf.chapter_body(introduction)
-        
-        # Páginas para cada capítulo
-        print("Añadiendo capítulos con imágenes...")
-        for i, chapter in enumerate(chapters):
-            chapter_title = chapter.get("title", f"Capítulo {i+1}")
-            chapter_content = chapter.get("content", "")
-            fun_fact = chapter.get("fun_fact", "")
-            
-            # Título del capítulo en página nueva
-            pdf.chapter_title_page(chapter_title)
-            
-            # Contenido del capítulo
-            pdf.chapter_body(chapter_content)
-            
-            # Generar imagen para el capítulo
-            print(f"Generando imagen para el capítulo: {chapter_title}...")
-            image_prompt = f"Ilustración educativa para niños sobre '{chapter_title}' relacionado con {topic}"
-            image = generate_image(image_prompt)
-            
+        def wait_image(section):
+            # Recoger la ilustración de la sección (generada en paralelo)
+            if section.is_chapter:
+                print(f"Generando imagen para el capítulo: {section.title}...")
+            else:
+                print("Generando imagen para los ejercicios...")
+            with span("image.wait", key=section.image_key):
+                image = document.image(section.image_key)
             if image:
-                image_path = os.path.join(temp_image_dir, f"chapter_{i+1}.jpg")
-                try:
-                    with open(image_path, "wb") as f:
-                        f.write(image)
-                    # Verificar si hay suficiente espacio en la página actual
-                    if pdf.get_y() > 180:
-                        pdf.add_page()
-                    # Centrar la imagen
-                    pdf.image(image_path, x=(210-150)/2, y=pdf.get_y(), w=150)
-                except Exception as e:
-                    logger.warning(f"No se pudo agregar imagen para el capítulo {i+1}: {e}")
-                    print(f"Error con la imagen del capítulo {i+1}: {e}")
-            
-            # Añadir dato curioso si existe
-            if fun_fact:
-                pdf.ln(10)
-                pdf.fun_fact_box(fun_fact)
-            
-            pdf.ln(10)
-        
-        # Sección de ejercicios
-        pdf.chapter_title_page("Ejercicios y Actividades")
-        pdf.chapter_body(exercises)
+                save_debug_image(image, f"{section.image_key}.jpg")
+            return image
         
-        # Generar imagen para los ejercicios
-        print("Generando imagen para los ejercicios...")
-        exercises_image = generate_image(f"Ilustración para ejercicios y actividades sobre {topic} para niños")
-        if exercises_image:
-            exercises_image_path = os.path.join(temp_image_dir, "exercises.jpg")
-            try:
-                with open(exercises_image_path, "wb") as f:
-                    f.write(exercises_image)
-                pdf.image(exercises_image_path, x=(210-150)/2, y=pdf.get_y(), w=150)
-            except Exception as e:
-                logger.warning(f"No se pudo agregar imagen para ejercicios: {e}")
-                print(f"Error con la imagen de ejercicios: {e}")
-        
-        # Glosario
-        pdf.chapter_title_page("Glosario")
-        pdf.set_font("Arial", "", 12)
-        for term_def in glossary:
-            term = term_def.get("term", "")
-            definition = term_def.get("definition", "")
-            if term and definition:
-                pdf.set_font("Arial", "B", 12)
-                pdf.cell(0, 8, term, ln=True)
-                pdf.set_font("Arial", "", 12)
-                pdf.multi_cell(0, 8, definition)
-                pdf.ln(5)
+        # Introducción, capítulos, ejercicios, glosario y conclusión
+        if render_workers is None:
+            render_workers = _default_render_workers()
+        if render_workers > 1:
+            print(f"Maquetando las secciones en {render_workers} procesos...")
+            toc_entries = _render_sections_parallel(pdf, document, render_workers, wait_image)
+        else:
+            for section in document:
+                if section.is_chapter:
+                    with span("pdf.chapter", key=section.key, chars=sum(map(len, section.paragraphs))):
+                        page = pdf.render_section(section, lambda: wait_image(section))
+                else:
+                    page = pdf.render_section(section, lambda: wait_image(section))
+                toc_entries.append((section.title, page))
+                if section.key == "introduction":
+                    print("Añadiendo capítulos con imágenes...")
         
-        # Conclusión
-        pdf.chapter_title_page("Conclusión")
-        pdf.chapter_body(conclusion)
+        pdf.write_toc(toc_pages, toc_entries)
         
         # Verificar que tengamos al menos 50 páginas
         if pdf.page_no() < 50:
@@ -319,20 +1068,26 @@ def create_pdf(book_data, output_path="output/book.pdf"):
                 pdf.ln(5)
                 
                 # Añadir páginas de líneas para notas
+                # (las líneas se dibujan una vez en una plantilla que cada página referencia)
+                notes_lines = pdf.lined_page_template()
                 for _ in range(pages_needed - 1):  # -1 porque ya añadimos la página de título
                     pdf.add_page()
-                    # Dibujar líneas horizontales para notas
-                    y = 30
-                    while y < 270:
-                        pdf.line(20, y, 190, y)
-                        y += 12
+                    pdf.use_template(notes_lines)
         
         # Guardar el archivo PDF
         print(f"Guardando PDF en {output_path}...")
-        pdf.output(output_path)
+        with span("pdf.output", pages=pdf.page_no()):
+            pdf.output(output_path)
         print(f"PDF generado con {pdf.page_no()} páginas.")
         return output_path
 
     except Exception as e:
         print(f"\n❌ Error al generar el PDF: {e}")
-        return None
\ No newline at end of file
+        if isinstance(pdf, StreamingBookPDF):
+            pdf.abort()
+        if checkpoint is not None:
+            checkpoint.record_error("pdf", e)
+        return None
+    finally:
+        if illustrations is not None:
+            illustrations.close()
\ No newline at end of file
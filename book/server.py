@@ -0,0 +1,330 @@
+"""
+Servidor HTTP local para encargar libros sin arrancar un proceso por libro.
+
+    python main.py --serve --port 8000 --workers 2 --queue-size 16
+
+Endpoints:
+
+- POST /jobs con un JSON {"topic", "age_group", y opcionalmente "mode",
+  "use_cache", "refresh", "stream", "formats"}: encola el trabajo y responde
+  202 con su identificador. Si la cola está llena responde 503 con Retry-After.
+  Con "mode": "offline" el contenido sale de plantillas, sin llamar al modelo
+  (ver book.offline_generator).
+- GET /jobs/<id>: estado del trabajo ("queued", "running", "ok" o "error").
+- GET /jobs/<id>/pdf (o /epub, /html): descarga el libro en ese formato
+  cuando el trabajo terminó bien, si se pidió en "formats".
+- GET /health: tamaño de la cola y número de trabajadores.
+
+Si llega un trabajo idéntico (mismo tema, edad y modo) a otro que todavía
+está en cola o generándose, no se encola: se une al trabajo en curso y
+recibe su mismo resultado y su mismo PDF (ver book.singleflight).
+
+Los trabajos se sirven desde una cola acotada con un número fijo de
+trabajadores, que importan los módulos de generación una sola vez al arrancar
+y reutilizan el cliente del modelo (y sus conexiones) entre libros.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from book.document import FORMATS, parse_formats
+from book.jobs import DEFAULT_OUTPUT_DIR, build_book, coalesce_key, output_filename, parse_flag, parse_mode
+from book.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Trabajos terminados que se recuerdan para consultar su estado y descargarlos
+MAX_FINISHED_JOBS = 1000
+
+JOB_FIELDS = ("topic", "age_group", "mode", "use_cache", "refresh", "stream", "formats")
+
+CONTENT_TYPES = {"pdf": "application/pdf", "epub": "application/epub+zip", "html": "text/html; charset=utf-8"}
+
+def _warm_up():
+    # Importar los módulos de generación y crear el cliente del modelo antes del primer libro
+    import book.content_generator  # noqa: F401
+    import book.pdf_creator  # noqa: F401
+    from book.llm_client import get_client
+    get_client()
+
+class BookService:
+    """
+    Cola acotada de trabajos de libros servida por un pool de trabajadores.
+
+    Con executor="thread" cada trabajador genera los libros en su propio hilo
+    dentro del proceso del servidor. Con executor="process" los hilos solo
+    despachan: los libros se generan en un pool de procesos que se mantiene
+    vivo entre trabajos, de modo que la maquetación no compite por el GIL.
+    """
+
+    def __init__(self, output_dir=DEFAULT_OUTPUT_DIR, workers=2, queue_size=16, executor="thread"):
+        """
+        Args:
+            output_dir (str): Directorio donde se guardan los PDFs
+            workers (int): Trabajos que se generan a la vez
+            queue_size (int): Trabajos que pueden esperar en cola
+            executor (str): "thread" o "process"
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Tipo de pool desconocido: {executor}")
+        self.output_dir = output_dir
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._pool = None
+        if executor == "process":
+            # Cada proceso tiene su propio cliente del modelo: repartir entre ellos la cuota
+            os.environ["BOOK_LLM_PROCESSES"] = str(workers)
+            self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+        self._threads = []
+
+    def start(self):
+        """Prepara los trabajadores y arranca los hilos que consumen la cola."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        _warm_up()
+        if self._pool is not None:
+            # Arrancar los procesos ahora, no con el primer trabajo
+            for future in [self._pool.submit(_warm_up) for _ in range(self.workers)]:
+                future.result()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"libros-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Detiene los trabajadores cuando terminan el trabajo en curso."""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def submit(self, request):
+        """
+        Encola un trabajo.
+
+        Args:
+            request (dict): Datos del trabajo; "topic" y "age_group" son obligatorios
+
+        Returns:
+            dict or None: Estado del trabajo, o None si la cola está llena
+
+        Raises:
+            ValueError: Si faltan campos obligatorios, algún modo o formato es
+                desconocido o alguna opción no es booleana
+        """
+        topic = str(request.get("topic") or "").strip()
+        age_group = str(request.get("age_group") or "").strip()
+        if not topic or not age_group:
+            raise ValueError("Los campos 'topic' y 'age_group' son obligatorios")
+
+        job_id = uuid.uuid4().hex
+        job = {key: request[key] for key in JOB_FIELDS if key in request}
+        job.update(topic=topic, age_group=age_group, output=f"{job_id}_{output_filename(topic)}",
+                   mode=parse_mode(job.get("mode")), formats=parse_formats(job.get("formats")),
+                   use_cache=parse_flag(job.get("use_cache"), "use_cache", True),
+                   refresh=parse_flag(job.get("refresh"), "refresh", False),
+                   stream=parse_flag(job.get("stream"), "stream", False))
+        # Cada trabajo tiene su propio PDF, así que un punto de control nunca se retomaría
+        job["checkpoint"] = False
+        key = coalesce_key(job)
+        state = {"id": job_id, "topic": topic, "age_group": age_group, "status": "queued",
+                 "submitted": time.time(), "seconds": None, "output": None, "outputs": None, "fallback": False,
+                 "error": None,
+                 "coalesced_with": None}
+        with self._lock:
+            future, leader = self._flights.claim(key, job_id)
+            if leader == job_id:
+                try:
+                    self._queue.put_nowait((job_id, key, job))
+                except queue.Full:
+                    # Con el lock tomado nadie ha podido unirse a este trabajo
+                    self._flights.fail(key, RuntimeError("La cola de trabajos está llena"))
+                    return None
+            else:
+                state["coalesced_with"] = leader
+            self._jobs[job_id] = state
+        if leader != job_id:
+            future.add_done_callback(lambda done: self._finish(job_id, done.result()))
+        return dict(state)
+
+    def status(self, job_id):
+        """
+        Devuelve el estado de un trabajo.
+
+        Args:
+            job_id (str): Identificador devuelto por submit
+
+        Returns:
+            dict or None: Copia del estado, o None si no existe
+        """
+        with self._lock:
+            state = self._jobs.get(job_id)
+            if state is None:
+                return None
+            state = dict(state)
+            leader = self._jobs.get(state["coalesced_with"])
+            if state["status"] == "queued" and leader is not None:
+                # Un trabajo agrupado avanza con el trabajo al que se unió
+                state["status"] = leader["status"]
+            return state
+
+    def health(self):
+        """
+        Devuelve el estado del servicio.
+
+        Returns:
+            dict: "queued" (trabajos en cola), "queue_size", "workers", "running"
+                y "coalesced" (trabajos que se unieron a uno idéntico en curso)
+        """
+        with self._lock:
+            running = sum(1 for state in self._jobs.values() if state["status"] == "running")
+        return {"queued": self._queue.qsize(), "queue_size": self._queue.maxsize,
+                "workers": self.workers, "running": running, "coalesced": self._flights.shared}
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, key, job = item
+            self._update(job_id, status="running", started=time.time())
+            try:
+                if self._pool is not None:
+                    result = self._pool.submit(build_book, job, self.output_dir).result()
+                else:
+                    result = build_book(job, self.output_dir)
+            except Exception as e:
+                logger.error(f"Fallo del trabajador para '{job['topic']}': {e}")
+                result = {"status": "error", "output": None, "outputs": None, "seconds": 0.0, "resumed": None,
+                          "fallback": False, "error": str(e)}
+            self._finish(job_id, result)
+            # Los trabajos que se unieron a este reciben el mismo resultado
+            self._flights.resolve(key, result)
+            print(f"{'✅' if result['status'] == 'ok' else '❌'} {job['topic']} ({result['seconds']:.1f} s)")
+
+    def _finish(self, job_id, result):
+        self._update(job_id, status=result["status"], output=result["output"], outputs=result["outputs"],
+                     seconds=result["seconds"], fallback=result.get("fallback", False), error=result["error"])
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            self._jobs[job_id].update(changes)
+            # Olvidar los trabajos terminados más antiguos
+            finished = [key for key, state in self._jobs.items() if state["status"] in ("ok", "error")]
+            for key in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[key]
+
+class BookRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "Ruta desconocida"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("Se esperaba un objeto JSON")
+            state = self.service.submit(request)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if state is None:
+            self._send_json(503, {"error": "La cola de trabajos está llena"}, {"Retry-After": "30"})
+            return
+        self._send_json(202, state, {"Location": f"/jobs/{state['id']}"})
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if parts == ["health"]:
+            self._send_json(200, self.service.health())
+            return
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            state = self.service.status(parts[1])
+            if state is None:
+                self._send_json(404, {"error": "Trabajo desconocido"})
+            elif len(parts) == 2:
+                self._send_json(200, state)
+            elif parts[2] in FORMATS:
+                self._send_file(state, parts[2])
+            else:
+                self._send_json(404, {"error": "Ruta desconocida"})
+            return
+        self._send_json(404, {"error": "Ruta desconocida"})
+
+    def _send_file(self, state, name):
+        if state["status"] != "ok":
+            self._send_json(409, {"error": f"El trabajo está en estado '{state['status']}'"})
+            return
+        path = (state["outputs"] or {}).get(name)
+        if path is None:
+            self._send_json(404, {"error": f"El trabajo no generó el formato '{name}'"})
+            return
+        try:
+            size = os.path.getsize(path)
+            f = open(path, "rb")
+        except OSError:
+            self._send_json(410, {"error": f"El archivo {name.upper()} ya no está disponible"})
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPES[name])
+            self.send_header("Content-Length", str(size))
+            self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+            self.end_headers()
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def _send_json(self, code, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+def serve(host="127.0.0.1", port=8000, output_dir=DEFAULT_OUTPUT_DIR, workers=2, queue_size=16, executor="thread"):
+    """
+    Arranca el servidor de libros (bloqueante hasta Ctrl+C).
+
+    Args:
+        host (str): Dirección en la que escuchar
+        port (int): Puerto en el que escuchar
+        output_dir (str): Directorio donde se guardan los PDFs
+        workers (int): Libros que se generan a la vez
+        queue_size (int): Trabajos que pueden esperar en cola
+        executor (str): "thread" o "process" (ver BookService)
+    """
+    service = BookService(output_dir, workers, queue_size, executor)
+    service.start()
+    BookRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), BookRequestHandler)
+    print(f"Servidor de libros en http://{host}:{port} ({workers} trabajadores, cola de {queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nDeteniendo el servidor...")
+    finally:
+        server.server_close()
+        service.stop()
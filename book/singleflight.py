@@ -0,0 +1,77 @@
+"""
+Agrupación de peticiones idénticas en curso ("single-flight").
+
+Cuando llegan a la vez varias peticiones del mismo libro, solo la primera (la
+líder) lo genera; las demás se unen a ella y reciben el mismo resultado en
+lugar de volver a llamar al modelo y maquetar otro PDF igual:
+
+    future, owner = flights.claim(key, me)
+    if owner == me:
+        try:
+            flights.resolve(key, build())
+        except Exception as e:
+            flights.fail(key, e)
+    result = future.result()
+
+La clave deja de estar en curso al resolverse, así que una petición que
+llegue después empieza una generación nueva (que normalmente acierta en la
+caché de contenido).
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Peticiones en curso, agrupadas por clave."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.shared = 0
+
+    def claim(self, key, owner=None):
+        """
+        Se une a la petición en curso con esa clave o empieza una nueva.
+
+        Args:
+            key: Clave hashable que identifica la petición
+            owner: Identificador del llamador (id de trabajo, índice...)
+
+        Returns:
+            tuple: (Future con el resultado, identificador del líder). Si el
+                líder es el propio llamador, debe hacer el trabajo y llamar a
+                resolve o fail.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.shared += 1
+                return flight
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._flights[key] = (future, owner)
+            return future, owner
+
+    def resolve(self, key, result):
+        """
+        Entrega el resultado del líder a todas las peticiones de la clave.
+
+        Args:
+            key: Clave usada en claim
+            result: Resultado del trabajo
+        """
+        with self._lock:
+            future, _ = self._flights.pop(key)
+        future.set_result(result)
+
+    def fail(self, key, error):
+        """
+        Entrega el error del líder a todas las peticiones de la clave.
+
+        Args:
+            key: Clave usada en claim
+            error (Exception): Error del trabajo
+        """
+        with self._lock:
+            future, _ = self._flights.pop(key)
+        future.set_exception(error)
@@ -0,0 +1,208 @@
+import re
+import json
+
+class BookJSONStreamParser:
+    """
+    Parser incremental del JSON de un libro que llega por fragmentos.
+
+    Recibe el texto a medida que el modelo lo genera y devuelve eventos en
+    cuanto una parte está completa, sin esperar al final de la respuesta:
+
+        ("chapter", índice, capítulo)  cada objeto de "chapters" al cerrarse
+        ("key", clave, valor)          cada clave de primer nivel al completarse
+
+    Ignora el texto previo a la primera llave (por ejemplo, "```json").
+    Solo conserva en memoria el texto del valor que se está leyendo.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._finished = False
+        self._key = None
+        self._expect_key = False
+        self._key_start = None
+        self._value_start = None
+        self._item_start = None
+        self._chapters = []
+
+    def feed(self, text):
+        """
+        Procesa un nuevo fragmento de texto.
+
+        Args:
+            text (str): Fragmento de la respuesta del modelo
+
+        Returns:
+            list[tuple]: Eventos completados con este fragmento
+        """
+        events = []
+        if self._finished or not text:
+            return events
+        self._buf += text
+        buf = self._buf
+        i = self._pos
+
+        while i < len(buf):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._key_start = None
+                i += 1
+                continue
+
+            if self._depth == 0:
+                # Antes del objeto raíz: saltar texto como "```json"
+                if c == "{":
+                    self._depth = 1
+                    self._expect_key = True
+                i += 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_start = i
+                    self._expect_key = False
+            elif c == ":" and self._depth == 1:
+                self._value_start = i + 1
+            elif c in "{[":
+                if c == "{" and self._depth == 2 and self._key == "chapters":
+                    self._item_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if c == "}" and self._depth == 2 and self._item_start is not None:
+                    chapter = json.loads(buf[self._item_start:i + 1])
+                    events.append(("chapter", len(self._chapters), chapter))
+                    self._chapters.append(chapter)
+                    self._item_start = None
+                elif self._depth == 0:
+                    # Fin del objeto raíz: la última clave termina aquí
+                    self._emit_value(buf, i, events)
+                    self._finished = True
+                    i += 1
+                    break
+            elif c == "," and self._depth == 1:
+                self._emit_value(buf, i, events)
+                self._expect_key = True
+            i += 1
+
+        self._pos = i
+        self._trim()
+        return events
+
+    def _emit_value(self, buf, end, events):
+        if self._key is None or self._value_start is None:
+            return
+        if self._key == "chapters":
+            # Los capítulos ya se han parseado uno a uno
+            value = list(self._chapters)
+        else:
+            value = json.loads(buf[self._value_start:end])
+        events.append(("key", self._key, value))
+        self._key = None
+        self._value_start = None
+
+    def _trim(self):
+        # Descartar el texto que ya no se necesita para parsear ningún valor pendiente;
+        # el valor de "chapters" no se vuelve a parsear completo, solo cada capítulo
+        keep = [self._key_start, self._item_start]
+        if self._key != "chapters":
+            keep.append(self._value_start)
+        keep = [p for p in keep if p is not None]
+        start = min(keep) if keep else self._pos
+        if start <= 0:
+            return
+        self._buf = self._buf[start:]
+        self._pos -= start
+        for name in ("_key_start", "_value_start", "_item_start"):
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, value - start)
+
+    @property
+    def finished(self):
+        """bool: True cuando se ha cerrado el objeto raíz del JSON."""
+        return self._finished
+
+CHAPTER_HEADER = re.compile(r"Capítulo\s\d+:")
+
+def split_chapter_block(block):
+    """
+    Separa un bloque "Capítulo N: Título ..." en título y contenido.
+
+    Args:
+        block (str): Texto del capítulo, empezando por su encabezado
+
+    Returns:
+        tuple: (título, contenido del capítulo)
+    """
+    title_match = re.search(r"Capítulo\s\d+:\s*(.*)", block)
+    title = title_match.group(1).strip() if title_match else "Capítulo"
+    content = block.replace(title, "", 1).strip()
+    return title, content
+
+class ChapterBlockStreamParser:
+    """
+    Parser incremental de capítulos en texto libre con encabezados "Capítulo N:".
+
+    Un capítulo se considera completo cuando aparece el encabezado del
+    siguiente; el último se entrega al llamar a close().
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._scan_from = 0
+
+    def feed(self, text):
+        """
+        Procesa un nuevo fragmento de texto.
+
+        Args:
+            text (str): Fragmento de la respuesta del modelo
+
+        Returns:
+            list[tuple]: Capítulos completos como tuplas (título, contenido)
+        """
+        self._buf += text
+        chapters = []
+        while True:
+            first = CHAPTER_HEADER.search(self._buf)
+            if not first:
+                # Conservar solo una posible cabecera cortada al final
+                self._buf = self._buf[-20:]
+                return chapters
+            following = CHAPTER_HEADER.search(self._buf, max(first.end(), self._scan_from))
+            if not following:
+                self._buf = self._buf[first.start():]
+                # Evitar volver a buscar en el texto ya revisado (salvo una cabecera cortada)
+                self._scan_from = max(first.end() - first.start(), len(self._buf) - 20)
+                return chapters
+            chapters.append(split_chapter_block(self._buf[first.start():following.start()]))
+            self._buf = self._buf[following.start():]
+            self._scan_from = 0
+
+    def close(self):
+        """
+        Termina el parseo y devuelve el último capítulo pendiente.
+
+        Returns:
+            list[tuple]: Capítulos restantes como tuplas (título, contenido)
+        """
+        chapters = []
+        if CHAPTER_HEADER.match(self._buf):
+            chapters.append(split_chapter_block(self._buf))
+        self._buf = ""
+        self._scan_from = 0
+        return chapters
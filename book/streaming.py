@@ -0,0 +1,211 @@
+import logging
+import threading
+
+from book.model import Book, Chapter, load_glossary, text_value
+from book.stream_parser import BookJSONStreamParser
+
+logger = logging.getLogger(__name__)
+
+def iter_completion_text(stream):
+    """
+    Extrae los fragmentos de texto de una respuesta de chat en streaming.
+
+    Args:
+        stream: Iterable de chunks devuelto por client.chat.completions.create(stream=True)
+
+    Yields:
+        str: Cada fragmento de texto no vacío
+    """
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            yield text
+
+def iter_book_events(text_chunks):
+    """
+    Convierte fragmentos de texto del modelo en eventos del parser incremental.
+
+    Args:
+        text_chunks: Iterable de fragmentos de texto
+
+    Yields:
+        tuple: Eventos de BookJSONStreamParser ("chapter", ...) o ("key", ...)
+    """
+    parser = BookJSONStreamParser()
+    for text in text_chunks:
+        yield from parser.feed(text)
+    if not parser.finished:
+        raise ValueError("La respuesta del modelo terminó antes de cerrar el JSON del libro")
+
+class StreamedBookData(dict):
+    """
+    book_data que se va rellenando mientras el modelo genera la respuesta.
+
+    Un hilo consume el stream en segundo plano. Leer una clave bloquea solo
+    hasta que esa clave está disponible, y "chapters" devuelve un iterador
+    que entrega cada capítulo en cuanto se completa. Así create_pdf puede
+    maquetar e ilustrar los primeros capítulos mientras se generan los
+    siguientes.
+
+    Tiene los mismos atributos que un Book (title, chapters, glossary...),
+    con los capítulos como iterador de Chapter.
+
+    Si el stream falla o la respuesta queda cortada, recover reconstruye el
+    libro y lo que falta se completa con él: los capítulos ya entregados se
+    conservan y quien está esperando una clave recibe la del libro
+    reconstruido en lugar de un error.
+    """
+
+    def __init__(self, topic, age_group, events, on_complete=None, recover=None):
+        """
+        Args:
+            topic (str): El tema del libro
+            age_group (str): El grupo de edad del público objetivo
+            events: Iterable de eventos de iter_book_events
+            on_complete (callable, optional): Se llama con el Book completo si
+                el stream termina correctamente
+            recover (callable, optional): Se llama sin argumentos si el stream
+                falla y devuelve el Book con el que completar el libro
+        """
+        super().__init__(topic=topic, age_group=age_group)
+        self._chapters = []
+        self._done = False
+        self._error = None
+        self._book = None
+        self._on_complete = on_complete
+        self._recover = recover
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._consume, args=(events,), daemon=True)
+        self._thread.start()
+
+    def _consume(self, events):
+        try:
+            for kind, name, value in events:
+                with self._cond:
+                    if kind == "chapter":
+                        self._chapters.append(value)
+                    elif name not in ("topic", "age_group"):
+                        dict.__setitem__(self, name, value)
+                    self._cond.notify_all()
+            # Validar el libro completo (claves obligatorias y tipos)
+            self._book = Book.from_dict(dict(self))
+        except Exception as e:
+            logger.error(f"Error durante la generación en streaming: {e}")
+            self._error = e
+            if self._recover is not None:
+                try:
+                    self._complete_from(self._recover())
+                    self._error = None
+                except Exception as recover_error:
+                    logger.error(f"No se pudo reconstruir el libro del stream: {recover_error}")
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+        if self._error is None and self._on_complete is not None:
+            try:
+                self._on_complete(self._book)
+            except Exception as e:
+                logger.warning(f"Error al procesar el libro completo: {e}")
+
+    def _complete_from(self, book):
+        # Completar con el libro reconstruido lo que el stream no llegó a entregar
+        data = book.to_dict()
+        with self._cond:
+            for name, value in data.items():
+                if name != "chapters" and not dict.__contains__(self, name):
+                    dict.__setitem__(self, name, value)
+            self._chapters.extend(data["chapters"][len(self._chapters):])
+            self._book = Book.from_dict(dict(self, chapters=list(self._chapters)))
+
+    def __getitem__(self, key):
+        if key == "chapters":
+            with self._cond:
+                if not dict.__contains__(self, key):
+                    return self.iter_chapters()
+        with self._cond:
+            while not dict.__contains__(self, key) and not self._done:
+                self._cond.wait()
+            if not dict.__contains__(self, key) and self._error is not None:
+                raise self._error
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        with self._cond:
+            while not dict.__contains__(self, key) and not self._done:
+                self._cond.wait()
+        return dict.__contains__(self, key)
+
+    @property
+    def topic(self):
+        return dict.__getitem__(self, "topic")
+
+    @property
+    def age_group(self):
+        return dict.__getitem__(self, "age_group")
+
+    @property
+    def title(self):
+        return text_value(self.get("title"), "title")
+
+    @property
+    def introduction(self):
+        return text_value(self.get("introduction"), "introduction")
+
+    @property
+    def chapters(self):
+        return self.iter_chapters()
+
+    @property
+    def exercises(self):
+        return text_value(self.get("exercises"), "exercises")
+
+    @property
+    def glossary(self):
+        return load_glossary(self.get("glossary"))
+
+    @property
+    def conclusion(self):
+        return text_value(self.get("conclusion"), "conclusion")
+
+    def iter_chapters(self):
+        """
+        Itera los capítulos a medida que el modelo los completa.
+
+        Yields:
+            Chapter: Cada capítulo
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chapters) and not dict.__contains__(self, "chapters") and not self._done:
+                    self._cond.wait()
+                if index < len(self._chapters):
+                    chapter = self._chapters[index]
+                elif self._error is not None and not dict.__contains__(self, "chapters"):
+                    raise self._error
+                else:
+                    return
+            index += 1
+            yield Chapter.from_dict(chapter, index - 1)
+
+    def wait(self):
+        """
+        Espera a que termine el stream.
+
+        Returns:
+            Book: El libro completo
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._book
@@ -0,0 +1,108 @@
+"""
+Motor de división de líneas para el texto del PDF.
+
+Reproduce las reglas de FPDF.multi_cell (cortar en el último espacio cuando
+el ancho acumulado supera el máximo, o a mitad de palabra si no hay espacios)
+pero sin recorrer el texto carácter a carácter en Python: los anchos de cada
+fuente se guardan en una tabla indexada por código de carácter, los anchos
+acumulados de cada párrafo se calculan de una vez y los puntos de corte se
+buscan por bisección.
+
+Las líneas resultantes sirven tanto para medir (altura de un cuadro) como para
+escribir el texto con BookPDF.write_lines, así que cada párrafo se divide una
+sola vez.
+"""
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+# text: contenido de la línea
+# width: ancho hasta el espacio de corte, en milésimas del tamaño de la fuente
+#        (None si la línea no terminó en un espacio y no se justifica)
+# spaces: espacios contados hasta el corte, incluido el de corte
+Line = namedtuple("Line", ["text", "width", "spaces"])
+
+_tables = {}
+
+def width_table(font):
+    """
+    Devuelve la tabla de anchos de una fuente estándar de FPDF.
+
+    Args:
+        font (dict): Fuente actual de FPDF (pdf.current_font)
+
+    Returns:
+        array: Ancho de cada carácter Latin-1 en milésimas del tamaño de la fuente
+    """
+    key = font["name"]
+    table = _tables.get(key)
+    if table is None:
+        cw = font["cw"]
+        table = array("l", (cw.get(chr(code), 0) for code in range(256)))
+        _tables[key] = table
+    return table
+
+def cumulative_widths(text, table):
+    """
+    Calcula los anchos acumulados de un texto.
+
+    Args:
+        text (str): Texto a medir
+        table (array): Tabla devuelta por width_table
+
+    Returns:
+        list[int]: Lista de len(text) + 1 valores; el elemento k es el ancho
+            de text[:k]
+    """
+    try:
+        codes = text.encode("latin-1")
+    except UnicodeEncodeError:
+        # FPDF ignora el ancho de los caracteres que no están en la tabla
+        return list(accumulate((table[ord(c)] if ord(c) < 256 else 0 for c in text), initial=0))
+    return list(accumulate(map(table.__getitem__, codes), initial=0))
+
+def break_lines(text, table, wmax, max_chars=None):
+    """
+    Divide un texto en líneas con las reglas de FPDF.multi_cell.
+
+    Args:
+        text (str): Texto a dividir; los saltos de línea se respetan
+        table (array): Tabla de anchos de la fuente (ver width_table)
+        wmax (float): Ancho máximo de línea en milésimas del tamaño de la fuente
+        max_chars (int, optional): Máximo de caracteres por línea, además del ancho
+
+    Returns:
+        list[Line]: Líneas en orden
+    """
+    s = text.replace("\r", "")
+    end = len(s)
+    if end > 0 and s[end - 1] == "\n":
+        end -= 1
+    cum = cumulative_widths(s, table)
+    lines = []
+    start = 0
+    while True:
+        newline = s.find("\n", start, end)
+        segment_end = end if newline == -1 else newline
+        j = start
+        while j < segment_end:
+            # Primer carácter con el que la línea supera el ancho máximo
+            i = bisect_right(cum, cum[j] + wmax, j + 1, segment_end + 1) - 1
+            if max_chars is not None:
+                i = min(i, j + max_chars)
+            if i >= segment_end:
+                break
+            sep = s.rfind(" ", j, i + 1)
+            if sep == -1:
+                if i == j:
+                    i += 1
+                lines.append(Line(s[j:i], None, 0))
+                j = i
+            else:
+                lines.append(Line(s[j:sep], cum[sep] - cum[j], s.count(" ", j, sep + 1)))
+                j = sep + 1
+        lines.append(Line(s[j:segment_end], None, 0))
+        if newline == -1:
+            return lines
+        start = newline + 1
@@ -1,29 +1,129 @@
-from book.pdf_creator import create_pdf
-from book.content_generator import generate_book_content
+import argparse
 import os
+import sys
+# Solo módulos ligeros: OpenAI, FPDF y PIL se importan cuando se genera un libro
+from book import __version__
+from book.document import FORMATS, parse_formats
+from book.jobs import DEFAULT_OUTPUT_DIR, MODES, build_book, plan_job
+from utils.logger import get_logger
 
-def main():
+RESUME_LABELS = {"pdf": "ya terminado", "content": "se retoma desde el contenido guardado", None: "nuevo"}
+
+def print_plan(jobs, output_dir):
+    # Mostrar lo que se generaría, sin llamar al modelo ni crear PDFs
+    for job in jobs:
+        plan = plan_job(job, output_dir)
+        print(f"- {plan['topic']} ({plan['age_group']}, modo {plan['mode']}) -> {', '.join(plan['outputs'].values())} "
+              f"[{RESUME_LABELS[plan['resume']]}]")
+
+def interactive(output_dir, mode, use_cache, refresh, stream, checkpoint, dry_run=False, formats=("pdf",)):
     print("=== Generador de Libros con Imágenes ===")
     topic = input("Tema del libro: ").strip()
     age_group = input("Edad del público objetivo: ").strip()
 
+    job = {"topic": topic, "age_group": age_group, "mode": mode,
+           "use_cache": use_cache, "refresh": refresh, "stream": stream, "checkpoint": checkpoint,
+           "formats": formats}
+    if dry_run:
+        print_plan([job], output_dir)
+        return 0
+
     print("\nGenerando libro, por favor espere...")
-    
-    # Generar contenido del libro
-    book_data = generate_book_content(topic, age_group)
-    
-    # Definir la ruta de salida para el PDF
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"libro_{topic.replace(' ', '_').lower()}.pdf")
-    
-    # Llamar a create_pdf con el diccionario y la ruta de salida
-    generated_path = create_pdf(book_data, output_path)
-
-    if generated_path:
-        print(f"\n✅ Libro generado exitosamente: {generated_path}")
+
+    # Generar contenido y PDF del libro
+    result = build_book(job, output_dir)
+
+    if result["status"] == "ok":
+        print(f"\n✅ Libro generado exitosamente: {', '.join(result['outputs'].values())}")
     else:
         print("\n❌ Ocurrió un error al generar el libro.")
+    return 0 if result["status"] == "ok" else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de libros educativos con imágenes")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostrar qué libros se generarían y dónde, sin llamar al modelo ni crear PDFs")
+    parser.add_argument("--batch", metavar="MANIFIESTO",
+                        help="Genera todos los libros de un manifiesto CSV/JSONL (topic, age_group, output)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Número de procesos para el modo por lotes (por defecto, uno por CPU) "
+                             "o de libros simultáneos en modo servidor")
+    parser.add_argument("--serve", action="store_true",
+                        help="Arrancar un servidor HTTP que recibe trabajos de libros")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección del servidor")
+    parser.add_argument("--port", type=int, default=8000, help="Puerto del servidor")
+    parser.add_argument("--queue-size", type=int, default=16,
+                        help="Trabajos que pueden esperar en la cola del servidor antes de rechazar nuevos")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread",
+                        help="Generar los libros del servidor en hilos o en un pool de procesos")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="Directorio donde se guardan los PDFs")
+    parser.add_argument("--formats", default="pdf",
+                        help=f"Formatos de salida separados por comas ({', '.join(FORMATS)}); "
+                             "todos se generan a partir del mismo contenido e ilustraciones")
+    parser.add_argument("--mode", choices=MODES, default="single",
+                        help="Modo de generación: una sola llamada, esquema + capítulos en paralelo, "
+                             "u offline (plantillas, sin llamar al modelo)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="No leer ni guardar el contenido generado en la caché")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Regenerar el contenido aunque exista en la caché o en un punto de control")
+    parser.add_argument("--stream", action="store_true",
+                        help="Maquetar cada capítulo en cuanto el modelo termina de generarlo")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="No guardar puntos de control ni retomar trabajos interrumpidos")
+    parser.add_argument("--trace", metavar="ARCHIVO",
+                        help="Añadir los tiempos de cada etapa a un archivo JSONL")
+    parser.add_argument("--timings", action="store_true",
+                        help="Mostrar una tabla con los tiempos de cada etapa al terminar cada libro")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="Perfilar la generación de cada libro (tiempo de CPU o memoria)")
+    parser.add_argument("--profile-output", metavar="ARCHIVO",
+                        help="Guardar el perfil de cProfile en un archivo .prof en lugar de mostrarlo "
+                             "(al nombre se le añaden el libro y el proceso)")
+    args = parser.parse_args(argv)
+    try:
+        formats = parse_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # La instrumentación se configura por entorno para que llegue a los procesos del lote
+    if args.trace:
+        os.environ["BOOK_TRACE"] = os.path.abspath(args.trace)
+    if args.timings:
+        os.environ["BOOK_TRACE_SUMMARY"] = "1"
+    if args.profile:
+        os.environ["BOOK_PROFILE"] = args.profile
+    if args.profile_output:
+        os.environ["BOOK_PROFILE_OUTPUT"] = os.path.abspath(args.profile_output)
+    if args.trace or args.timings or args.profile:
+        get_logger(__name__)
+
+    if args.serve:
+        if args.dry_run:
+            print(f"Servidor de libros en http://{args.host}:{args.port} ({args.workers or 2} trabajadores, "
+                  f"cola de {args.queue_size}, pool de tipo {args.executor}); no se arranca con --dry-run")
+            return 0
+        from book.server import serve
+        serve(args.host, args.port, args.output_dir, args.workers or 2, args.queue_size, args.executor)
+        return 0
+
+    if args.batch:
+        if args.dry_run:
+            from book.batch import prepare_jobs
+            jobs = prepare_jobs(args.batch, args.mode, not args.no_cache, args.refresh, args.stream,
+                                not args.no_checkpoint, formats)
+            print(f"{len(jobs)} libros en {args.batch}:")
+            print_plan(jobs, args.output_dir)
+            return 0
+        from book.batch import run_batch
+        results = run_batch(args.batch, args.output_dir, args.workers, args.mode,
+                            not args.no_cache, args.refresh, args.stream, not args.no_checkpoint, formats)
+        return 0 if all(r["status"] == "ok" for r in results) else 1
+
+    return interactive(args.output_dir, args.mode, not args.no_cache, args.refresh, args.stream,
+                       not args.no_checkpoint, args.dry_run, formats)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
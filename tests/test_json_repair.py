@@ -0,0 +1,59 @@
+import pytest
+
+from book.json_repair import repair_json
+
+BOOK = '{"title": "Volcanes", "chapters": [{"title": "1", "content": "Uno", "fun_fact": "Dato"}, '
+
+
+def test_json_completo():
+    assert repair_json('{"title": "Volcanes", "chapters": []}') == {"title": "Volcanes", "chapters": []}
+
+
+def test_cortado_dentro_de_una_cadena():
+    data = repair_json(BOOK + '{"title": "2", "content": "Texto a me')
+    assert data == {"title": "Volcanes", "chapters": [{"title": "1", "content": "Uno", "fun_fact": "Dato"}]}
+
+
+def test_cortado_dentro_de_una_lista_anidada():
+    # El capítulo 2 tiene la lista de párrafos cerrada pero le falta fun_fact
+    data = repair_json(BOOK + '{"title": "2", "content": ["a", "b"]')
+    assert [chapter["title"] for chapter in data["chapters"]] == ["1"]
+
+
+def test_cortado_entre_miembros_del_objeto_principal():
+    data = repair_json('{"title": "Volcanes", "introduction": "Hola", "exerc')
+    assert data == {"title": "Volcanes", "introduction": "Hola"}
+
+
+def test_conserva_las_secciones_completas_tras_los_capitulos():
+    data = repair_json(BOOK + '{"title": "2", "content": "Dos"}], "exercises": "Ej", "glossary": [{"term": "a", "defi')
+    assert [chapter["title"] for chapter in data["chapters"]] == ["1", "2"]
+    assert data["exercises"] == "Ej"
+    assert "glossary" not in data
+
+
+def test_comas_finales():
+    data = repair_json('{"title": "Volcanes", "chapters": [{"title": "1", "content": "Uno",},],}')
+    assert data == {"title": "Volcanes", "chapters": [{"title": "1", "content": "Uno"}]}
+
+
+def test_comentarios():
+    text = """{
+        "title": "Volcanes", // título
+        "chapters": [
+            {"title": "1", "content": "http://ejemplo.org"}
+            // Más capítulos aquí...
+        ]
+    }"""
+    data = repair_json(text)
+    assert data == {"title": "Volcanes", "chapters": [{"title": "1", "content": "http://ejemplo.org"}]}
+
+
+def test_saltos_de_linea_y_texto_despues_del_json():
+    data = repair_json('Aquí está: {"title": "Línea 1\nLínea 2"} Espero que te guste')
+    assert data == {"title": "Línea 1\nLínea 2"}
+
+
+def test_sin_json():
+    with pytest.raises(ValueError):
+        repair_json("Lo siento, no puedo ayudarte")
@@ -0,0 +1,101 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from book import llm_client
+from book.llm_client import AdaptiveConcurrency, LLMClient, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj falso: time.sleep avanza time.monotonic sin esperar."""
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(llm_client.time, "sleep", sleep)
+    return sleeps
+
+
+def test_el_cubo_empieza_lleno_y_se_rellena(clock):
+    bucket = TokenBucket(600)  # 10 por segundo
+    assert bucket.acquire(600) == 0.0
+    assert bucket.acquire(50) == pytest.approx(5.0)
+
+
+def test_el_cubo_no_cobra_mas_que_su_capacidad(clock):
+    bucket = TokenBucket(600)
+    bucket.acquire(10_000)
+    assert bucket.acquire(600) == pytest.approx(60.0)
+
+
+def test_adjust_devuelve_sin_pasar_de_la_capacidad_y_cobra_deudas(clock):
+    bucket = TokenBucket(600)
+    bucket.acquire(100)
+    bucket.adjust(1000)
+    assert bucket.acquire(600) == 0.0
+    bucket.adjust(-100)
+    # Hay que pagar la deuda de 100 antes de cobrar 10 más
+    assert bucket.acquire(10) == pytest.approx(11.0)
+
+
+def test_concurrencia_aditiva_y_multiplicativa():
+    limit = AdaptiveConcurrency(8)
+    assert limit.limit == 4
+    limit.acquire()
+    limit.release()
+    assert limit.limit == pytest.approx(4.25)
+    limit.acquire()
+    limit.release(throttled=True)
+    assert limit.limit == pytest.approx(2.125)
+    for _ in range(5):
+        limit.acquire()
+        limit.release(throttled=True)
+    assert limit.limit == 1
+
+
+def test_concurrencia_bloquea_al_llegar_al_limite():
+    limit = AdaptiveConcurrency(2, initial=1)
+    limit.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limit.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    limit.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert limit.active == 1
+
+
+def _rate_limit_error():
+    request = httpx.Request("POST", "http://127.0.0.1/v1/chat/completions")
+    return openai.RateLimitError("429", response=httpx.Response(429, request=request), body=None)
+
+
+def test_los_reintentos_devuelven_los_tokens_cobrados(clock):
+    client = LLMClient(api_key="x", base_url="http://127.0.0.1:1/v1", rpm=0, tpm=6000, max_retries=3)
+    responses = [_rate_limit_error(), _rate_limit_error(),
+                 SimpleNamespace(usage=SimpleNamespace(total_tokens=100))]
+
+    def create(**kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client._openai = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    try:
+        client.create(model="gpt-4", messages=[{"role": "user", "content": "hola"}], max_tokens=4000)
+        # Solo se cobra el consumo real de la petición que salió bien, sin esperar al cubo
+        assert client.tokens._tokens == pytest.approx(6000 - 100)
+        assert client.stats["throttled"] == 2
+        assert client.stats["waited"] == 0
+    finally:
+        client.close()
@@ -0,0 +1,13 @@
+import os
+
+from book.jobs import output_paths_for
+from book.server import BookService
+
+
+def test_el_tema_no_saca_las_salidas_del_directorio(tmp_path):
+    service = BookService(str(tmp_path), workers=1)
+    service.submit({"topic": "a/../../../../../../tmp/pwn", "age_group": "8-12", "mode": "offline",
+                    "formats": ["pdf", "epub", "html"]})
+    _, _, job = service._queue.get_nowait()
+    for path in output_paths_for(job, str(tmp_path)).values():
+        assert os.path.dirname(os.path.realpath(path)) == os.path.realpath(tmp_path)
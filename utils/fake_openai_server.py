@@ -0,0 +1,201 @@
+"""
+Servidor local que imita el endpoint /v1/chat/completions de OpenAI.
+
+Sirve para probar la generación de contenido sin red ni coste:
+
+    python utils/fake_openai_server.py --port 8765 --delay 0.5
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+
+Las respuestas se eligen según el tipo de prompt (libro completo, esquema,
+capítulo o texto libre) y son deterministas. Con "stream": true se envían
+como eventos SSE, repartiendo la espera entre los fragmentos.
+
+Para probar los reintentos y los límites de book.llm_client, el servidor
+puede simular una cuota (--rpm: responde 429 con Retry-After cuando se
+supera un ritmo de N peticiones por minuto) y errores aleatorios (--fail-rate:
+fracción de peticiones que reciben un 429).
+
+Con --truncate-rate, esa fracción de las respuestas de libro completo se
+corta a mitad del JSON (con finish_reason "length", como al agotar
+max_tokens), para probar la reparación de book.json_repair.
+
+    python utils/fake_openai_server.py --port 8765 --rpm 60 --fail-rate 0.1 --truncate-rate 0.5
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _chapter(title):
+    return {
+        "title": title,
+        "content": f"Contenido de prueba del capítulo {title}.\n\n" + "Texto de relleno para el capítulo. " * 40,
+        "fun_fact": f"¿Sabías que...? Dato curioso de prueba sobre {title}."
+    }
+
+def fake_reply(prompt):
+    """
+    Devuelve la respuesta simulada para un prompt.
+
+    Args:
+        prompt (str): Último mensaje del usuario
+
+    Returns:
+        str: Contenido de la respuesta del asistente
+    """
+    titles = [f"Capítulo de prueba {i}" for i in range(1, 9)]
+    glossary = [{"term": f"Término {i}", "definition": f"Definición de prueba {i}."} for i in range(1, 9)]
+    if '"chapter_titles"' in prompt:
+        return json.dumps({"title": "Libro de prueba", "chapter_titles": titles, "glossary": glossary}, ensure_ascii=False)
+    if '"chapters"' in prompt:
+        book = {
+            "title": "Libro de prueba",
+            "introduction": "Introducción de prueba.\n\n" + "Texto de relleno. " * 30,
+            "chapters": [_chapter(title) for title in titles],
+            "exercises": "1. Ejercicio de prueba.\n\n2. Otro ejercicio de prueba.",
+            "glossary": glossary,
+            "conclusion": "Conclusión de prueba.\n\n" + "Texto de relleno. " * 30
+        }
+        return "```json\n" + json.dumps(book, ensure_ascii=False, indent=2) + "\n```"
+    if '"fun_fact"' in prompt:
+        chapter = _chapter("capítulo")
+        return json.dumps({"content": chapter["content"], "fun_fact": chapter["fun_fact"]}, ensure_ascii=False)
+    if '"glossary"' in prompt:
+        return json.dumps({"glossary": glossary}, ensure_ascii=False)
+    return "Texto de prueba generado por el servidor simulado.\n\n" + "Texto de relleno. " * 30
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    # Segundos de espera por respuesta, para simular la latencia del modelo
+    delay = 0.0
+    # Peticiones por minuto admitidas (0 para no limitar) y fracción de 429 aleatorios
+    rpm = 0
+    fail_rate = 0.0
+    # Fracción de respuestas de libro completo que se cortan a mitad del JSON
+    truncate_rate = 0.0
+    # Cuota restante, que se repone de forma continua (rpm/60 por segundo) como en la API real
+    allowance = None
+    updated = 0.0
+    lock = threading.Lock()
+
+    def _throttle(self):
+        # Devuelve los segundos de Retry-After si la petición se rechaza con un 429
+        with self.lock:
+            if self.fail_rate and random.random() < self.fail_rate:
+                return 1
+            if not self.rpm:
+                return None
+            now = time.monotonic()
+            cls = type(self)
+            if cls.allowance is None:
+                cls.allowance = float(self.rpm)
+            cls.allowance = min(float(self.rpm), cls.allowance + (now - cls.updated) * self.rpm / 60)
+            cls.updated = now
+            if cls.allowance < 1:
+                return max(1, round((1 - cls.allowance) * 60 / self.rpm))
+            cls.allowance -= 1
+            return None
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        retry_after = self._throttle()
+        if retry_after is not None:
+            body = json.dumps({"error": {"message": "Rate limit reached (simulado)", "type": "requests",
+                                         "code": "rate_limit_exceeded"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Retry-After", str(retry_after))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        content = fake_reply(prompt)
+        finish_reason = "stop"
+        if '"chapters"' in prompt and self.truncate_rate and random.random() < self.truncate_rate:
+            content = content[:random.randint(len(content) // 2, len(content) * 9 // 10)]
+            finish_reason = "length"
+        if request.get("stream"):
+            self._stream(request, content)
+            return
+        if self.delay:
+            time.sleep(self.delay)
+
+        body = json.dumps({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": finish_reason
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        }, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, request, content, chunk_size=40):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        for piece in pieces:
+            if self.delay:
+                time.sleep(self.delay / len(pieces))
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port=8765, delay=0.0, rpm=0, fail_rate=0.0, truncate_rate=0.0):
+    """
+    Arranca el servidor simulado (bloqueante).
+
+    Args:
+        port (int): Puerto en el que escuchar
+        delay (float): Segundos de espera antes de cada respuesta
+        rpm (int): Peticiones por minuto admitidas antes de responder 429 (0 para no limitar)
+        fail_rate (float): Fracción de peticiones que reciben un 429 aleatorio
+        truncate_rate (float): Fracción de respuestas de libro completo que se cortan
+    """
+    FakeChatHandler.delay = delay
+    FakeChatHandler.rpm = rpm
+    FakeChatHandler.fail_rate = fail_rate
+    FakeChatHandler.truncate_rate = truncate_rate
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeChatHandler)
+    print(f"Servidor simulado de OpenAI en http://127.0.0.1:{port}/v1")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de chat de OpenAI")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Segundos de espera por respuesta")
+    parser.add_argument("--rpm", type=int, default=0,
+                        help="Peticiones por minuto admitidas antes de responder 429 (0 para no limitar)")
+    parser.add_argument("--fail-rate", type=float, default=0.0,
+                        help="Fracción de peticiones que reciben un 429 aleatorio")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="Fracción de respuestas de libro completo que se cortan a mitad del JSON")
+    args = parser.parse_args()
+    serve(args.port, args.delay, args.rpm, args.fail_rate, args.truncate_rate)
@@ -0,0 +1,229 @@
+"""
+Medición de tiempos por etapa de la generación de un libro.
+
+Las etapas se marcan con span():
+
+    with span("pdf.chapter", index=3):
+        ...
+
+Cada span registra su duración, el span que lo contiene y sus atributos en la
+grabación activa, que abre build_book por cada libro con record(). Fuera de
+una grabación span() no hace nada más que medir el tiempo, así que se puede
+dejar en el código sin coste apreciable. La grabación activa es parte del
+contexto (contextvars), de modo que varios libros pueden generarse a la vez en
+hilos distintos; para que las tareas de un pool de hilos registren sus spans
+en el libro correcto hay que enviarlas con contextvars.copy_context().run.
+
+Configuración (variables de entorno, para que también llegue a los procesos
+del modo por lotes):
+
+- BOOK_TRACE: archivo JSONL al que se añade una línea por span.
+- BOOK_TRACE_SUMMARY=1: mostrar una tabla resumen al terminar cada libro.
+- BOOK_PROFILE=cprofile|tracemalloc: perfilar la generación de cada libro.
+- BOOK_PROFILE_OUTPUT: archivo .prof donde guardar el perfil de cProfile. Al
+  nombre se le añaden el libro y el proceso (libros.prof ->
+  libros-volcanes-1234.prof), para que los libros de un lote o del servidor
+  no se sobrescriban el perfil unos a otros.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_parent = contextvars.ContextVar("book_span_parent", default=None)
+_active = contextvars.ContextVar("book_recording", default=None)
+_lock = threading.Lock()
+_ids = iter(range(1, 1 << 62))
+# Libros que están usando tracemalloc, que es uno solo para todo el proceso
+_tracemalloc_users = 0
+
+class Recording:
+    """Spans registrados durante la generación de un libro."""
+
+    def __init__(self, label):
+        self.label = label
+        self.spans = []
+        self.started = time.time()
+
+    def add(self, record):
+        with _lock:
+            self.spans.append(record)
+
+    def summary(self):
+        """
+        Agrupa los spans por nombre.
+
+        Returns:
+            list[dict]: Una fila por nombre con "name", "count", "total",
+                "mean" y "max" (segundos), ordenadas por tiempo total
+        """
+        rows = {}
+        for record in self.spans:
+            row = rows.setdefault(record["name"], {"name": record["name"], "count": 0, "total": 0.0, "max": 0.0})
+            row["count"] += 1
+            row["total"] += record["seconds"]
+            row["max"] = max(row["max"], record["seconds"])
+        for row in rows.values():
+            row["mean"] = row["total"] / row["count"]
+        return sorted(rows.values(), key=lambda row: row["total"], reverse=True)
+
+    def format_summary(self):
+        """
+        Devuelve el resumen como tabla de texto.
+
+        Returns:
+            str: Tabla con una fila por nombre de span
+        """
+        lines = [f"Tiempos de {self.label}:",
+                 f"  {'etapa':<24}{'veces':>7}{'total (s)':>11}{'media (s)':>11}{'máx (s)':>10}"]
+        for row in self.summary():
+            lines.append(f"  {row['name']:<24}{row['count']:>7}{row['total']:>11.3f}"
+                         f"{row['mean']:>11.3f}{row['max']:>10.3f}")
+        return "\n".join(lines)
+
+    def export_jsonl(self, path):
+        """
+        Añade los spans a un archivo JSONL, una línea por span.
+
+        Args:
+            path (str): Ruta del archivo
+        """
+        with _lock:
+            spans = list(self.spans)
+        lines = "".join(json.dumps(dict(record, book=self.label, pid=os.getpid()), ensure_ascii=False) + "\n"
+                        for record in spans)
+        # Una sola escritura en modo append para que los procesos del lote no mezclen líneas
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Mide una etapa y la registra en la grabación activa.
+
+    Args:
+        name (str): Nombre de la etapa, por ejemplo "llm.request"
+        **attrs: Atributos adicionales (índice del capítulo, modelo...)
+    """
+    span_id = next(_ids)
+    token = _parent.set(span_id)
+    start = time.perf_counter()
+    started = time.time()
+    try:
+        yield attrs
+    finally:
+        seconds = time.perf_counter() - start
+        _parent.reset(token)
+        recording = _active.get()
+        if recording is not None:
+            recording.add({"id": span_id, "parent": _parent.get(), "name": name, "start": started,
+                           "seconds": seconds, "thread": threading.current_thread().name, "attrs": attrs})
+
+@contextmanager
+def record(label):
+    """
+    Abre una grabación de spans para un libro y la exporta al terminar.
+
+    Aplica la configuración de BOOK_TRACE, BOOK_TRACE_SUMMARY y BOOK_PROFILE
+    (ver el docstring del módulo).
+
+    Args:
+        label (str): Nombre de la grabación, normalmente el tema del libro
+
+    Yields:
+        Recording: La grabación activa
+    """
+    recording = Recording(label)
+    token = _active.set(recording)
+    profiler = _start_profile(os.getenv("BOOK_PROFILE", ""))
+    try:
+        with span("book.total"):
+            yield recording
+    finally:
+        _active.reset(token)
+        _stop_profile(profiler, label)
+        trace_path = os.getenv("BOOK_TRACE")
+        if trace_path:
+            try:
+                recording.export_jsonl(trace_path)
+            except OSError as e:
+                logger.warning(f"No se pudieron guardar los tiempos en {trace_path}: {e}")
+        if os.getenv("BOOK_TRACE_SUMMARY", "") == "1":
+            print(recording.format_summary())
+
+def _start_profile(kind):
+    global _tracemalloc_users
+    if kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # A partir de Python 3.12 solo puede haber un perfilador activo a la vez
+            logger.warning(f"No se pudo perfilar este libro: {e}")
+            return None
+        return ("cprofile", profiler)
+    if kind == "tracemalloc":
+        import tracemalloc
+        with _lock:
+            # El primer libro arranca el rastreo y el último lo detiene (ver _stop_profile)
+            shared = _tracemalloc_users > 0
+            if not shared:
+                tracemalloc.start(10)
+            _tracemalloc_users += 1
+        return ("tracemalloc", shared)
+    if kind:
+        logger.warning(f"Perfilador desconocido en BOOK_PROFILE: {kind}")
+    return None
+
+def _profile_output(output, label):
+    """
+    Devuelve el archivo .prof de un libro a partir de BOOK_PROFILE_OUTPUT.
+
+    Args:
+        output (str): Valor de BOOK_PROFILE_OUTPUT
+        label (str): Nombre de la grabación
+
+    Returns:
+        str: Ruta con el libro y el proceso añadidos al nombre
+    """
+    root, ext = os.path.splitext(output)
+    slug = re.sub(r"\W+", "_", label.lower()).strip("_")[:40] or "libro"
+    return f"{root}-{slug}-{os.getpid()}{ext or '.prof'}"
+
+def _stop_profile(profiler, label):
+    global _tracemalloc_users
+    if profiler is None:
+        return
+    kind, state = profiler
+    if kind == "cprofile":
+        import pstats
+        state.disable()
+        output = os.getenv("BOOK_PROFILE_OUTPUT")
+        if output:
+            output = _profile_output(output, label)
+            state.dump_stats(output)
+            print(f"Perfil de {label} guardado en {output}")
+        else:
+            print(f"Perfil de {label} (20 funciones con más tiempo acumulado):")
+            pstats.Stats(state).sort_stats("cumulative").print_stats(20)
+    else:
+        import tracemalloc
+        with _lock:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            _tracemalloc_users -= 1
+            shared = state or _tracemalloc_users > 0
+            if _tracemalloc_users == 0:
+                tracemalloc.stop()
+        # Si otros libros se generan a la vez, el pico y las líneas incluyen su memoria
+        scope = " (compartido con otros libros en curso)" if shared else ""
+        print(f"Memoria de {label}: pico de {peak / (1024 * 1024):.1f} MB{scope}. Líneas con más memoria retenida:")
+        for stat in snapshot.statistics("lineno")[:10]:
+            print(f"  {stat}")